@@ -0,0 +1,118 @@
+from math import hypot
+from settings import *
+
+
+class ActivityScheduler:
+    """
+    Level-of-detail scheduling of entity updates by distance to a focus point
+    (the player). Each tick the spatial grid is queried around the focus, so
+    only entities near it are looked at:
+
+    - within their chase_radius they update every tick, as they may be chasing;
+    - further out, up to wake_distance, they update every interval ticks with
+      the time accumulated since their last update, staggered so the same
+      share of them runs each tick;
+    - beyond both they sleep and are not touched at all.
+
+    Scheduled entities need a rect, a chase_radius and an update(dt) method,
+    and must be indexed in the grid.
+    """
+    def __init__(self, grid, wake_distance=ENEMY_WAKE_DISTANCE, interval=ENEMY_MID_INTERVAL):
+        """
+        :param grid: SpatialGrid holding the scheduled entities (the AllSprites grid).
+        :param wake_distance: Distance in pixels beyond which entities sleep.
+        :param interval: Ticks between two updates of an entity at mid range.
+        """
+        self.grid = grid
+        self.wake_distance = wake_distance
+        self.interval = interval
+
+        # Scheduled entities and the tick (modulo interval) they update on at mid range
+        self.phases = {}
+        self.next_phase = 0
+        # Time in seconds mid-range entities have not been updated for
+        self.pending_dt = {}
+        self.ticks = 0
+        # Distance around the focus that is queried: the wake distance, or the
+        # largest chase radius when an entity chases from further away
+        self.reach = wake_distance
+
+        # Counts from the last tick, for instrumentation
+        self.active = 0
+        self.reduced = 0
+        self.asleep = 0
+
+
+    def __contains__(self, entity):
+        return entity in self.phases
+
+
+    def __len__(self):
+        return len(self.phases)
+
+
+    def add(self, entity):
+        self.phases[entity] = self.next_phase % self.interval
+        self.next_phase += 1
+        self.reach = max(self.reach, entity.chase_radius)
+
+
+    def remove(self, entity):
+        self.phases.pop(entity, None)
+        self.pending_dt.pop(entity, None)
+
+
+    def clear(self):
+        self.phases.clear()
+        self.pending_dt.clear()
+
+
+    def update(self, focus, dt, profiler=None):
+        """
+        Updates the scheduled entities that are due this tick.
+
+        :param focus: Tuple (x, y) the distances are measured from.
+        :param dt: Delta time of the tick in seconds.
+        :param profiler: Optional Profiler; while enabled every entity's update is
+                         timed, like in AllSprites.update.
+        :return: List of the entities updated.
+        """
+        if profiler is not None and profiler.enabled:
+            def update_entity(entity, elapsed):
+                with profiler.span(type(entity).__name__ + '.update'):
+                    entity.update(elapsed)
+        else:
+            def update_entity(entity, elapsed):
+                entity.update(elapsed)
+
+        self.ticks += 1
+        phase = self.ticks % self.interval
+        wake_distance = self.wake_distance
+        focus_x, focus_y = focus
+        area = pygame.Rect(0, 0, self.reach * 2, self.reach * 2)
+        area.center = focus
+
+        phases = self.phases
+        pending_dt = self.pending_dt
+        updated = []
+        active = reduced = 0
+        for entity in self.grid.query(area):
+            if entity not in phases:
+                continue
+            x, y = entity.rect.center
+            distance = hypot(focus_x - x, focus_y - y)
+            if distance <= entity.chase_radius:
+                active += 1
+                update_entity(entity, dt + pending_dt.pop(entity, 0.0))
+                updated.append(entity)
+            elif distance <= wake_distance:
+                reduced += 1
+                pending_dt[entity] = pending_dt.get(entity, 0.0) + dt
+                if phases[entity] == phase:
+                    update_entity(entity, pending_dt.pop(entity))
+                    updated.append(entity)
+
+        self.active = active
+        self.reduced = reduced
+        self.asleep = len(phases) - active - reduced
+        return updated
@@ -0,0 +1,233 @@
+import json
+from hashlib import blake2b
+from os import listdir, makedirs
+from os.path import dirname, exists, join, normpath
+from types import MappingProxyType
+from settings import *
+
+
+class FrameAtlas:
+    """
+    Process-wide cache of animation frames. Each directory of frames is loaded
+    and scaled once per (directory, size) and then shared by every sprite that
+    asks for it, so spawning more sprites does not decode the images again.
+    """
+    def __init__(self):
+        # Tuples of scaled frames keyed by (directory, size)
+        self.cache = {}
+        # Image file of every loaded frame, and the frames scaled down for the
+        # low-resolution renderer once asked for
+        self.sources = {}
+        self.low_res_frames = {}
+
+        # Cache statistics
+        self.hits = 0
+        self.misses = 0
+
+
+    def load(self, directory, size):
+        """
+        Returns the frames in a directory scaled to the given size. Frames are
+        ordered by file name and returned as a tuple so they cannot be modified
+        by the sprites sharing them.
+
+        :param directory: Path of the folder holding the frame images.
+        :param size: Tuple (width, height) the frames are scaled to.
+        """
+        key = (normpath(directory), (int(size[0]), int(size[1])))
+        frames = self.cache.get(key)
+        if frames is not None:
+            self.hits += 1
+            return frames
+
+        self.misses += 1
+        frames = []
+        for file in sorted(listdir(key[0])):
+            surf = pygame.image.load(join(key[0], file)).convert_alpha()
+            frame = pygame.transform.smoothscale(surf, key[1])
+            self.sources[frame] = join(key[0], file)
+            frames.append(frame)
+        frames = tuple(frames)
+        self.cache[key] = frames
+        return frames
+
+
+    def load_animation(self, root, states, size):
+        """
+        Loads the frames for every animation state, one sub-directory per state.
+
+        :param root: Folder containing a sub-directory for each state.
+        :param states: Names of the states ('up', 'down', etc.).
+        :param size: Tuple (width, height) the frames are scaled to.
+        :return: Read-only mapping of state name to its tuple of frames.
+        """
+        return MappingProxyType({state: self.load(join(root, state), size) for state in states})
+
+
+    def low_res(self, frame):
+        """
+        Returns a frame at 1 / SCALE_FACTOR of its size, for drawing into the
+        low-resolution render target. Frames from load() are scaled down from
+        their image file, other surfaces from themselves.
+
+        :param frame: Image of a sprite.
+        """
+        low = self.low_res_frames.get(frame)
+        if low is None:
+            size = (max(1, frame.get_width() // SCALE_FACTOR), max(1, frame.get_height() // SCALE_FACTOR))
+            source = self.sources.get(frame)
+            surf = pygame.image.load(source).convert_alpha() if source else frame
+            low = self.low_res_frames[frame] = pygame.transform.smoothscale(surf, size)
+        return low
+
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self.cache)}
+
+
+# Shared atlas used by every animated sprite in the game
+frame_atlas = FrameAtlas()
+
+
+def is_opaque(surf):
+    """
+    :param surf: Any surface.
+    :return: True if no pixel of the surface is (even partly) transparent.
+    """
+    width, height = surf.get_size()
+    return pygame.mask.from_surface(surf, 254).count() == width * height
+
+
+class TileCache:
+    """
+    Process-wide cache of prepared map tiles. Tiles are keyed by their pixels
+    and target size, so every placement of a tile, on every map using the same
+    tileset, shares one surface. Opaque tiles are converted without per-pixel
+    alpha, which takes cheaper blits.
+    """
+    def __init__(self):
+        # Converted and scaled tile surfaces keyed by (size, pixel digest)
+        self.cache = {}
+
+        # Cache statistics
+        self.hits = 0
+        self.misses = 0
+        self.opaque = 0
+        self.bytes_saved = 0
+
+
+    def get(self, surf, size):
+        """
+        Returns the shared display-format surface of a tile at a given size.
+
+        :param surf: The tile image as decoded from the map (any size and format).
+        :param size: Tuple (width, height) of the tile in game.
+        """
+        size = (int(size[0]), int(size[1]))
+        key = (size, blake2b(pygame.image.tobytes(surf, 'RGBA'), digest_size=16).digest())
+        tile = self.cache.get(key)
+        if tile is not None:
+            self.hits += 1
+            self.bytes_saved += tile.get_width() * tile.get_height() * tile.get_bytesize()
+            return tile
+
+        self.misses += 1
+        if surf.get_size() != size:
+            surf = pygame.transform.scale(surf, size)
+        if is_opaque(surf):
+            self.opaque += 1
+            tile = surf.convert()
+        else:
+            tile = surf.convert_alpha()
+        self.cache[key] = tile
+        return tile
+
+
+    def memory(self):
+        """
+        :return: Bytes of pixel data held by the cached tiles.
+        """
+        return sum(tile.get_width() * tile.get_height() * tile.get_bytesize() for tile in self.cache.values())
+
+
+    def stats(self):
+        return {
+            'hits': self.hits, 'misses': self.misses, 'entries': len(self.cache),
+            'opaque': self.opaque, 'bytes': self.memory(), 'bytes_saved': self.bytes_saved,
+        }
+
+
+# Shared cache of the map tiles of every loaded map
+tile_cache = TileCache()
+
+
+class FontCache:
+    """
+    Opens system fonts by name without pygame's scan of the installed fonts
+    (SysFont), which can take a large part of the startup. Each name is
+    resolved to a font file once and the path is stored in a small JSON file,
+    so later runs open the file directly.
+    """
+    def __init__(self, path=FONT_CACHE_FILE):
+        """
+        :param path: JSON file the resolved font paths are kept in.
+        """
+        self.path = path
+        # Font file of every resolved name (None for pygame's default font), loaded on first use
+        self.paths = None
+
+        # Number of names that had to be resolved by scanning the system fonts
+        self.scans = 0
+
+
+    def load(self, name, size):
+        """
+        Opens a system font, falling back to pygame's default font like SysFont.
+
+        :param name: System font name, e.g. 'monospace'.
+        :param size: Font size in points.
+        :return: pygame.font.Font.
+        """
+        return pygame.font.Font(self.find(name), size)
+
+
+    def find(self, name):
+        """
+        :param name: System font name.
+        :return: Path of the font file, or None for pygame's default font.
+        """
+        if self.paths is None:
+            self.paths = self.read()
+        path = self.paths.get(name, '')
+        if path is None or (path and exists(path)):
+            return path
+
+        # Unknown name or the font file is gone: scan once and remember the result
+        self.scans += 1
+        path = pygame.font.match_font(name)
+        self.paths[name] = path
+        self.write()
+        return path
+
+
+    def read(self):
+        try:
+            with open(self.path) as file:
+                paths = json.load(file)
+        except (OSError, ValueError):
+            return {}
+        return paths if isinstance(paths, dict) else {}
+
+
+    def write(self):
+        # The cache only saves time, so a read-only install just scans again next run
+        try:
+            makedirs(dirname(self.path) or '.', exist_ok=True)
+            with open(self.path, 'w') as file:
+                json.dump(self.paths, file, indent=2)
+        except OSError:
+            pass
+
+
+# Shared font lookup for the HUD and the profiler overlay
+font_cache = FontCache()
@@ -0,0 +1,190 @@
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+from statistics import mean, median
+from time import perf_counter
+from settings import *
+from controls import BotInput
+from main import Game
+from bench_frames import git_commit
+
+# ------------------------------------------------------------------
+# Batch simulation for difficulty and balance sweeps. Plays many headless
+# episodes of the game with a seeded bot (controls.BotInput) for every
+# combination of a grid of balance parameters, spread over a process pool,
+# and prints one summary row per combination: how often the bot completed
+# the relics, the damage it took and how long it lasted before the first
+# hit. Episode N of every combination uses the same seed for the game and
+# the bot, so the combinations are compared on the same episodes and the
+# results do not depend on the number of worker processes.
+#
+#   python batch_sim.py --grid chase_radius=500,700 invincibility_ms=1000,2000 --episodes 16
+#   python batch_sim.py --grid enemy_speeds=150:200,200:280 --scaling
+# ------------------------------------------------------------------
+
+# Maps an episode can start on
+MAPS = {'Forest': FOREST_MAP_FILE, 'Snow': SNOW_MAP_FILE}
+
+# Balance arguments of Game that can be swept, with their defaults
+PARAMETERS = {
+    'enemy_speeds': ENEMY_SPEED_RANGE,
+    'boss_speeds': BOSS_SPEED_RANGE,
+    'detect_radius': ENEMY_DETECT_RADIUS,
+    'chase_radius': ENEMY_CHASE_RADIUS,
+    'invincibility_ms': INVINCIBILITY_MS,
+}
+
+
+def parse_grid(specs):
+    """
+    :param specs: List of 'name=value,value,...' strings; a speed range is written lowest:highest.
+    :return: Dict of the values of every swept parameter, in the order given.
+    """
+    grid = {}
+    for spec in specs:
+        name, _, values = spec.partition('=')
+        if name not in PARAMETERS or not values:
+            raise ValueError(f"expected one of {', '.join(PARAMETERS)} as name=value,value,... got {spec!r}")
+        grid[name] = [tuple(int(part) for part in value.split(':')) if ':' in value else int(value)
+                      for value in values.split(',')]
+    return grid
+
+
+def run_episode(task):
+    """
+    Plays one episode. Runs in a worker process.
+
+    :param task: Tuple (map name, dict of balance parameters, seed, maximum steps).
+    :return: Dict of the episode's results.
+    """
+    map_name, params, seed, frames = task
+    bot = BotInput(seed)
+    game = Game(headless=True, seed=seed, controls=bot, **params)
+    bot.game = game
+    if map_name != game.current_map:
+        game.setup(MAPS[map_name])
+        game.current_map = map_name
+
+    # Simulated time of every hit taken
+    hits = []
+    take_damage = game.take_damage
+
+    def recorded_damage(amount):
+        if not game.invincible:
+            hits.append(game.elapsed_ms / 1000)
+        take_damage(amount)
+    game.take_damage = recorded_damage
+
+    start = perf_counter()
+    steps = game.simulate(frames)
+    elapsed = perf_counter() - start
+    game.preloader.shutdown()
+    return {
+        'outcome': game.outcome or 'timeout',
+        'seconds': steps * FIXED_DT,
+        'steps': steps,
+        'wall_s': elapsed,
+        'damage': len(hits),
+        'first_hit_s': hits[0] if hits else None,
+        'relics': game.relics_collected,
+    }
+
+
+def run_batch(tasks, workers):
+    """
+    Plays every episode, on a pool of worker processes when workers > 1.
+
+    :return: List of the results, in the order of the tasks.
+    """
+    if workers <= 1:
+        return [run_episode(task) for task in tasks]
+    with ProcessPoolExecutor(workers) as pool:
+        return list(pool.map(run_episode, tasks, chunksize=max(1, len(tasks) // (workers * 4))))
+
+
+def summarize(episodes):
+    """
+    :param episodes: List of the results of the episodes of one combination.
+    :return: Dict of summary statistics.
+    """
+    caught = [episode['first_hit_s'] for episode in episodes if episode['first_hit_s'] is not None]
+    return {
+        'episodes': len(episodes),
+        'win_rate': sum(episode['outcome'] == 'win' for episode in episodes) / len(episodes),
+        'relic_rate': mean(episode['relics'] for episode in episodes) / 2,
+        'damage': mean(episode['damage'] for episode in episodes),
+        'caught_rate': len(caught) / len(episodes),
+        'time_to_catch_s': median(caught) if caught else None,
+        'survived_s': mean(episode['seconds'] for episode in episodes),
+    }
+
+
+def label(params):
+    return ' '.join(f"{name}={':'.join(map(str, value)) if isinstance(value, tuple) else value}"
+                    for name, value in params.items()) or 'defaults'
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Play many headless episodes with a bot over a grid of balance parameters.')
+    parser.add_argument('--grid', nargs='*', default=[], metavar='NAME=VALUES',
+                        help=f"parameter values to sweep, e.g. chase_radius=500,700; one of {', '.join(PARAMETERS)}")
+    parser.add_argument('--maps', nargs='+', default=list(MAPS), choices=list(MAPS), help='maps the episodes start on')
+    parser.add_argument('--episodes', type=int, default=8, help='episodes per combination and map')
+    parser.add_argument('--frames', type=int, default=60 * TICK_RATE, help='most steps of an episode')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the first episode')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='worker processes')
+    parser.add_argument('--scaling', action='store_true',
+                        help='also run the batch on 1, 2, 4, ... workers up to --workers and report the throughput')
+    parser.add_argument('--output', default='batch_sim.json', help='JSON file to write the results to')
+    args = parser.parse_args()
+    try:
+        grid = parse_grid(args.grid)
+    except ValueError as error:
+        parser.error(str(error))
+
+    combinations = [dict(zip(grid, values)) for values in product(*grid.values())]
+    groups = [(map_name, params) for params in combinations for map_name in args.maps]
+    tasks = [(map_name, params, args.seed + episode, args.frames)
+             for map_name, params in groups for episode in range(args.episodes)]
+
+    start = perf_counter()
+    results = run_batch(tasks, args.workers)
+    wall = perf_counter() - start
+
+    print(f"{len(tasks)} episodes of at most {args.frames * FIXED_DT:.0f} s on {args.workers} workers "
+          f"in {wall:.1f} s ({len(tasks) / wall:.1f} episodes/s)\n")
+    print(f"  {'map':<8}{'win':>6}{'relics':>8}{'damage':>8}{'caught':>8}{'to catch':>10}{'lasted':>8}  parameters")
+    summaries = []
+    for index, (map_name, params) in enumerate(groups):
+        summary = summarize(results[index * args.episodes:(index + 1) * args.episodes])
+        to_catch = f"{summary['time_to_catch_s']:.1f} s" if summary['time_to_catch_s'] is not None else '-'
+        print(f"  {map_name:<8}{summary['win_rate']:>6.0%}{summary['relic_rate']:>8.0%}{summary['damage']:>8.2f}"
+              f"{summary['caught_rate']:>8.0%}{to_catch:>10}{summary['survived_s']:>6.1f} s  {label(params)}")
+        summaries.append({'map': map_name, 'params': {**PARAMETERS, **params}, **summary})
+
+    scaling = []
+    if args.scaling:
+        print(f"\nScaling - the same {len(tasks)} episodes ({os.cpu_count()} cores)")
+        print(f"  {'workers':>8}{'wall s':>9}{'episodes/s':>12}{'speedup':>9}{'efficiency':>12}  same results")
+        counts = sorted({1 << power for power in range(args.workers.bit_length()) if 1 << power <= args.workers} | {args.workers})
+        baseline = None
+        for workers in counts:
+            start = perf_counter()
+            rerun = run_batch(tasks, workers)
+            elapsed = perf_counter() - start
+            baseline = baseline or elapsed
+            # Wall time per episode differs between runs, everything else must not
+            same = all({**a, 'wall_s': 0} == {**b, 'wall_s': 0} for a, b in zip(results, rerun))
+            print(f"  {workers:>8}{elapsed:>9.2f}{len(tasks) / elapsed:>12.2f}{baseline / elapsed:>8.2f}x"
+                  f"{baseline / elapsed / workers:>12.0%}  {'yes' if same else 'NO'}")
+            scaling.append({'workers': workers, 'wall_s': round(elapsed, 3), 'episodes_per_s': round(len(tasks) / elapsed, 3),
+                            'speedup': round(baseline / elapsed, 2), 'same_results': same})
+
+    with open(args.output, 'w') as file:
+        json.dump({
+            'commit': git_commit(), 'episodes': args.episodes, 'frames': args.frames, 'seed': args.seed,
+            'workers': args.workers, 'wall_s': round(wall, 3), 'summaries': summaries, 'scaling': scaling,
+        }, file, indent=2)
+    print(f"\nResults written to {args.output}")
@@ -0,0 +1,203 @@
+import argparse
+import json
+import subprocess
+from random import Random
+from time import perf_counter
+from settings import *
+from controls import ScriptedInput
+from enemy import Enemy
+from player import Player
+from main import Game
+
+# ------------------------------------------------------------------
+# Frame-time benchmark. Drives the game headlessly on a fixed timestep
+# over both maps and reports per-phase timings as percentiles. The
+# scaling mode spawns extra enemies to show how frame time grows with
+# the number of entities. Results are written as JSON so runs can be
+# compared across commits.
+#
+#   python bench_frames.py --frames 3000
+#   python bench_frames.py --enemies 0 50 200 800 --output scaling.json
+#   python bench_frames.py --low-res --output low_res.json
+# ------------------------------------------------------------------
+
+# Phases in frame order. 'enemies' is the distance-scheduled enemy update and
+# 'swarm' the batched one used from SWARM_MIN_ENEMIES enemies. 'collision' is
+# the time spent in the collision loops and is also part of those phases.
+PHASES = ('events', 'transitions', 'relics', 'update', 'enemies', 'swarm', 'collision', 'draw', 'hud', 'flip', 'frame')
+
+# Maps to benchmark with the vertical direction that leads away from their spawn-side transition
+BENCH_MAPS = {'Forest': (FOREST_MAP_FILE, 1), 'Snow': (SNOW_MAP_FILE, -1)}
+
+
+class PhaseTimer:
+    """
+    Collects one duration per phase per frame, in milliseconds.
+    """
+    def __init__(self):
+        self.samples = {phase: [] for phase in PHASES}
+        self.current = {phase: 0.0 for phase in PHASES}
+
+    def wrap(self, phase, function):
+        """
+        Returns a version of a function that adds its run time to the given phase.
+        """
+        current = self.current
+
+        def timed(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                current[phase] += (perf_counter() - start) * 1000
+        return timed
+
+    def end_frame(self):
+        for phase in PHASES:
+            self.samples[phase].append(self.current[phase])
+            self.current[phase] = 0.0
+
+    def summary(self):
+        return {phase: percentiles(samples) for phase, samples in self.samples.items()}
+
+
+def percentiles(samples):
+    """
+    Summarises a list of timings in milliseconds.
+    """
+    ordered = sorted(samples)
+    if not ordered:
+        return {}
+
+    def pick(fraction):
+        return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))], 4)
+
+    return {
+        'mean': round(sum(ordered) / len(ordered), 4),
+        'p50': pick(0.50), 'p90': pick(0.90), 'p99': pick(0.99), 'max': round(ordered[-1], 4),
+    }
+
+
+def bench_script(frames, away):
+    """
+    Input that first walks away from the spawn-side transition, then keeps
+    moving back and forth so the player stays on the map.
+    """
+    wander = [(30, 1, 0), (30, -1, 0), (30, 0, away), (30, 0, -away)]
+    return [(60, 0, away)] + wander * (frames // 120 + 1)
+
+
+def spawn_enemies(game, count, rng):
+    """
+    Spawns extra enemies at random free spots of the current map.
+    """
+    spawned = 0
+    while spawned < count:
+        pos = (rng.randrange(64, game.level.width - 64), rng.randrange(64, game.level.height - 64))
+        rect = pygame.Rect(0, 0, 32, 64)
+        rect.center = pos
+        if any(sprite.rect.colliderect(rect) for sprite in game.collision_grid.query(rect)):
+            continue
+        Enemy(pos, game.all_sprites, game.collision_grid, game.player, game, rng.randint(*game.enemy_speeds),
+              game.level.flow_field, game.detect_radius, game.chase_radius)
+        spawned += 1
+
+
+def bench_map(map_name, frames, extra_enemies=0, seed=0, use_swarm=None, low_res=LOW_RES_RENDER):
+    """
+    Runs one headless game on a map and returns its per-phase timings.
+
+    :param use_swarm: True or False to force the batched or per-object enemy
+                      update, None to pick it by enemy count like the game does.
+    :param low_res: Render at native resolution with one upscale per frame.
+    """
+    map_file, away = BENCH_MAPS[map_name]
+    game = Game(headless=True, seed=seed, controls=ScriptedInput(bench_script(frames, away)), low_res=low_res)
+    if map_name != game.current_map:
+        game.setup(map_file)
+        game.current_map = map_name
+    spawn_enemies(game, extra_enemies, Random(seed))
+    game.refresh_swarm(use_swarm)
+
+    # Keep the player alive for the whole run
+    game.take_damage = lambda amount: None
+
+    timer = PhaseTimer()
+    game.check_transitions = timer.wrap('transitions', game.check_transitions)
+    game.check_relics = timer.wrap('relics', game.check_relics)
+    game.all_sprites.update = timer.wrap('update', game.all_sprites.update)
+    if game.activity is not None:
+        game.activity.update = timer.wrap('enemies', game.activity.update)
+    if game.swarm is not None:
+        game.swarm.update = timer.wrap('swarm', game.swarm.update)
+    game.all_sprites.draw = timer.wrap('draw', game.all_sprites.draw)
+    game.all_sprites.draw_changes = timer.wrap('draw', game.all_sprites.draw_changes)
+    game.draw_hud = timer.wrap('hud', game.draw_hud)
+    game.present = timer.wrap('flip', game.present)
+    original_collisions = Player.collision, Enemy.collision
+    Player.collision = timer.wrap('collision', Player.collision)
+    Enemy.collision = timer.wrap('collision', Enemy.collision)
+
+    try:
+        for _ in range(frames):
+            frame_start = perf_counter()
+            start = perf_counter()
+            pygame.event.get()
+            timer.current['events'] += (perf_counter() - start) * 1000
+            game.step(FIXED_DT)
+            game.render()
+            timer.current['frame'] += (perf_counter() - frame_start) * 1000
+            timer.end_frame()
+    finally:
+        Player.collision, Enemy.collision = original_collisions
+        game.preloader.shutdown()
+
+    return {
+        'map': map_name,
+        'frames': frames,
+        'enemies': sum(isinstance(sprite, Enemy) for sprite in game.all_sprites),
+        'swarm': game.swarm is not None,
+        'low_res': low_res,
+        # Pixel memory of the map's baked tile layers
+        'layer_kb': (game.level.static_layer.memory() + game.level.relic_layer.memory()) // 1024,
+        'phases': timer.summary(),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+
+def print_result(result):
+    print(f"\n{result['map']} - {result['frames']} frames, {result['enemies']} enemies"
+          f"{' (swarm)' if result['swarm'] else ''}{' (low-res)' if result['low_res'] else ''} (ms), "
+          f"tile layers {result['layer_kb']} KB")
+    print(f"  {'phase':<12}{'mean':>9}{'p50':>9}{'p90':>9}{'p99':>9}{'max':>9}")
+    for phase, stats in result['phases'].items():
+        print(f"  {phase:<12}" + ''.join(f"{stats[key]:>9.3f}" for key in ('mean', 'p50', 'p90', 'p99', 'max')))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark per-phase frame times of the game.')
+    parser.add_argument('--frames', type=int, default=3000, help='frames to run per map')
+    parser.add_argument('--maps', nargs='+', default=list(BENCH_MAPS), choices=list(BENCH_MAPS))
+    parser.add_argument('--enemies', type=int, nargs='+', default=[0], help='extra enemies to spawn (scaling mode)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--low-res', action=argparse.BooleanOptionalAction, default=LOW_RES_RENDER,
+                        help='render at native resolution with one upscale per frame')
+    parser.add_argument('--output', default='bench_frames.json', help='JSON file to write the results to')
+    args = parser.parse_args()
+
+    results = []
+    for map_name in args.maps:
+        for count in args.enemies:
+            result = bench_map(map_name, args.frames, count, args.seed, low_res=args.low_res)
+            print_result(result)
+            results.append(result)
+
+    with open(args.output, 'w') as file:
+        json.dump({'commit': git_commit(), 'frames': args.frames, 'results': results}, file, indent=2)
+    print(f"\nResults written to {args.output}")
@@ -0,0 +1,119 @@
+import argparse
+import os
+from time import perf_counter
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+from settings import *
+import map_bundle
+from level import Level, scaled_rect
+from compile_maps import compile_maps
+from assets import tile_cache
+
+# ------------------------------------------------------------------
+# Compares map loading from the TMX files (PyTMX) with loading from the
+# compiled bundles, for a cold start and for an uncached map transition,
+# and reports the memory the shared tile cache saves and how far the
+# collision rects of each map are merged.
+#
+#   python bench_maps.py --repeat 10
+# ------------------------------------------------------------------
+
+
+# Bundle freshness check used by the loader, swapped out to force the TMX path
+fresh_check = map_bundle.bundle_is_fresh
+
+
+def time_it(function, repeat):
+    """
+    Runs a function several times and returns the timings in milliseconds.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = perf_counter()
+        function()
+        timings.append((perf_counter() - start) * 1000)
+    return timings
+
+
+def report(label, timings):
+    timings = sorted(timings)
+    print(f"{label:<34} mean {sum(timings) / len(timings):8.2f} ms   min {timings[0]:8.2f} ms   max {timings[-1]:8.2f} ms")
+
+
+def run(repeat):
+    compile_maps()
+
+    from main import Game
+    for path_name, use_bundles in (('TMX', False), ('bundle', True)):
+        # Switch the loader by hiding the bundles from it
+        map_bundle.bundle_is_fresh = fresh_check if use_bundles else (lambda map_file: False)
+
+        # Cold start: first frame-ready Game, including display and font setup
+        report(f"cold start ({path_name})", time_it(lambda: Game(), repeat))
+
+        # Level building alone for each map
+        for map_file in (FOREST_MAP_FILE, SNOW_MAP_FILE):
+            report(f"load {os.path.basename(map_file)} ({path_name})", time_it(lambda: Level(map_file).build(), repeat))
+
+        # Transition to a map that is not in the map cache yet
+        game = Game()
+        game.preloader.finish(SNOW_MAP_FILE)
+        game.preloader.request = lambda map_file: None
+        def transition():
+            game.map_cache.levels.pop(SNOW_MAP_FILE, None)
+            game.setup(SNOW_MAP_FILE)
+        report(f"uncached transition ({path_name})", time_it(transition, repeat))
+
+        # Transition to a map the background preloader has prepared
+        def preloaded_transition():
+            game = Game()
+            while not game.map_cache.is_cached(SNOW_MAP_FILE):
+                game.preloader.step()
+            start = perf_counter()
+            game.setup(SNOW_MAP_FILE)
+            return (perf_counter() - start) * 1000
+        report(f"preloaded transition ({path_name})", [preloaded_transition() for _ in range(repeat)])
+    map_bundle.bundle_is_fresh = fresh_check
+    report_tiles()
+    report_colliders()
+
+
+def report_tiles():
+    """
+    Compares the tile surfaces held by the shared tile cache with one surface per
+    placed tile, as the game created them before tiles were shared.
+    """
+    placed = sum(map_bundle.load_map_data(map_file).placed_tiles() for map_file in (FOREST_MAP_FILE, SNOW_MAP_FILE))
+    stats = tile_cache.stats()
+    tile_bytes = int(TILE_SIZE * SCALE_FACTOR) ** 2 * pygame.display.get_surface().get_bytesize()
+    print(f"tiles: {placed} placed on both maps, {stats['entries']} unique surfaces ({stats['opaque']} opaque)")
+    print(f"tile memory: {stats['bytes'] / 1024:.0f} KB shared vs {placed * tile_bytes / 1024:.0f} KB "
+          f"with one surface per placed tile, {(placed * tile_bytes - stats['bytes']) / 1024:.0f} KB saved "
+          f"({stats['hits']} cache hits)")
+
+
+
+def report_colliders():
+    """
+    Prints the number of collision rects of each map before and after merging,
+    and the memory the surfaces of the former collider sprites took: one per
+    collision object of the map, before merging, and one per transition zone
+    and relic area.
+    """
+    for map_file in (FOREST_MAP_FILE, SNOW_MAP_FILE):
+        level = Level(map_file).build()
+        before, after = level.collider_counts
+        collision_rects = [scaled_rect(obj) for obj in map_bundle.read_map_data(map_file).objects['collision']]
+        areas = collision_rects + [zone.rect for zone in level.transition_zones] + level.relic_rects
+        surface_bytes = sum(rect.width * rect.height for rect in areas) * pygame.display.get_surface().get_bytesize()
+        print(f"collision rects {os.path.basename(map_file)}: {before} -> {after}, "
+              f"{surface_bytes / 1024:.0f} KB of collider surfaces no longer allocated")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark TMX against compiled bundle map loading.')
+    parser.add_argument('--repeat', type=int, default=10, help='number of timed runs per measurement')
+    args = parser.parse_args()
+    run(args.repeat)
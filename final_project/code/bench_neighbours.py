@@ -0,0 +1,200 @@
+import argparse
+import json
+from math import sqrt
+from random import Random
+from time import perf_counter
+from settings import *
+from spatial import NeighbourGrid
+from swarm import np, separation
+from bench_frames import git_commit
+
+# ------------------------------------------------------------------
+# Neighbour query benchmark. Scatters enemy-sized bodies over an area that
+# grows with their number, so the density stays the same, and times one
+# tick of separation steering for all of them: every pair tested
+# (naive), the NeighbourGrid used by the one-by-one update, and the NumPy
+# pair search used by the swarm. Contact damage is timed the same way,
+# against one player rect. The crowding section runs a group chasing a
+# point with and without separation and reports how far apart it ends up.
+#
+#   python bench_neighbours.py --counts 250 1000 4000 8000
+# ------------------------------------------------------------------
+
+
+class Body:
+    """
+    Stand-in for an enemy: all the neighbour grid needs is a rect.
+    """
+    def __init__(self, pos, size=(32, 64)):
+        self.rect = pygame.Rect((0, 0), size)
+        self.rect.center = pos
+
+
+def scatter(count, rng, spacing):
+    """
+    :param spacing: Side in pixels of the square area per body.
+    :return: List of Bodies at random spots of a square area of count * spacing².
+    """
+    side = int(sqrt(count) * spacing)
+    return [Body((rng.randrange(side), rng.randrange(side))) for _ in range(count)]
+
+
+def naive_separation(bodies, radius=SEPARATION_RADIUS):
+    """
+    NeighbourGrid.separation for every body, testing every other body.
+    """
+    centers = [body.rect.center for body in bodies]
+    reach = radius * radius
+    radius = float(radius)
+    pushes = []
+    for index, (x, y) in enumerate(centers):
+        push_x = push_y = 0.0
+        for other, (other_x, other_y) in enumerate(centers):
+            dx, dy = x - other_x, y - other_y
+            if other == index or dx * dx + dy * dy >= reach:
+                continue
+            distance = sqrt(dx * dx + dy * dy)
+            if distance == 0:
+                push_x += 1.0 if index > other else -1.0
+                continue
+            weight = (radius - distance) / (radius * distance)
+            push_x += dx * weight
+            push_y += dy * weight
+        pushes.append((push_x, push_y))
+    return pushes
+
+
+def grid_separation(bodies, grid):
+    grid.rebuild(bodies)
+    return [grid.separation(body) for body in bodies]
+
+
+def numpy_separation(bodies):
+    centers = np.array([body.rect.center for body in bodies])
+    return separation(centers[:, 0], centers[:, 1])
+
+
+def timed(function, *args, repeat=3):
+    """
+    :return: Tuple (fastest run time in ms, result of the last run).
+    """
+    best = None
+    for _ in range(repeat):
+        start = perf_counter()
+        result = function(*args)
+        elapsed = (perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def bench_queries(count, spacing, naive_max, seed=0):
+    """
+    Times separation and contact queries for one tick of count bodies.
+
+    :return: Dict of results, times in microseconds per body.
+    """
+    bodies = scatter(count, Random(seed), spacing)
+    grid = NeighbourGrid()
+    result = {'count': count}
+
+    grid_ms, grid_pushes = timed(grid_separation, bodies, grid)
+    result['grid_us'] = round(grid_ms * 1000 / count, 3)
+    if count <= naive_max:
+        naive_ms, naive_pushes = timed(naive_separation, bodies, repeat=1)
+        result['naive_us'] = round(naive_ms * 1000 / count, 3)
+        result['naive_match'] = naive_pushes == grid_pushes
+    if np is not None:
+        numpy_ms, numpy_pushes = timed(numpy_separation, bodies)
+        result['numpy_us'] = round(numpy_ms * 1000 / count, 3)
+        result['numpy_match'] = [tuple(push) for push in numpy_pushes.tolist()] == grid_pushes
+    result['neighbours'] = round(sum(push != (0.0, 0.0) for push in grid_pushes) / count, 3)
+
+    # Contact damage: the bodies touching a player rect in the middle of the crowd
+    player = bodies[count // 2].rect.copy()
+    naive_ms, naive_touching = timed(lambda: [body for body in bodies if body.rect.colliderect(player)])
+    grid_ms, grid_touching = timed(grid.touching, player)
+    result['contact_naive_us'] = round(naive_ms * 1000, 1)
+    result['contact_grid_us'] = round(grid_ms * 1000, 1)
+    result['contact_match'] = naive_touching == grid_touching
+    return result
+
+
+def crowding(count, steps, weight, seed=0, speed=200):
+    """
+    Runs bodies chasing the center of their area for a number of fixed steps,
+    steering like Enemy.chasePlayer without obstacles.
+
+    :param weight: Separation weight, 0 for none.
+    :return: Tuple (mean distance from every body to its nearest neighbour,
+             number of bodies on top of another one) at the end.
+    """
+    bodies = scatter(count, Random(seed), 160)
+    side = int(sqrt(count) * 160)
+    target = pygame.Vector2(side / 2, side / 2)
+    positions = [pygame.Vector2(body.rect.center) for body in bodies]
+    grid = NeighbourGrid()
+    for _ in range(steps):
+        grid.rebuild(bodies)
+        for body, pos in zip(bodies, positions):
+            direction = target - pos
+            if direction.length() > 0:
+                direction = direction.normalize()
+            if weight:
+                push_x, push_y = grid.separation(body)
+                if push_x or push_y:
+                    direction.x += push_x * weight
+                    direction.y += push_y * weight
+                    if direction.length() > 0:
+                        direction = direction.normalize()
+            # Bodies stop at the target instead of circling it
+            step = min(speed * FIXED_DT, pos.distance_to(target))
+            pos += direction * step
+        for body, pos in zip(bodies, positions):
+            body.rect.center = round(pos.x), round(pos.y)
+
+    grid.rebuild(bodies)
+    nearest = []
+    for index, body in enumerate(bodies):
+        radius = SEPARATION_RADIUS
+        while True:
+            others = [other for other in grid.near(body.rect.center, radius) if other != index]
+            if others or radius > side * 2:
+                break
+            radius *= 2
+        nearest.append(min((pygame.Vector2(grid.centers[other]).distance_to(body.rect.center) for other in others), default=0))
+    stacked = sum(distance < 1 for distance in nearest)
+    return sum(nearest) / count, stacked
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the neighbour grid against pairwise separation and contact queries.')
+    parser.add_argument('--counts', type=int, nargs='+', default=[250, 500, 1000, 2000, 4000, 8000], help='numbers of bodies')
+    parser.add_argument('--spacing', type=int, default=48, help='side in pixels of the area per body')
+    parser.add_argument('--naive-max', type=int, default=2000, help='largest count to run the pairwise test for')
+    parser.add_argument('--crowd', type=int, default=200, help='bodies in the crowding run')
+    parser.add_argument('--steps', type=int, default=600, help='steps of the crowding run')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='bench_neighbours.json', help='JSON file to write the results to')
+    args = parser.parse_args()
+
+    print(f"Separation, one tick - microseconds per body, one body per {args.spacing}x{args.spacing} px")
+    print(f"  {'bodies':>8}{'naive':>10}{'grid':>10}{'numpy':>10}{'nbrs':>7}  match  | contact naive / grid (us)")
+    results = []
+    for count in args.counts:
+        result = bench_queries(count, args.spacing, args.naive_max, args.seed)
+        columns = ''.join(f"{result[key]:>10.2f}" if key in result else f"{'-':>10}" for key in ('naive_us', 'grid_us', 'numpy_us'))
+        match = all(result.get(key, True) for key in ('naive_match', 'numpy_match', 'contact_match'))
+        print(f"  {count:>8}{columns}{result['neighbours']:>7.2f}  {'yes' if match else 'NO':>5}  | "
+              f"{result['contact_naive_us']:>8.1f} / {result['contact_grid_us']:.1f}")
+        results.append(result)
+
+    crowd = {}
+    print(f"\nCrowding - {args.crowd} bodies chasing one point for {args.steps} steps")
+    for label, weight in (('without separation', 0), ('with separation', SEPARATION_WEIGHT)):
+        mean_nearest, stacked = crowding(args.crowd, args.steps, weight, args.seed)
+        crowd[label.replace(' ', '_')] = {'mean_nearest_px': round(mean_nearest, 1), 'stacked': stacked}
+        print(f"  {label:<20} nearest neighbour {mean_nearest:>6.1f} px on average, {stacked} on top of another")
+
+    with open(args.output, 'w') as file:
+        json.dump({'commit': git_commit(), 'spacing': args.spacing, 'results': results, 'crowding': crowd}, file, indent=2)
+    print(f"\nResults written to {args.output}")
@@ -0,0 +1,110 @@
+import argparse
+import json
+from random import Random
+from time import perf_counter
+from settings import *
+from controls import ScriptedInput
+from main import Game
+from simulate import state_digest
+from snapshot import take_snapshot, restore_snapshot
+from bench_frames import BENCH_MAPS, bench_script, spawn_enemies, percentiles, git_commit
+
+# ------------------------------------------------------------------
+# Snapshot benchmark. Plays a headless game for a while at several enemy
+# counts, then measures the size of a world-state snapshot, how long it
+# takes to save and to restore on the same map and from the other map,
+# and compares that with resetting the map through Game.setup(). Every
+# restore is checked against the state digest at the time of the snapshot.
+#
+#   python bench_snapshot.py --enemies 0 100 1000 --repeat 50
+# ------------------------------------------------------------------
+
+
+def time_ms(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = perf_counter()
+        function()
+        timings.append((perf_counter() - start) * 1000)
+    return percentiles(timings)
+
+
+def bench_snapshot(extra_enemies, repeat, frames=300, seed=0):
+    """
+    :param extra_enemies: Enemies spawned on top of the map's own.
+    :param repeat: Number of timed saves and restores.
+    :param frames: Steps played before the snapshot is taken.
+    :return: Dict of results.
+    """
+    map_file, away = BENCH_MAPS['Forest']
+    game = Game(headless=True, seed=seed, controls=ScriptedInput(bench_script(frames, away)))
+    spawn_enemies(game, extra_enemies, Random(seed))
+    game.refresh_swarm()
+    game.take_damage = lambda amount: None
+    try:
+        for _ in range(frames):
+            game.step(FIXED_DT)
+
+        data = take_snapshot(game)
+        digest = state_digest(game)
+        save = time_ms(lambda: take_snapshot(game), repeat)
+
+        # Restore after the world moved on, on the same map
+        def restore_same_map():
+            for _ in range(30):
+                game.step(FIXED_DT)
+            start = perf_counter()
+            restore_snapshot(game, data)
+            return (perf_counter() - start) * 1000
+        same_map = percentiles([restore_same_map() for _ in range(repeat)])
+        same_map_ok = state_digest(game) == digest
+
+        # Restore from the other map, which sets the snapshot's map up from the cache first
+        def restore_other_map():
+            game.setup(SNOW_MAP_FILE)
+            game.current_map = 'Snow'
+            start = perf_counter()
+            restore_snapshot(game, data)
+            return (perf_counter() - start) * 1000
+        other_map = percentiles([restore_other_map() for _ in range(repeat)])
+        other_map_ok = state_digest(game) == digest
+
+        # The old way back to a known state: set the map up again, without the extra enemies
+        reset = time_ms(lambda: game.setup(map_file), repeat)
+    finally:
+        game.preloader.shutdown()
+
+    return {
+        'enemies': extra_enemies + len(game.level.spawns) - 1,
+        'bytes': len(data),
+        'save_ms': save,
+        'restore_same_map_ms': same_map,
+        'restore_other_map_ms': other_map,
+        'setup_ms': reset,
+        'digests_match': same_map_ok and other_map_ok,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark world-state snapshot size and save/restore latency.')
+    parser.add_argument('--enemies', type=int, nargs='+', default=[0, 100, 1000], help='extra enemies to spawn')
+    parser.add_argument('--repeat', type=int, default=50, help='timed saves and restores per enemy count')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='bench_snapshot.json', help='JSON file to write the results to')
+    args = parser.parse_args()
+
+    print(f"Forest - snapshot size and latency (ms, mean / p99)")
+    print(f"  {'enemies':>8}{'bytes':>9}{'save':>16}{'restore':>16}{'other map':>16}{'setup()':>16}  restored")
+    results = []
+    for count in args.enemies:
+        result = bench_snapshot(count, args.repeat, seed=args.seed)
+        timings = ''.join(
+            f"{result[key]['mean']:>9.3f} /{result[key]['p99']:>5.2f}"
+            for key in ('save_ms', 'restore_same_map_ms', 'restore_other_map_ms', 'setup_ms')
+        )
+        print(f"  {result['enemies']:>8}{result['bytes']:>9}{timings}  {'exact' if result['digests_match'] else 'MISMATCH'}")
+        results.append(result)
+
+    with open(args.output, 'w') as file:
+        json.dump({'commit': git_commit(), 'repeat': args.repeat, 'results': results}, file, indent=2)
+    print(f"\nResults written to {args.output}")
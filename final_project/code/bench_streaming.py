@@ -0,0 +1,174 @@
+import argparse
+import json
+from array import array
+from time import perf_counter
+from settings import *
+from controls import ScriptedInput
+from enemy import Enemy
+from main import Game
+from map_bundle import MapData, read_map_data
+from spatial import SpatialGrid
+from bench_frames import percentiles, git_commit
+
+# ------------------------------------------------------------------
+# World streaming benchmark. Tiles the Forest map N x N times into one
+# large map and walks the player through it on a snaking path with
+# streaming on, reporting the resident chunk memory against baking the
+# whole map, the chunks loaded and evicted, the time spent streaming per
+# step and how many of the map's enemies were alive at once. The player
+# walks through walls so the path does not get stuck.
+#
+#   python bench_streaming.py --tiles 4
+# ------------------------------------------------------------------
+
+# Key of the tiled map in the map cache
+BIG_MAP = 'big_forest'
+
+
+def tiled_map_data(map_file, tiles):
+    """
+    Repeats a map tiles x tiles times. The Hero spawns only in the top-left
+    copy; transitions and relic pickups are left out so the player stays on
+    the map and the run is not ended.
+
+    :param map_file: Path of the TMX file to repeat.
+    :param tiles: Number of copies along each axis.
+    :return: MapData of the tiled map, not yet prepared.
+    """
+    source = read_map_data(map_file)
+    width, height = source.width * tiles, source.height * tiles
+
+    layers = {}
+    for layer_name, gids in source.layers.items():
+        tiled = array('I')
+        for row in range(height):
+            start = (row % source.height) * source.width
+            tiled.extend(gids[start:start + source.width] * tiles)
+        layers[layer_name] = tiled
+
+    map_width, map_height = source.width * TILE_SIZE, source.height * TILE_SIZE
+    objects = {layer_name: [] for layer_name in source.objects}
+    for copy_x in range(tiles):
+        for copy_y in range(tiles):
+            for layer_name in ('collision', 'places'):
+                for obj in source.objects[layer_name]:
+                    if obj.name == 'Transition' or (obj.name == 'Hero' and (copy_x or copy_y)):
+                        continue
+                    objects[layer_name].append(obj._replace(x=obj.x + copy_x * map_width, y=obj.y + copy_y * map_height))
+    return MapData(width, height, layers, source.raw_tiles, objects)
+
+
+def snake_script(level, start, speed, margin=400, row_height=600):
+    """
+    Input that sweeps the map in rows: across, down one row, back across, and
+    so on until the bottom is reached.
+
+    :param start: Tuple (x, y) the player starts at.
+    :param speed: Player speed in pixels per second.
+    :return: List of (frames, x, y) for a ScriptedInput.
+    """
+    frames_per_pixel = TICK_RATE / speed
+    across = (level.width - 2 * margin) * frames_per_pixel
+    down = row_height * frames_per_pixel
+    steps = [((start[0] - margin) * frames_per_pixel, -1, 0)]
+    direction = 1
+    y = start[1]
+    while y + row_height < level.height - margin:
+        steps += [(across, direction, 0), (down, 0, 1)]
+        direction = -direction
+        y += row_height
+    steps.append((across, direction, 0))
+    return steps
+
+
+def bench_streaming(tiles, seed=0):
+    """
+    Runs the player through a tiled map with streaming on.
+
+    :param tiles: Number of copies of the Forest map along each axis.
+    :return: Dict of results.
+    """
+    game = Game(headless=True, seed=seed, streaming=True)
+    start = perf_counter()
+    level = game.map_cache.create_level(BIG_MAP, tiled_map_data(FOREST_MAP_FILE, tiles)).build()
+    build_ms = (perf_counter() - start) * 1000
+    game.map_cache.add(level)
+    game.setup(BIG_MAP)
+    game.current_map = BIG_MAP
+
+    # Keep the player alive and let it walk through walls along the path
+    game.take_damage = lambda amount: None
+    game.player.collision_grid = SpatialGrid()
+    script = snake_script(level, game.player.rect.center, game.player.speed)
+    game.controls = game.player.controls = ScriptedInput(script)
+    frames = int(sum(step[0] for step in script))
+
+    streamer = game.streamer
+    timings = []
+    update = streamer.update
+
+    def timed_update(*args, **kwargs):
+        start = perf_counter()
+        try:
+            return update(*args, **kwargs)
+        finally:
+            timings.append((perf_counter() - start) * 1000)
+    streamer.update = timed_update
+
+    peak_enemies = 0
+    try:
+        for _ in range(frames):
+            game.step(FIXED_DT)
+            game.render()
+            peak_enemies = max(peak_enemies, len(streamer.enemies))
+    finally:
+        game.preloader.shutdown()
+
+    # Baking the whole map would fill every chunk that has tiles, at the size of the baked ones
+    stats = streamer.stats()
+    chunk_bytes = level.static_layer.chunk_size ** 2 * game.display_surface.get_bytesize()
+    full_bytes = chunk_bytes * sum(
+        bool(level.chunk_tiles_of(layer, layer_names, (col, row)))
+        for layer, layer_names in level.tile_layers
+        for col in range(streamer.cols) for row in range(streamer.rows)
+    )
+    total_enemies = sum(name in ('Enemy', 'Boss') for name, _ in level.spawns)
+    return {
+        'tiles': tiles,
+        'map_size': [level.width, level.height],
+        'frames': frames,
+        'build_ms': round(build_ms, 1),
+        'peak_resident_kb': stats['peak_memory'] // 1024,
+        'full_bake_kb': full_bytes // 1024,
+        'chunks_loaded': stats['loaded'],
+        'chunks_evicted': stats['evicted'],
+        'streaming_ms': percentiles(timings),
+        'peak_enemies': peak_enemies,
+        'total_enemies': total_enemies,
+        'final_pos': list(game.player.rect.center),
+        'live_enemies': sum(isinstance(sprite, Enemy) for sprite in game.all_sprites),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark world streaming on a tiled copy of the Forest map.')
+    parser.add_argument('--tiles', type=int, nargs='+', default=[4], help='copies of the map along each axis')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='bench_streaming.json', help='JSON file to write the results to')
+    args = parser.parse_args()
+
+    results = []
+    for tiles in args.tiles:
+        result = bench_streaming(tiles, args.seed)
+        stats = result['streaming_ms']
+        print(f"\nForest x{tiles}x{tiles} - {result['map_size'][0]}x{result['map_size'][1]} px, "
+              f"{result['frames']} steps, built in {result['build_ms']:.0f} ms")
+        print(f"  tile memory    {result['peak_resident_kb']} KB peak resident, {result['full_bake_kb']} KB fully baked")
+        print(f"  chunks         {result['chunks_loaded']} loaded, {result['chunks_evicted']} evicted")
+        print(f"  streaming ms   " + '  '.join(f"{key} {stats[key]:.3f}" for key in ('mean', 'p50', 'p99', 'max')))
+        print(f"  enemies        {result['peak_enemies']} alive at most of {result['total_enemies']}")
+        results.append(result)
+
+    with open(args.output, 'w') as file:
+        json.dump({'commit': git_commit(), 'results': results}, file, indent=2)
+    print(f"\nResults written to {args.output}")
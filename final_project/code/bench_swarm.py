@@ -0,0 +1,94 @@
+import argparse
+import json
+from random import Random
+from settings import *
+from controls import ScriptedInput
+from enemy import Enemy
+from main import Game
+from simulate import state_digest
+from bench_frames import BENCH_MAPS, PhaseTimer, bench_script, spawn_enemies, percentiles, git_commit
+
+# ------------------------------------------------------------------
+# Compares the per-object enemy update (every Enemy updates itself, as
+# scheduled by the ActivityScheduler) with the batched NumPy EnemySwarm
+# at several enemy counts. Every enemy is given a chase radius covering
+# the whole map so the full crowd is chasing. Both paths run the same
+# seeded game, so their final state digests should match.
+#
+#   python bench_swarm.py --enemies 10 100 1000 --frames 600
+# ------------------------------------------------------------------
+
+
+def bench_update(map_name, enemies, frames, use_swarm, seed=0, radius=4000):
+    """
+    Runs one headless game and times the sprite and swarm updates of every step.
+
+    :param enemies: Total number of enemies on the map.
+    :param use_swarm: Update the enemies as an EnemySwarm instead of one by one.
+    :param radius: Chase radius given to every enemy.
+    :return: Tuple (per-step update timings in ms, state digest).
+    """
+    map_file, away = BENCH_MAPS[map_name]
+    game = Game(headless=True, seed=seed, controls=ScriptedInput(bench_script(frames, away)))
+    if map_name != game.current_map:
+        game.setup(map_file)
+        game.current_map = map_name
+    game.refresh_swarm(False)
+
+    existing = sum(isinstance(sprite, Enemy) for sprite in game.all_sprites)
+    spawn_enemies(game, max(0, enemies - existing), Random(seed))
+    for sprite in game.all_sprites:
+        if isinstance(sprite, Enemy):
+            sprite.current_radius = sprite.chase_radius = radius
+    game.refresh_swarm(use_swarm)
+    game.take_damage = lambda amount: None
+
+    timer = PhaseTimer()
+    game.all_sprites.update = timer.wrap('update', game.all_sprites.update)
+    if game.activity is not None:
+        game.activity.update = timer.wrap('enemies', game.activity.update)
+        # The neighbour grid is only built for enemies updated one by one
+        game.neighbours.rebuild = timer.wrap('enemies', game.neighbours.rebuild)
+        game.neighbours.touching = timer.wrap('enemies', game.neighbours.touching)
+    if game.swarm is not None:
+        game.swarm.update = timer.wrap('swarm', game.swarm.update)
+    try:
+        for _ in range(frames):
+            game.step(FIXED_DT)
+            timer.end_frame()
+    finally:
+        game.preloader.shutdown()
+
+    samples = timer.samples
+    timings = [sum(times) for times in zip(samples['update'], samples['enemies'], samples['swarm'])]
+    return timings, state_digest(game)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the per-object enemy update against the NumPy swarm.')
+    parser.add_argument('--enemies', type=int, nargs='+', default=[10, 100, 1000], help='enemy counts to compare')
+    parser.add_argument('--frames', type=int, default=600, help='steps to simulate per run')
+    parser.add_argument('--map', default='Forest', choices=list(BENCH_MAPS))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='bench_swarm.json', help='JSON file to write the results to')
+    args = parser.parse_args()
+
+    print(f"{args.map} - {args.frames} steps, update time per step (ms)")
+    print(f"  {'enemies':>8}{'path':>8}{'mean':>9}{'p50':>9}{'p99':>9}{'speedup':>9}  digest")
+    results = []
+    for count in args.enemies:
+        per_object, object_digest = bench_update(args.map, count, args.frames, False, args.seed)
+        batched, swarm_digest = bench_update(args.map, count, args.frames, True, args.seed)
+        per_object, batched = percentiles(per_object), percentiles(batched)
+        speedup = per_object['mean'] / batched['mean'] if batched['mean'] else 0
+        for path, stats, digest in (('object', per_object, object_digest), ('swarm', batched, swarm_digest)):
+            print(f"  {count:>8}{path:>8}" + ''.join(f"{stats[key]:>9.3f}" for key in ('mean', 'p50', 'p99'))
+                  + (f"{speedup:>8.1f}x" if path == 'swarm' else ' ' * 9) + f"  {digest}")
+        results.append({
+            'enemies': count, 'per_object': per_object, 'swarm': batched, 'speedup': round(speedup, 2),
+            'digests_match': object_digest == swarm_digest,
+        })
+
+    with open(args.output, 'w') as file:
+        json.dump({'commit': git_commit(), 'map': args.map, 'frames': args.frames, 'results': results}, file, indent=2)
+    print(f"\nResults written to {args.output}")
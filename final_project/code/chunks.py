@@ -0,0 +1,188 @@
+from settings import *
+from assets import is_opaque
+
+
+class ChunkedLayer:
+    """
+    Static tile layer that is composited once at load time into fixed-size
+    chunk surfaces. Drawing the layer only blits the chunks that overlap the
+    camera instead of every individual tile. Chunks can be baked one at a time
+    in any order; chunks not baked yet are simply not drawn.
+    """
+    def __init__(self, width, height, chunk_size=CHUNK_SIZE):
+        # Pixel size of the whole layer (the scaled map size)
+        self.width = width
+        self.height = height
+        self.chunk_size = chunk_size
+
+        # Chunk surfaces keyed by their (column, row) in the chunk grid
+        self.chunks = {}
+        # Areas of every chunk covered by opaque tiles, as (x, y, width, height) in the chunk
+        self.covered = {}
+        # Number of chunks finished and not evicted, and how many of them were converted as opaque
+        self.baked = 0
+        self.opaque_chunks = 0
+        # Incremented whenever a chunk is finished or evicted, so a drawn frame can tell it is outdated
+        self.revision = 0
+
+
+    def create_chunk(self, key):
+        """
+        Creates an empty, transparent chunk surface for the given chunk grid cell.
+        Chunks on the right and bottom edges are clipped to the layer size.
+
+        :param key: Tuple (column, row) of the chunk in the chunk grid.
+        """
+        col, row = key
+        width = min(self.chunk_size, self.width - col * self.chunk_size)
+        height = min(self.chunk_size, self.height - row * self.chunk_size)
+        chunk = pygame.Surface((width, height), pygame.SRCALPHA).convert_alpha()
+        self.chunks[key] = chunk
+        return chunk
+
+
+    def chunk_keys(self, pos, size):
+        """
+        :param pos: Tuple (x, y) of a top-left corner in world pixels.
+        :param size: Tuple (width, height) in pixels.
+        :return: List of the (column, row) keys of the chunks the area overlaps.
+        """
+        x, y = pos
+        width, height = size
+        chunk_size = self.chunk_size
+        first_col, first_row = int(x) // chunk_size, int(y) // chunk_size
+        last_col, last_row = int(x + width - 1) // chunk_size, int(y + height - 1) // chunk_size
+        if first_col == last_col and first_row == last_row:
+            return [(first_col, first_row)]
+        return [
+            (col, row)
+            for col in range(first_col, last_col + 1)
+            for row in range(first_row, last_row + 1)
+        ]
+
+
+    def chunk_rect(self, key):
+        """
+        :param key: Tuple (column, row) of a chunk.
+        :return: pygame.Rect of the chunk in world pixels.
+        """
+        return pygame.Rect(key[0] * self.chunk_size, key[1] * self.chunk_size, self.chunk_size, self.chunk_size)
+
+
+    def add_tile(self, pos, surf, key=None):
+        """
+        Composites a tile into every chunk it overlaps, or into one of them.
+
+        :param pos: Tuple (x, y) of the tile's top-left corner in world pixels.
+        :param surf: The already scaled tile surface.
+        :param key: Optional (column, row) of the only chunk to composite into.
+        """
+        x, y = pos
+        width, height = surf.get_size()
+        size = self.chunk_size
+        opaque = not surf.get_flags() & pygame.SRCALPHA and surf.get_colorkey() is None
+        for col, row in ((key,) if key is not None else self.chunk_keys(pos, (width, height))):
+            chunk = self.chunks.get((col, row))
+            if chunk is None:
+                chunk = self.create_chunk((col, row))
+            chunk_pos = (x - col * size, y - row * size)
+            chunk.blit(surf, chunk_pos)
+            if opaque:
+                area = pygame.Rect(chunk_pos, (width, height)).clip(chunk.get_rect())
+                self.covered.setdefault((col, row), set()).add(tuple(area))
+
+
+    def finish_chunk(self, key):
+        """
+        Marks a chunk as complete once all its tiles are added. A chunk without
+        any transparent pixel is converted to the display format without
+        per-pixel alpha, which blits faster.
+
+        :param key: Tuple (column, row) of the chunk.
+        """
+        if key in self.chunks and self.is_covered(key):
+            self.chunks[key] = self.chunks[key].convert()
+            self.opaque_chunks += 1
+        self.covered.pop(key, None)
+        self.baked += 1
+        self.revision += 1
+
+
+    def evict_chunk(self, key):
+        """
+        Drops a chunk, e.g. when a streamed chunk is out of range of the player.
+
+        :param key: Tuple (column, row) of the chunk.
+        :return: Bytes of pixel data freed.
+        """
+        self.covered.pop(key, None)
+        chunk = self.chunks.pop(key, None)
+        if chunk is None:
+            return 0
+        self.baked -= 1
+        # Only chunks converted by finish_chunk lose their per-pixel alpha
+        if not chunk.get_flags() & pygame.SRCALPHA:
+            self.opaque_chunks -= 1
+        self.revision += 1
+        return chunk.get_width() * chunk.get_height() * chunk.get_bytesize()
+
+
+    def is_covered(self, key):
+        """
+        Tells whether opaque tiles cover a whole chunk. Grid-aligned tiles never
+        overlap, so their areas add up to the chunk area exactly when they cover
+        it; other layouts are checked pixel by pixel.
+
+        :param key: Tuple (column, row) of the chunk.
+        """
+        chunk = self.chunks[key]
+        areas = [pygame.Rect(area) for area in self.covered.get(key, ())]
+        covered = sum(area.width * area.height for area in areas)
+        if covered < chunk.get_width() * chunk.get_height():
+            return False
+        if any(area.collidelist(areas[index + 1:]) != -1 for index, area in enumerate(areas)):
+            return is_opaque(chunk)
+        return True
+
+
+    def chunk_memory(self, key):
+        """
+        :param key: Tuple (column, row) of a chunk.
+        :return: Bytes of pixel data of the chunk, 0 when it is not baked.
+        """
+        chunk = self.chunks.get(key)
+        if chunk is None:
+            return 0
+        return chunk.get_width() * chunk.get_height() * chunk.get_bytesize()
+
+
+    def memory(self):
+        """
+        :return: Bytes of pixel data held by the chunk surfaces.
+        """
+        return sum(self.chunk_memory(key) for key in self.chunks)
+
+
+    def draw(self, surface, offset):
+        """
+        Blits the chunks that overlap the visible area of the surface, which is
+        its clip rect when one is set.
+
+        :param surface: The surface to draw on (usually the display surface).
+        :param offset: Camera offset (Vector2) added to world positions.
+        :return: Number of chunks blitted.
+        """
+        size = self.chunk_size
+        clip = surface.get_clip()
+        left, top = clip.x - offset.x, clip.y - offset.y
+        right = left + clip.width
+        bottom = top + clip.height
+
+        drawn = 0
+        for col in range(max(0, int(left // size)), int((right - 1) // size) + 1):
+            for row in range(max(0, int(top // size)), int((bottom - 1) // size) + 1):
+                chunk = self.chunks.get((col, row))
+                if chunk is not None:
+                    surface.blit(chunk, (col * size + offset.x, row * size + offset.y))
+                    drawn += 1
+        return drawn
@@ -0,0 +1,205 @@
+from settings import *
+
+
+class Collider:
+    """
+    Static map area that is only ever tested by its rect: a collision box, a
+    transition zone or a relic pickup area. Unlike a sprite it has no image
+    and belongs to no group. It can be indexed in a SpatialGrid like a sprite.
+    """
+    __slots__ = ('rect',)
+
+    def __init__(self, rect):
+        self.rect = pygame.Rect(rect)
+
+
+def merge_collision_rects(rects):
+    """
+    Compiles the collision rects of a map into as few boxes as possible without
+    changing the pixels they block:
+
+    - empty rects, which never collide, are dropped;
+    - two rects are replaced by their union when the union covers nothing else,
+      i.e. one contains the other or they line up and touch or overlap;
+    - rects fully covered by the other rects together are dropped.
+
+    :param rects: Iterable of pygame.Rect in world pixels.
+    :return: List of pygame.Rect, in the order of the rects they came from.
+    """
+    steps = merge_collision_steps(rects)
+    while True:
+        try:
+            next(steps)
+        except StopIteration as done:
+            return done.value
+
+
+def merge_collision_steps(rects, tests_per_step=256):
+    """
+    merge_collision_rects in small steps, so a level can be built over several frames.
+
+    :param rects: Iterable of pygame.Rect in world pixels.
+    :param tests_per_step: Number of rect pairs tested between two steps.
+    :return: Generator that yields after every tests_per_step pairs and every
+             rect tested for being covered, and returns the merged rects
+             (use it with yield from).
+    """
+    merged = [pygame.Rect(rect) for rect in rects if rect.width > 0 and rect.height > 0]
+
+    # Merge pairs until no union is exact any more, as a grown rect may line up with others
+    tests = 0
+    changed = True
+    while changed:
+        changed = False
+        index = 0
+        while index < len(merged):
+            other = index + 1
+            while other < len(merged):
+                tests += 1
+                if tests % tests_per_step == 0:
+                    yield
+                if union_is_exact(merged[index], merged[other]):
+                    merged[index] = merged[index].union(merged.pop(other))
+                    changed = True
+                    other = index + 1
+                else:
+                    other += 1
+            index += 1
+
+    # Drop the rects hidden under the others, smallest first
+    for rect in sorted(merged, key=lambda rect: rect.width * rect.height):
+        others = [other for other in merged if other is not rect and other.colliderect(rect)]
+        if not uncovered_parts(rect, others):
+            merged.remove(rect)
+        yield
+    return merged
+
+
+def union_is_exact(rect, other):
+    """
+    :return: True if the union of the two rects is exactly the area they cover.
+    """
+    union = rect.union(other)
+    overlap = rect.clip(other)
+    covered = rect.width * rect.height + other.width * other.height - overlap.width * overlap.height
+    return union.width * union.height == covered
+
+
+def uncovered_parts(rect, others):
+    """
+    :param rect: pygame.Rect to test.
+    :param others: Iterable of pygame.Rect covering parts of it.
+    :return: List of non-overlapping pygame.Rect of the parts of rect not covered by others.
+    """
+    parts = [rect]
+    for other in others:
+        remaining = []
+        for part in parts:
+            if not part.colliderect(other):
+                remaining.append(part)
+                continue
+            # Split the part around the overlap: full-width bands above and below, sides in between
+            overlap = part.clip(other)
+            pieces = (
+                (part.left, part.top, part.width, overlap.top - part.top),
+                (part.left, overlap.bottom, part.width, part.bottom - overlap.bottom),
+                (part.left, overlap.top, overlap.left - part.left, overlap.height),
+                (overlap.right, overlap.top, part.right - overlap.right, overlap.height),
+            )
+            remaining.extend(pygame.Rect(piece) for piece in pieces if piece[2] > 0 and piece[3] > 0)
+        parts = remaining
+        if not parts:
+            break
+    return parts
+
+
+def sweep(pos, size, delta, grid, max_slides=3):
+    """
+    Moves a box by delta, stopping where it first touches an obstacle and
+    sliding along it with the rest of the movement (swept AABB). The whole path
+    is tested, so a fast box cannot skip over a thin obstacle however long the
+    step. The box ends up touching the obstacles it hits, never overlapping
+    them, and stays clear of them once its position is rounded to pixels.
+
+    Obstacles the box already overlaps when it starts do not block it, so it
+    can move out of them.
+
+    :param pos: Tuple (x, y) of the box's top left corner, with fractions.
+    :param size: Tuple (width, height) of the box.
+    :param delta: Tuple (dx, dy) of the movement.
+    :param grid: SpatialGrid of the obstacles (anything with a rect).
+    :param max_slides: Number of obstacles the box may hit and slide along in one move.
+    :return: Tuple (x, y, hit_x, hit_y): the new top left corner, and whether an
+             obstacle stopped the horizontal or vertical movement.
+    """
+    x, y = pos
+    width, height = size
+    dx, dy = delta
+    hit_x = hit_y = False
+    if not dx and not dy:
+        return x, y, hit_x, hit_y
+
+    # Broad phase: sliding never leaves the bounds of the straight path
+    left, top = min(x, x + dx), min(y, y + dy)
+    bounds = pygame.Rect(int(left) - 1, int(top) - 1, int(abs(dx) + width) + 3, int(abs(dy) + height) + 3)
+    obstacles = [obstacle.rect for obstacle in grid.query(bounds)]
+
+    for _ in range(max_slides):
+        if not dx and not dy:
+            break
+        # Earliest time of impact along the movement, and the axis of the face hit
+        first_time, first_rect, first_axis = 1.0, None, None
+        for rect in obstacles:
+            time, axis = impact_time(x, y, width, height, dx, dy, rect)
+            if time is not None and time < first_time:
+                first_time, first_rect, first_axis = time, rect, axis
+        if first_rect is None:
+            x += dx
+            y += dy
+            break
+
+        # Move up to the obstacle, snapping exactly onto its face, then slide
+        # along it with the remaining movement across the other axis
+        if first_axis == 'x':
+            x = first_rect.left - width if dx > 0 else first_rect.right
+            y += dy * first_time
+            dx, dy = 0.0, dy * (1 - first_time)
+            hit_x = True
+        else:
+            x += dx * first_time
+            y = first_rect.top - height if dy > 0 else first_rect.bottom
+            dx, dy = dx * (1 - first_time), 0.0
+            hit_y = True
+    return x, y, hit_x, hit_y
+
+
+def impact_time(x, y, width, height, dx, dy, rect):
+    """
+    :return: Tuple (time, axis): the fraction of the movement (dx, dy) after
+             which the box first touches the rect, and 'x' or 'y' for the axis of
+             the face it touches; (None, None) if it does not hit the rect, only
+             touches it in passing or already overlaps it.
+    """
+    # Times at which the box enters and leaves the rect's span on each axis
+    if dx > 0:
+        entry_x, exit_x = (rect.left - x - width) / dx, (rect.right - x) / dx
+    elif dx < 0:
+        entry_x, exit_x = (rect.right - x) / dx, (rect.left - x - width) / dx
+    elif x + width <= rect.left or x >= rect.right:
+        return None, None
+    else:
+        entry_x, exit_x = float('-inf'), float('inf')
+
+    if dy > 0:
+        entry_y, exit_y = (rect.top - y - height) / dy, (rect.bottom - y) / dy
+    elif dy < 0:
+        entry_y, exit_y = (rect.bottom - y) / dy, (rect.top - y - height) / dy
+    elif y + height <= rect.top or y >= rect.bottom:
+        return None, None
+    else:
+        entry_y, exit_y = float('-inf'), float('inf')
+
+    entry = max(entry_x, entry_y)
+    if entry < 0 or entry >= 1 or entry >= min(exit_x, exit_y):
+        return None, None
+    return entry, 'x' if entry_x >= entry_y else 'y'
@@ -0,0 +1,48 @@
+import argparse
+import os
+from os import listdir, makedirs
+from os.path import join
+from settings import *
+from map_bundle import map_data_from_tmx, write_bundle, bundle_path, bundle_is_fresh
+
+# ------------------------------------------------------------------
+# Offline build step: compiles every TMX map into a binary bundle that
+# Game.setup loads directly instead of parsing the TMX/TSX XML.
+#
+#   python compile_maps.py          compile maps whose bundle is out of date
+#   python compile_maps.py --force  recompile every map
+# ------------------------------------------------------------------
+
+
+def compile_maps(force=False):
+    """
+    Compiles the TMX files in MAP_FOLDER into bundles in BUNDLE_FOLDER.
+
+    :param force: Recompile maps even when their bundle is up to date.
+    :return: List of the bundle paths that were written.
+    """
+    # Tile surfaces need a display to be converted, a hidden one is enough
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    pygame.display.init()
+    pygame.display.set_mode((1, 1))
+
+    makedirs(BUNDLE_FOLDER, exist_ok=True)
+    written = []
+    for file in sorted(listdir(MAP_FOLDER)):
+        if not file.endswith('.tmx'):
+            continue
+        map_file = join(MAP_FOLDER, file)
+        if not force and bundle_is_fresh(map_file):
+            print(f"{map_file}: up to date")
+            continue
+        write_bundle(map_data_from_tmx(map_file).finish(), bundle_path(map_file))
+        written.append(bundle_path(map_file))
+        print(f"{map_file} -> {bundle_path(map_file)} ({os.path.getsize(bundle_path(map_file)) // 1024} KiB)")
+    return written
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compile TMX maps into binary map bundles.')
+    parser.add_argument('--force', action='store_true', help='recompile maps even if their bundle is up to date')
+    args = parser.parse_args()
+    compile_maps(args.force)
@@ -0,0 +1,191 @@
+import json
+from random import Random
+from settings import *
+from navigation import FlowField
+
+# ------------------------------------------------------------------
+# Input sources for the player. Every source is polled once per game
+# step and then asked for the movement direction of that step, so the
+# live keyboard can be swapped for scripted or recorded input.
+# ------------------------------------------------------------------
+
+
+class KeyboardInput:
+    """
+    Reads the arrow keys (and Escape) from the live keyboard state.
+    """
+    def __init__(self):
+        self.keys = None
+
+    def poll(self):
+        self.keys = pygame.key.get_pressed()
+
+    def get_direction(self):
+        """
+        :return: Tuple (x, y) with each component -1, 0 or 1.
+        """
+        keys = self.keys
+        return (
+            int(keys[pygame.K_RIGHT]) - int(keys[pygame.K_LEFT]),
+            int(keys[pygame.K_DOWN]) - int(keys[pygame.K_UP])
+        )
+
+    def quit_pressed(self):
+        return bool(self.keys[pygame.K_ESCAPE])
+
+
+class ScriptedInput:
+    """
+    Plays back a fixed list of steps, each holding a direction for a number of
+    frames. After the last step the player stands still, or the script starts
+    over when loop is set.
+    """
+    def __init__(self, steps, loop=False):
+        # List of (frames, x, y)
+        self.steps = [(int(frames), x, y) for frames, x, y in steps if int(frames) > 0]
+        self.loop = loop
+        self.step_index = 0
+        self.frames_left = self.steps[0][0] if self.steps else 0
+        self.direction = (0, 0)
+
+    @classmethod
+    def load(cls, path, loop=False):
+        """
+        Loads a script or recording saved as JSON: {"steps": [[frames, x, y], ...]}
+
+        :param path: Path of the JSON file.
+        """
+        with open(path) as file:
+            return cls(json.load(file)['steps'], loop)
+
+    def poll(self):
+        # Skip over finished steps (and empty ones) to the current step
+        while self.frames_left <= 0 and self.step_index < len(self.steps):
+            self.step_index += 1
+            if self.step_index == len(self.steps) and self.loop:
+                self.step_index = 0
+            if self.step_index < len(self.steps):
+                self.frames_left = self.steps[self.step_index][0]
+
+        if self.step_index < len(self.steps):
+            _, x, y = self.steps[self.step_index]
+            self.direction = (x, y)
+            self.frames_left -= 1
+        else:
+            self.direction = (0, 0)
+
+    def get_direction(self):
+        return self.direction
+
+    def quit_pressed(self):
+        return False
+
+
+class InputRecorder:
+    """
+    Wraps another input source and records the direction of every frame, so a
+    live session can be saved and replayed with ScriptedInput.
+    """
+    def __init__(self, source):
+        self.source = source
+        # Run-length encoded recording: list of [frames, x, y]
+        self.steps = []
+
+    def poll(self):
+        self.source.poll()
+        x, y = self.source.get_direction()
+        if self.steps and self.steps[-1][1:] == [x, y]:
+            self.steps[-1][0] += 1
+        else:
+            self.steps.append([1, x, y])
+
+    def get_direction(self):
+        return self.source.get_direction()
+
+    def quit_pressed(self):
+        return self.source.quit_pressed()
+
+    def save(self, path):
+        with open(path, 'w') as file:
+            json.dump({'steps': self.steps}, file)
+
+
+class BotInput:
+    """
+    Seeded computer player for batch simulations. It walks to the relic of the
+    current map while it is there and then to the transition to the other map,
+    following a flow field of the map's colliders. Now and then, and whenever it
+    is stuck, it wanders off in a random direction for a moment, so episodes
+    with different seeds play out differently. Set game before the first poll.
+    """
+    def __init__(self, seed=None, wander=0.01, wander_frames=(15, 45), stuck_frames=20):
+        """
+        :param seed: Seed of the bot's random choices.
+        :param wander: Chance per frame of starting to wander.
+        :param wander_frames: Tuple (fewest, most) frames a wander lasts.
+        :param stuck_frames: Frames without moving after which the bot wanders.
+        """
+        self.rng = Random(seed)
+        self.wander = wander
+        self.wander_frames = wander_frames
+        self.stuck_frames = stuck_frames
+        self.game = None
+
+        # Flow field of every map visited, by map file
+        self.fields = {}
+        self.direction = (0, 0)
+        self.wander_left = 0
+        self.last_pos = None
+        self.still_frames = 0
+
+    def goal(self):
+        """
+        :return: Tuple (x, y) the bot heads for: the relic while it is on the map,
+                 otherwise the nearest transition.
+        """
+        game = self.game
+        # The relic's zones stay until the map is set up again, so ask whether it was collected
+        if game.relic_zones and game.relic_available(game.level.map_file):
+            zones = game.relic_zones
+        else:
+            zones = game.transition_zones
+        x, y = game.player.rect.center
+        return min((zone.rect.center for zone in zones), key=lambda pos: (pos[0] - x) ** 2 + (pos[1] - y) ** 2)
+
+    def poll(self):
+        game = self.game
+        if game is None:
+            self.direction = (0, 0)
+            return
+        pos = game.player.rect.center
+        self.still_frames = self.still_frames + 1 if pos == self.last_pos else 0
+        self.last_pos = pos
+
+        if self.wander_left > 0:
+            self.wander_left -= 1
+            return
+        if self.still_frames >= self.stuck_frames or self.rng.random() < self.wander:
+            self.direction = self.rng.choice([(x, y) for x in (-1, 0, 1) for y in (-1, 0, 1) if x or y])
+            self.wander_left = self.rng.randint(*self.wander_frames)
+            self.still_frames = 0
+            return
+
+        level = game.level
+        field = self.fields.get(level.map_file)
+        if field is None:
+            field = self.fields[level.map_file] = FlowField(level.width, level.height, level.colliders)
+        goal = self.goal()
+        field.update(goal)
+        flow = field.direction_at(pos)
+        if flow is None:
+            # Next to the goal (or no path to it): head straight for it
+            flow = (goal[0] - pos[0], goal[1] - pos[1])
+        # Closest of the eight key directions; a component under sin(22.5 deg) of the length is dropped
+        threshold = 0.38 * (flow[0] ** 2 + flow[1] ** 2) ** 0.5
+        self.direction = tuple((component > threshold) - (component < -threshold) for component in flow)
+
+    def get_direction(self):
+        return self.direction
+
+    def quit_pressed(self):
+        return False
@@ -1,11 +1,13 @@
 import pygame
 from os.path import join
-from os import walk
 from settings import *
+from assets import frame_atlas
+from collision import sweep
 
 
 class Enemy(pygame.sprite.Sprite):
-    def __init__(self, pos, groups, collision_sprites, player, game, speed=225):
+    def __init__(self, pos, groups, collision_grid, player, game, speed=225, flow_field=None,
+                 detect_radius=ENEMY_DETECT_RADIUS, chase_radius=ENEMY_CHASE_RADIUS):
         super().__init__(groups)
         self.game = game
 
@@ -13,9 +15,6 @@ class Enemy(pygame.sprite.Sprite):
         self.width = 16
         self.height = 32
 
-        # Path for the initial enemy image
-        self.object_image = PLAYER_IMAGE_FOLDER + 'sprite_000.png'
-
         # Load all animation frames for movement
         self.load_images()
 
@@ -23,46 +22,43 @@ class Enemy(pygame.sprite.Sprite):
         self.state = 'down'
         self.frame_index = 0
 
-        # Load and scale the default image for initial display
-        self.image = pygame.image.load(self.object_image).convert_alpha()
-        self.image = pygame.transform.smoothscale(
-            self.image, (int(self.width * SCALE_FACTOR), int(self.height * SCALE_FACTOR))
-        )
+        # The first 'down' frame is the default image for initial display
+        self.image = self.frames[self.state][0]
         # Set the initial rect centered at the given position
         self.rect = self.image.get_rect(center=pos)
 
         # Define the hitbox for collision detection (slightly smaller than the sprite)
-        self.pos = pygame.Vector2(self.rect.center)
-
         self.hitbox_rect = self.rect.inflate(0, -30)
+        # Exact position of the hitbox, like the player's
+        self.pos = pygame.Vector2(self.hitbox_rect.topleft)
 
         # Movement settings
         self.player_to_chase = player
-        self.detect_radius = 200
-        self.chase_radius = 700
+        self.detect_radius = detect_radius
+        self.chase_radius = chase_radius
         self.current_radius = self.detect_radius
         self.speed = speed  # Movement speed (pixels per second)
         self.direction = pygame.Vector2()
-        self.collision_sprites = collision_sprites
+        self.collision_grid = collision_grid
+
+        # Shared flow field towards the player, None to chase in a straight line
+        self.flow_field = flow_field
+
+        # EnemySwarm updating this enemy in a batch, None while it updates on its own
+        self.swarm = None
 
 
     def load_images(self):
         """
         Loads animation frames from subdirectories for each movement state.
         Images are located in directories named after the state ('up', 'down', etc.)
+        and are shared with every other sprite through the frame atlas.
         """
-        self.frames = {'left': [], 'right': [], 'up': [], 'down': []}
-        for state in self.frames.keys():
-            # Walk through the image directory for the given state
-            for folder_path, sub_folders, filenames in walk(join('..', 'images', 'player', state)):
-                if filenames:
-                    for file in filenames:
-                        full_path = join(folder_path, file)
-                        surf = pygame.image.load(full_path).convert_alpha()
-                        surf = pygame.transform.smoothscale(
-                            surf, (int(self.width * SCALE_FACTOR), int(self.height * SCALE_FACTOR))
-                        )
-                        self.frames[state].append(surf)
+        self.frames = frame_atlas.load_animation(
+            join('..', 'images', 'player'),
+            ('left', 'right', 'up', 'down'),
+            (int(self.width * SCALE_FACTOR), int(self.height * SCALE_FACTOR))
+        )
 
 
     def chasePlayer(self, player_xy, chase_radius):
@@ -79,48 +75,53 @@ class Enemy(pygame.sprite.Sprite):
             self.direction=pygame.Vector2(0,0)
             self.current_radius = self.detect_radius
 
-        #if within the chase radius, follow the player
+        #if within the chase radius, follow the player around obstacles using the flow field
         else:
-            self.direction = pygame.Vector2(player_x, player_y) - pygame.Vector2(self.rect.center)
-            if self.direction.length() > 0:
-                self.direction = self.direction.normalize()
+            flow = self.flow_field.direction_at(self.rect.center) if self.flow_field else None
+            if flow is not None:
+                self.direction.update(flow)
+            else:
+                # Same cell as the player (or no path): head straight for them
+                self.direction = pygame.Vector2(player_x, player_y) - pygame.Vector2(self.rect.center)
+                if self.direction.length() > 0:
+                    self.direction = self.direction.normalize()
+
+            # Steer away from the enemies close by, so a group does not pile up on one spot
+            if SEPARATION_WEIGHT:
+                push_x, push_y = self.game.neighbours.separation(self)
+                if push_x or push_y:
+                    self.direction.x += push_x * SEPARATION_WEIGHT
+                    self.direction.y += push_y * SEPARATION_WEIGHT
+                    if self.direction.length() > 0:
+                        self.direction = self.direction.normalize()
 
 
     def move(self, dt):
         """
-        Moves the player and handles collision detection.
+        Moves the enemy and handles collision detection.
 
         :param dt: Delta time in seconds from the last frame (ensures smooth movement).
         """
-        # Horizontal movement
-        self.pos.x += self.direction.x * self.speed * dt
-        self.hitbox_rect.x = round(self.pos.x)
-        self.collision('horizontal')
-
-        # Vertical movement
-        self.pos.y += self.direction.y * self.speed * dt
-        self.hitbox_rect.y = round(self.pos.y)
-        self.collision('vertical')
-
+        self.collision(self.direction.x * self.speed * dt, self.direction.y * self.speed * dt)
         # Positional update
         self.rect.center = self.hitbox_rect.center
 
-    def collision(self, direction):
-        for sprite in self.collision_sprites:
-            if sprite.rect.colliderect(self.hitbox_rect):
-                if direction == 'horizontal':
-                    if self.direction.x > 0:  # Moving right
-                        self.hitbox_rect.right = sprite.rect.left -1
-                    elif self.direction.x < 0:  # Moving left
-                        self.hitbox_rect.left = sprite.rect.right +1
-                    self.direction.x = 0  # Stop horizontal movement
-
-                elif direction == 'vertical':
-                    if self.direction.y > 0:  # Moving down
-                        self.hitbox_rect.bottom = sprite.rect.top -1
-                    elif self.direction.y < 0:  # Moving up
-                        self.hitbox_rect.top = sprite.rect.bottom +1
-                    self.direction.y = 0  # Stop vertical movement
+    def collision(self, dx, dy):
+        """
+        Moves the hitbox by (dx, dy), stopping at obstacles on the way and sliding
+        along them (see collision.sweep). Movement into an obstacle stops, so the
+        enemy does not keep walking against it.
+
+        :return: Tuple (hit_x, hit_y), True for the axes an obstacle stopped.
+        """
+        x, y, hit_x, hit_y = sweep(self.pos, self.hitbox_rect.size, (dx, dy), self.collision_grid)
+        self.pos.update(x, y)
+        self.hitbox_rect.topleft = (round(x), round(y))
+        if hit_x:
+            self.direction.x = 0  # Stop horizontal movement
+        if hit_y:
+            self.direction.y = 0  # Stop vertical movement
+        return hit_x, hit_y
 
     def animate(self, dt):
         """
@@ -145,10 +146,12 @@ class Enemy(pygame.sprite.Sprite):
 
 
     def update(self, dt):
-        #Chase and deal damage
+        # Enemies in a swarm are updated by the swarm instead
+        if self.swarm is not None:
+            return
+
+        #Chase; contact damage is dealt by the game for all enemies at once
         self.chasePlayer(self.player_to_chase.rect.center, self.current_radius)
-        if self.rect.colliderect(self.player_to_chase.rect) and not self.game.invincible:
-            self.game.take_damage(1)
 
         self.move(dt)
         self.animate(dt)
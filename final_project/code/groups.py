@@ -1,28 +1,308 @@
 import pygame
-from settings import WINDOW_WIDTH, WINDOW_HEIGHT
+from settings import WINDOW_WIDTH, WINDOW_HEIGHT, INTERPOLATION_MARGIN
+from spatial import SpatialGrid
+from assets import frame_atlas
 
 
 class AllSprites(pygame.sprite.Group):
     """
     Custom sprite group that handles drawing all sprites with a camera offset.
     It centers the view on a specified target, usually the player's position.
+    Sprites are kept in a spatial grid so only those inside the camera view are drawn.
     """
-    def __init__(self):
+    def __init__(self, render_scale=1):
+        """
+        :param render_scale: 1 to draw straight to the display, or SCALE_FACTOR to
+                             draw native-resolution images into a smaller offscreen
+                             surface that is upscaled to the display once per frame.
+                             The static layers must be baked at the same scale.
+        """
         super().__init__()
         self.display_surface = pygame.display.get_surface()
+        self.render_scale = render_scale
+        # Surface the world is drawn on
+        self.surface = self.display_surface
+        if render_scale > 1:
+            self.surface = pygame.Surface((WINDOW_WIDTH // render_scale, WINDOW_HEIGHT // render_scale)).convert()
         # Initialize the camera offset (Vector2 for x and y coordinates)
         self.offset = pygame.Vector2()
+        # Pre-baked static map layers (ChunkedLayer) drawn underneath the sprites
+        self.static_layers = []
+
+        # Spatial index of the sprites, used to find the ones on screen
+        self.grid = SpatialGrid()
+        # Sprites added before they had a rect, indexed on the next update or draw
+        # (a dict to keep them in the order they were added)
+        self.unindexed = {}
+
+        # Sprite positions before the last simulation tick, for interpolated drawing
+        self.previous = {}
+
+        # Screen rect and image of every sprite on screen after the last draw,
+        # compared against in draw_changes() to find the regions that changed
+        self.drawn_rects = {}
+        self.last_offset = None
+        self.needs_full_redraw = True
+        # Revision of the static layers at the last full draw; chunks may be baked
+        # in the background or evicted by the world streamer since
+        self.layer_revision = 0
+
+        # Counts from the last draw, for instrumentation
+        self.drawn = 0
+        self.culled = 0
+        self.chunks_drawn = 0
+        self.dirty_area = 0
+
+    def add_internal(self, sprite, layer=None):
+        super().add_internal(sprite, layer)
+        # Sprites join their groups before setting up their rect
+        self.unindexed[sprite] = None
+
+    def remove_internal(self, sprite):
+        super().remove_internal(sprite)
+        self.unindexed.pop(sprite, None)
+        self.previous.pop(sprite, None)
+        if sprite in self.grid:
+            self.grid.remove(sprite)
+
+    def set_static_layers(self, layers):
+        """
+        Replaces the static map layers drawn underneath the sprites.
+
+        :param layers: List of ChunkedLayer objects, drawn in order.
+        """
+        self.static_layers = list(layers)
+        self.needs_full_redraw = True
+
+    def update(self, dt, profiler=None, skip=()):
+        """
+        Updates every sprite, then moves the ones that crossed grid cells.
+
+        :param dt: Delta time in seconds.
+        :param profiler: Optional Profiler; while enabled every sprite's update is timed.
+        :param skip: Set of sprites updated elsewhere (an EnemySwarm or ActivityScheduler).
+        """
+        sprites = self.sprites()
+        if skip:
+            sprites = [sprite for sprite in sprites if sprite not in skip]
+        if profiler is not None and profiler.enabled:
+            for sprite in sprites:
+                with profiler.span(type(sprite).__name__ + '.update'):
+                    sprite.update(dt)
+        else:
+            for sprite in sprites:
+                sprite.update(dt)
+        self.reindex(sprites)
+
+    def reindex(self, sprites=None):
+        """
+        Brings the spatial grid up to date with the current sprite rects. Runs
+        after every update; call it after moving sprites anywhere else.
+
+        :param sprites: Optional iterable of the sprites that moved, all sprites by default.
+        """
+        if sprites is None:
+            sprites = self.sprites()
+        for sprite in sprites:
+            self.grid.move(sprite)
+        self.index_new()
+
+    def index_new(self):
+        """
+        Adds the sprites created since the last update or draw to the spatial grid.
+        """
+        for sprite in self.unindexed:
+            self.grid.move(sprite)
+        self.unindexed.clear()
 
-    def draw(self, target_pos):
+    def draw(self, target_pos, alpha=1.0):
         """
-        Draws all sprites in the group relative to the target_pos.
+        Draws the sprites inside the camera view relative to the target_pos.
 
         :param target_pos: Tuple (x, y) representing the central point (e.g., player's center)
+        :param alpha: Fraction of the way from the previous simulation tick to the
+                      current one to draw the sprites at (see interpolated_rect).
+        :return: Tuple (drawn, culled) with the number of sprites drawn and skipped.
+        """
+        self.update_offset(target_pos)
+        if self.render_scale > 1:
+            visible = self.draw_low_res(alpha)
+        else:
+            # Draw the visible chunks of the static map layers first
+            self.chunks_drawn = 0
+            for layer in self.static_layers:
+                self.chunks_drawn += layer.draw(self.display_surface, self.offset)
+
+            # Draw each visible dynamic sprite on top with the computed offset
+            visible = self.visible_sprites(alpha)
+            for sprite, rect in visible:
+                adjusted_position = rect.topleft + self.offset
+                self.display_surface.blit(sprite.image, adjusted_position)
+
+        self.remember_drawn(visible)
+        self.needs_full_redraw = False
+        self.layer_revision = self.count_revisions()
+        self.dirty_area = WINDOW_WIDTH * WINDOW_HEIGHT
+        return self.drawn, self.culled
+
+    def draw_low_res(self, alpha=1.0):
+        """
+        Draws the world at 1 / render_scale of the display resolution into the
+        offscreen surface, then upscales it to the display in one go.
+
+        :param alpha: Interpolation between the last two simulation ticks.
+        :return: List of (sprite, interpolated rect) of the sprites drawn.
+        """
+        scale = self.render_scale
+        surface = self.surface
+        surface.fill('black')
+        offset_x, offset_y = self.offset
+
+        self.chunks_drawn = 0
+        layer_offset = pygame.Vector2(offset_x // scale, offset_y // scale)
+        for layer in self.static_layers:
+            self.chunks_drawn += layer.draw(surface, layer_offset)
+
+        visible = self.visible_sprites(alpha)
+        low_res = frame_atlas.low_res
+        for sprite, rect in visible:
+            surface.blit(low_res(sprite.image), ((rect.x + offset_x) // scale, (rect.y + offset_y) // scale))
+
+        pygame.transform.scale(surface, self.display_surface.get_size(), self.display_surface)
+        return visible
+
+    def draw_changes(self, target_pos, extra_rects=(), alpha=1.0):
         """
+        Redraws only the screen regions that changed since the last draw: the old
+        and new rects of the sprites that moved, changed image, appeared or left
+        the view. Falls back to a full redraw when the camera moved or chunks
+        of the static layers were baked or evicted.
+
+        :param target_pos: Tuple (x, y) the camera is centered on.
+        :param extra_rects: Screen rects to redraw as well (e.g. a changed HUD).
+        :param alpha: Interpolation between the last two simulation ticks, as in draw().
+        :return: List of the screen rects redrawn, or None without drawing anything
+                 when the whole screen needs a redraw with draw().
+        """
+        last_offset = self.last_offset
+        self.update_offset(target_pos)
+        if self.needs_full_redraw or last_offset is None or self.offset != last_offset:
+            return None
+        if self.count_revisions() != self.layer_revision:
+            return None
+
+        # Compare the visible sprites against what was drawn last time
+        visible = self.visible_sprites(alpha)
+        dirty = [pygame.Rect(rect) for rect in extra_rects]
+        drawn_rects = self.drawn_rects
+        offset = (int(self.offset.x), int(self.offset.y))
+        seen = set()
+        for sprite, rect in visible:
+            seen.add(sprite)
+            previous = drawn_rects.get(sprite)
+            screen_rect = rect.move(offset)
+            if previous is None:
+                dirty.append(screen_rect)
+            elif previous[0] != screen_rect or previous[1] is not sprite.image:
+                dirty.append(screen_rect)
+                dirty.append(previous[0])
+        for sprite, (rect, image) in drawn_rects.items():
+            if sprite not in seen:
+                dirty.append(rect)
+
+        screen = self.display_surface.get_rect()
+        dirty = merge_rects(rect.clip(screen) for rect in dirty if rect.colliderect(screen))
+
+        # Restore the background of every dirty rect and redraw the sprites over it
+        surface = self.display_surface
+        self.chunks_drawn = 0
+        for rect in dirty:
+            surface.set_clip(rect)
+            surface.fill('black')
+            for layer in self.static_layers:
+                self.chunks_drawn += layer.draw(surface, self.offset)
+            for sprite, sprite_rect in visible:
+                screen_rect = sprite_rect.move(offset)
+                if screen_rect.colliderect(rect):
+                    surface.blit(sprite.image, screen_rect)
+        surface.set_clip(None)
+
+        self.remember_drawn(visible)
+        self.dirty_area = sum(rect.width * rect.height for rect in dirty)
+        return dirty
+
+    def count_revisions(self):
+        return sum(layer.revision for layer in self.static_layers)
+
+    def update_offset(self, target_pos):
         self.offset.x = -(target_pos[0] - WINDOW_WIDTH / 2)
         self.offset.y = -(target_pos[1] - WINDOW_HEIGHT / 2)
 
-        # Draw each sprite with the computed offset
-        for sprite in self:
-            adjusted_position = sprite.rect.topleft + self.offset
-            self.display_surface.blit(sprite.image, adjusted_position)
\ No newline at end of file
+    def store_previous(self):
+        """
+        Remembers where every sprite is before a simulation tick, so frames drawn
+        between two ticks can interpolate the positions.
+        """
+        self.previous = {sprite: sprite.rect.topleft for sprite in self.sprites()}
+
+    def interpolated_rect(self, sprite, alpha=1.0):
+        """
+        :param sprite: A sprite of the group.
+        :param alpha: 0 for the position before the last tick, 1 for the current one.
+        :return: The sprite's rect moved to the interpolated position.
+        """
+        rect = sprite.rect
+        previous = self.previous.get(sprite)
+        if previous is None or alpha >= 1 or previous == rect.topleft:
+            return rect
+        x = previous[0] + (rect.x - previous[0]) * alpha
+        y = previous[1] + (rect.y - previous[1]) * alpha
+        return rect.move(round(x) - rect.x, round(y) - rect.y)
+
+    def visible_sprites(self, alpha=1.0):
+        """
+        :param alpha: Interpolation between the last two simulation ticks.
+        :return: List of (sprite, interpolated rect) of the sprites overlapping
+                 the camera view, in drawing order.
+        """
+        # Index sprites created since the last update
+        self.index_new()
+
+        camera_rect = pygame.Rect(-self.offset.x, -self.offset.y, WINDOW_WIDTH, WINDOW_HEIGHT)
+        if alpha >= 1:
+            return [(sprite, sprite.rect) for sprite in self.grid.query(camera_rect) if sprite.rect.colliderect(camera_rect)]
+
+        # Interpolated sprites may still be drawn just outside their current cells
+        visible = []
+        for sprite in self.grid.query(camera_rect.inflate(INTERPOLATION_MARGIN * 2, INTERPOLATION_MARGIN * 2)):
+            rect = self.interpolated_rect(sprite, alpha)
+            if rect.colliderect(camera_rect):
+                visible.append((sprite, rect))
+        return visible
+
+    def remember_drawn(self, visible):
+        """
+        Stores what was drawn for the next draw_changes() and updates the counts.
+        """
+        offset = (int(self.offset.x), int(self.offset.y))
+        self.drawn_rects = {sprite: (rect.move(offset), sprite.image) for sprite, rect in visible}
+        self.last_offset = pygame.Vector2(self.offset)
+        self.drawn = len(visible)
+        self.culled = len(self) - self.drawn
+
+
+def merge_rects(rects):
+    """
+    Merges overlapping rects into their union, so no region is redrawn twice.
+
+    :param rects: Iterable of pygame.Rect.
+    :return: List of non-overlapping pygame.Rect.
+    """
+    merged = []
+    for rect in rects:
+        index = rect.collidelist(merged)
+        while index != -1:
+            rect = rect.union(merged.pop(index))
+            index = rect.collidelist(merged)
+        merged.append(rect)
+    return merged
@@ -0,0 +1,158 @@
+from collections import OrderedDict
+from settings import *
+
+
+class TextCache:
+    """
+    Keeps the rendered surfaces of recently drawn strings, for text that changes
+    often but keeps coming back to the same values, like an FPS counter or a
+    timer. A string seen before costs one dictionary lookup instead of a font
+    render. Whole strings are cached rather than single characters: one blit
+    per character costs more than the font rendering the string at once.
+    """
+    def __init__(self, font, color=(255, 255, 255), antialias=True, capacity=TEXT_CACHE_SIZE):
+        """
+        :param font: pygame.font.Font the text is rendered with.
+        :param color: Color of the text.
+        :param antialias: Render the text with smooth edges.
+        :param capacity: Number of strings kept; the least recently used are dropped.
+        """
+        self.font = font
+        self.color = color
+        self.antialias = antialias
+        self.capacity = capacity
+        # Rendered surface of every cached string, least recently used first
+        self.surfaces = OrderedDict()
+
+        # Counts for instrumentation
+        self.hits = 0
+        self.misses = 0
+
+
+    def render(self, text):
+        """
+        :return: Surface with the text on it. It is shared, so it must not be drawn on.
+        """
+        surf = self.surfaces.get(text)
+        if surf is not None:
+            self.surfaces.move_to_end(text)
+            self.hits += 1
+            return surf
+
+        surf = self.surfaces[text] = self.font.render(text, self.antialias, self.color)
+        self.misses += 1
+        if len(self.surfaces) > self.capacity:
+            self.surfaces.popitem(last=False)
+        return surf
+
+
+    def draw(self, surface, text, pos):
+        """
+        Draws a line of text onto a surface.
+
+        :param pos: Tuple (x, y) of the top left corner of the text.
+        :return: pygame.Rect of the area drawn.
+        """
+        return surface.blit(self.render(text), pos)
+
+
+class TextWidget:
+    """
+    A line of HUD text bound to a game value. The text surface is only
+    rendered again when the value changes.
+    """
+    def __init__(self, font, source, template='{}', color=(255, 255, 255), pos=(0, 0), cache=None):
+        """
+        :param font: pygame.font.Font the text is rendered with.
+        :param source: Function returning the current value shown.
+        :param template: Format string the value is put into, e.g. 'Life: {}'.
+        :param color: Color of the text.
+        :param pos: Tuple (x, y) of the top left corner on screen.
+        :param cache: Optional TextCache to render the text through (with its font
+                      and color), for values that change often but repeat, like a frame rate.
+        """
+        self.font = font
+        self.source = source
+        self.template = template
+        self.color = color
+        self.pos = pos
+        self.cache = cache
+
+        # Value shown, and its text surface and screen rect, set by update()
+        self.value = None
+        self.image = None
+        self.rect = pygame.Rect(pos, (0, 0))
+        # Number of times the text changed, for instrumentation
+        self.renders = 0
+
+
+    def update(self):
+        """
+        Reads the bound value and renders its text again if it changed.
+
+        :return: True if the text changed.
+        """
+        value = self.source()
+        if self.image is not None and value == self.value:
+            return False
+        self.value = value
+        text = self.template.format(value)
+        if self.cache is not None:
+            self.image = self.cache.render(text)
+        else:
+            self.image = self.font.render(text, True, self.color)
+        self.rect = self.image.get_rect(topleft=self.pos)
+        self.renders += 1
+        return True
+
+
+class Hud:
+    """
+    Retained-mode HUD: a set of widgets composited onto one cached overlay
+    surface. The overlay is rebuilt only when a widget's text changed, so a
+    frame costs one blit of the overlay however many widgets there are.
+    """
+    def __init__(self):
+        self.widgets = []
+        # Transparent surface holding every widget, and its screen rect
+        self.overlay = None
+        self.rect = pygame.Rect(0, 0, 0, 0)
+
+
+    def add(self, widget):
+        """
+        :param widget: TextWidget, or any object with update(), image and rect.
+        :return: The widget.
+        """
+        self.widgets.append(widget)
+        self.overlay = None
+        return widget
+
+
+    def update(self):
+        """
+        Updates every widget and rebuilds the overlay if any of them changed.
+
+        :return: List of the screen rects to redraw: the overlay's old and new
+                 area, or an empty list when nothing changed.
+        """
+        changed = False
+        for widget in self.widgets:
+            changed |= widget.update()
+        if not changed and self.overlay is not None:
+            return []
+
+        old_rect = self.rect
+        rects = [widget.rect for widget in self.widgets]
+        self.rect = rects[0].unionall(rects[1:]) if rects else pygame.Rect(0, 0, 0, 0)
+        self.overlay = pygame.Surface(self.rect.size, pygame.SRCALPHA)
+        self.overlay.blits([(widget.image, widget.rect.move(-self.rect.x, -self.rect.y)) for widget in self.widgets], False)
+        return [old_rect, self.rect]
+
+
+    def draw(self, surface):
+        """
+        Blits the overlay onto a surface, e.g. the display.
+        """
+        if self.overlay is not None:
+            surface.blit(self.overlay, self.rect)
@@ -0,0 +1,348 @@
+from time import perf_counter
+from settings import *
+from collision import Collider, merge_collision_steps
+from chunks import ChunkedLayer
+from spatial import SpatialGrid
+from map_bundle import read_map_data
+from navigation import FlowField
+
+
+class Level:
+    """
+    Parsed and scaled data for one map file. Everything in here is static and
+    is reused every time the map is visited: the baked tile layers, colliders,
+    navigation grid, transition zones and the spawn points of the dynamic objects.
+    """
+    def __init__(self, map_file, map_data=None, render_scale=1, streaming=False):
+        """
+        :param map_file: Path of the TMX file.
+        :param map_data: MapData decoded in advance, or None to read it on build.
+        :param render_scale: World pixels per pixel of the baked tile layers:
+                             1, or SCALE_FACTOR for the low-resolution renderer.
+        :param streaming: Keep the tiles of every chunk instead of baking them, so a
+                          WorldStreamer can bake only the chunks around the player.
+        """
+        self.map_file = map_file
+        self.render_scale = render_scale
+        self.streaming = streaming
+
+        # Decoded map data, read on first build if it was not decoded in advance
+        self.map_data = map_data
+        # Time in milliseconds spent reading the map data, 0 when it was decoded in advance
+        self.parse_ms = 0
+        # Playable once everything but the tiles out of view of the spawn point is built
+        self.playable = False
+        self.ready = False
+
+
+    def build(self):
+        """
+        Builds the whole level at once.
+        """
+        for _ in self.build_steps():
+            pass
+        return self
+
+
+    def build_steps(self):
+        """
+        Builds the level in small steps so the work can be spread over several frames.
+
+        :return: Generator that yields after every bounded unit of work.
+        """
+        # Load the map data from its compiled bundle, or from the TMX using PyTMX
+        if self.map_data is None:
+            start = perf_counter()
+            self.map_data = read_map_data(self.map_file)
+            self.parse_ms = (perf_counter() - start) * 1000
+        map_data = self.map_data
+        # Tiles are baked at the resolution the world is rendered at
+        self.tile_size = TILE_SIZE * SCALE_FACTOR // self.render_scale
+        yield from map_data.prepare(self.tile_size)
+
+        self.width = map_data.width * TILE_SIZE * SCALE_FACTOR
+        self.height = map_data.height * TILE_SIZE * SCALE_FACTOR
+
+        # Collision layer setup: the boxes are merged into as few rects as possible
+        # and indexed once, so movement only tests a few nearby obstacles
+        collision_rects = [scaled_rect(obj) for obj in map_data.objects['collision']]
+        merged_rects = yield from merge_collision_steps(collision_rects)
+        self.colliders = [Collider(rect) for rect in merged_rects]
+        # Number of collision rects in the map and after merging
+        self.collider_counts = (len(collision_rects), len(self.colliders))
+        self.collision_grid = SpatialGrid(self.colliders)
+        yield
+
+        # Walkable grid for the enemies' shared pathfinding
+        # (searched only around the player on streamed maps, which can be any size)
+        self.flow_field = FlowField(self.width, self.height, max_steps=STREAM_NAV_MAX_STEPS if self.streaming else None)
+        yield from self.flow_field.build_steps(self.colliders)
+
+        # Areas that pick up the relic when the player walks into them
+        self.relic_rects = [
+            pygame.Rect(obj.x * SCALE_FACTOR, obj.y * SCALE_FACTOR, obj.width * SCALE_FACTOR, obj.height * SCALE_FACTOR)
+            for obj in map_data.objects['relic_detect']
+        ]
+
+        # Transition zones and the spawn points of the player and enemies
+        self.transition_zones = []
+        self.spawns = []
+        for obj in map_data.objects['places']:
+            if obj.name == 'Transition':
+                self.transition_zones.append(Collider(scaled_rect(obj)))
+            elif obj.name in ('Hero', 'Enemy', 'Boss'):
+                self.spawns.append((obj.name, (obj.x * SCALE_FACTOR, obj.y * SCALE_FACTOR)))
+        self.transition_grid = SpatialGrid(self.transition_zones)
+        yield
+
+        # Ground and object tiles are baked once into chunk surfaces. Relic tiles
+        # get their own layer so they can be hidden once the relic is collected.
+        layer_size = (self.width // self.render_scale, self.height // self.render_scale)
+        self.static_layer = ChunkedLayer(*layer_size)
+        self.relic_layer = ChunkedLayer(*layer_size)
+        # List of (ChunkedLayer, names of the tile layers baked into it in order)
+        self.tile_layers = [
+            (self.static_layer, ('ground', 'objects')),
+            (self.relic_layer, ('relics',)),
+        ]
+        if self.streaming:
+            # Chunks are baked and evicted around the player by a WorldStreamer,
+            # which also adds and removes the colliders of each chunk. The tiles of
+            # a chunk are looked up in the decoded layers when it is baked, so no
+            # per-tile data is kept for the whole map.
+            self.chunk_colliders = self.split_colliders()
+            self.collision_grid = SpatialGrid()
+            # Tiles further than this many tiles up or left of a chunk cannot reach into it
+            largest = max((max(surf.get_size()) for surf in map_data.tiles.values()), default=self.tile_size)
+            self.tile_reach = -(-largest // self.tile_size) - 1
+            self.playable = True
+        else:
+            yield from self.split_layers(self.tile_layers)
+            yield from self.bake_layers()
+            self.chunk_tiles = None
+            # The decoded data is no longer needed once everything is baked
+            self.map_data = None
+        self.ready = True
+
+
+    def spawn_view(self):
+        """
+        :return: pygame.Rect of the area on screen when the player appears at
+                 the Hero spawn point, or of the whole map without one.
+        """
+        for name, pos in self.spawns:
+            if name == 'Hero':
+                # One tile of margin, as the camera centers on the player and not its spawn corner
+                margin = TILE_SIZE * SCALE_FACTOR
+                view = pygame.Rect(0, 0, WINDOW_WIDTH + margin * 2, WINDOW_HEIGHT + margin * 2)
+                view.center = pos
+                return view
+        return pygame.Rect(0, 0, self.width, self.height)
+
+
+    def split_layers(self, layers, tiles_per_step=256):
+        """
+        Sorts the tiles of the tile layers into the chunks of their ChunkedLayers.
+
+        :param layers: List of (ChunkedLayer, names of the tile layers baked into it in order).
+        :param tiles_per_step: Number of tiles sorted between two steps.
+        :return: Generator that yields after every tiles_per_step tiles.
+        """
+        tile_size = self.tile_size
+        # List of (ChunkedLayer, dict of chunk key -> list of (pos, surf) in compositing order)
+        self.chunk_tiles = []
+        count = 0
+        for layer, layer_names in layers:
+            chunk_tiles = {}
+            for layer_name in layer_names:
+                for x, y, image in self.map_data.layer_tiles(layer_name):
+                    pos = (x * tile_size, y * tile_size)
+                    for key in layer.chunk_keys(pos, image.get_size()):
+                        chunk_tiles.setdefault(key, []).append((pos, image))
+                    count += 1
+                    if count % tiles_per_step == 0:
+                        yield
+            self.chunk_tiles.append((layer, chunk_tiles))
+
+
+    def chunk_tiles_of(self, layer, layer_names, key):
+        """
+        Looks up the tiles of one chunk of a streaming level in the decoded layers.
+
+        :param layer: ChunkedLayer the chunk belongs to.
+        :param layer_names: Names of the tile layers baked into it, in order.
+        :param key: Tuple (column, row) of the chunk.
+        :return: List of (pos, surf) overlapping the chunk, in compositing order.
+        """
+        map_data = self.map_data
+        tile_size = self.tile_size
+        rect = layer.chunk_rect(key)
+        cols = range(max(0, rect.left // tile_size - self.tile_reach), min(map_data.width, -(-rect.right // tile_size)))
+        rows = range(max(0, rect.top // tile_size - self.tile_reach), min(map_data.height, -(-rect.bottom // tile_size)))
+        tiles = []
+        for layer_name in layer_names:
+            gids = map_data.layers[layer_name]
+            for row in rows:
+                start = row * map_data.width
+                for col in cols:
+                    gid = gids[start + col]
+                    if gid:
+                        pos = (col * tile_size, row * tile_size)
+                        image = map_data.tiles[gid]
+                        if key in layer.chunk_keys(pos, image.get_size()):
+                            tiles.append((pos, image))
+        return tiles
+
+
+    def split_colliders(self):
+        """
+        :return: Dict of chunk key -> list of the colliders overlapping the chunk.
+        """
+        size = self.chunk_world_size
+        chunk_colliders = {}
+        for collider in self.colliders:
+            rect = collider.rect
+            for col in range(rect.left // size, (rect.right - 1) // size + 1):
+                for row in range(rect.top // size, (rect.bottom - 1) // size + 1):
+                    chunk_colliders.setdefault((col, row), []).append(collider)
+        return chunk_colliders
+
+
+    @property
+    def chunk_world_size(self):
+        """
+        Size in world pixels of the chunks of the tile layers.
+        """
+        return self.static_layer.chunk_size * self.render_scale
+
+
+    def bake_layers(self, tiles_per_step=8):
+        """
+        Composites the tile layers into their ChunkedLayers one chunk at a time,
+        starting with the chunks in view of the Hero spawn point, then outwards
+        from it. Once the chunks in view are done the level is playable, and the
+        rest can be baked while the game already runs.
+
+        :param tiles_per_step: Number of tiles composited between two steps.
+        :return: Generator that yields after every tiles_per_step tiles and every finished chunk.
+        """
+        # Layers are in render pixels, which are world pixels / render_scale
+        scale = self.render_scale
+        view = self.spawn_view()
+        view = pygame.Rect(view.x // scale, view.y // scale, view.width // scale, view.height // scale)
+        near, far = [], []
+        for layer, chunk_tiles in self.chunk_tiles:
+            for key, tiles in chunk_tiles.items():
+                rect = layer.chunk_rect(key)
+                if rect.colliderect(view):
+                    near.append((0, layer, key, tiles))
+                else:
+                    distance = max(abs(rect.centerx - view.centerx), abs(rect.centery - view.centery))
+                    far.append((distance, layer, key, tiles))
+        far.sort(key=lambda chunk: chunk[0])
+
+        self.playable = not near
+        count = 0
+        for index, (_, layer, key, tiles) in enumerate(near + far, 1):
+            for pos, image in tiles:
+                layer.add_tile(pos, image, key)
+                count += 1
+                if count % tiles_per_step == 0:
+                    yield
+            # Converting a finished chunk costs about as much as a step of tiles
+            layer.finish_chunk(key)
+            if index == len(near):
+                self.playable = True
+            yield
+
+
+    def bake_chunk(self, key):
+        """
+        Bakes one chunk of every tile layer of a streaming level.
+
+        :param key: Tuple (column, row) of the chunk.
+        :return: Bytes of pixel data of the baked chunk surfaces.
+        """
+        size = 0
+        for layer, layer_names in self.tile_layers:
+            tiles = self.chunk_tiles_of(layer, layer_names, key)
+            if tiles:
+                for pos, image in tiles:
+                    layer.add_tile(pos, image, key)
+                layer.finish_chunk(key)
+                size += layer.chunk_memory(key)
+        return size
+
+
+    def evict_chunk(self, key):
+        """
+        Drops the baked surfaces of one chunk of every tile layer of a streaming level.
+
+        :param key: Tuple (column, row) of the chunk.
+        :return: Bytes of pixel data freed.
+        """
+        return sum(layer.evict_chunk(key) for layer, _ in self.tile_layers)
+
+
+def scaled_rect(obj):
+    """
+    :param obj: MapObject in map pixels.
+    :return: pygame.Rect of the object in world pixels, the position rounded
+             and the size truncated as for the map's former collider sprites.
+    """
+    rect = pygame.Rect(0, 0, obj.width * SCALE_FACTOR, obj.height * SCALE_FACTOR)
+    rect.topleft = (obj.x * SCALE_FACTOR, obj.y * SCALE_FACTOR)
+    return rect
+
+
+class MapCache:
+    """
+    Keeps the Level of every map file in memory after its first load, so
+    revisiting a map does not parse the TMX or scale its tiles again.
+    """
+    def __init__(self, render_scale=1, streaming=False):
+        """
+        :param render_scale: Render scale the levels are built for (see Level).
+        :param streaming: Build the levels for world streaming (see Level).
+        """
+        self.render_scale = render_scale
+        self.streaming = streaming
+        self.levels = {}
+
+        # Time in milliseconds it took to build each level the first time
+        self.load_times = {}
+
+
+    def get(self, map_file):
+        """
+        Returns the Level for a map file, loading it on the first request.
+
+        :param map_file: Path of the TMX file.
+        """
+        level = self.levels.get(map_file)
+        if level is None:
+            start = perf_counter()
+            level = self.create_level(map_file).build()
+            self.load_times[map_file] = (perf_counter() - start) * 1000
+            self.levels[map_file] = level
+        return level
+
+
+    def create_level(self, map_file, map_data=None):
+        """
+        :return: A new, unbuilt Level with the options of this cache.
+        """
+        return Level(map_file, map_data, self.render_scale, self.streaming)
+
+
+    def add(self, level):
+        """
+        Stores a level that was built elsewhere, e.g. by the background preloader.
+
+        :param level: A fully built Level.
+        """
+        self.levels[level.map_file] = level
+
+
+    def is_cached(self, map_file):
+        return map_file in self.levels
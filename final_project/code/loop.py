@@ -0,0 +1,69 @@
+from settings import *
+
+
+class FixedStepLoop:
+    """
+    Schedules the main loop: the simulation advances in fixed ticks of
+    1 / tick_rate seconds while frames are drawn as often as the frame cap
+    allows. Time left over between ticks is exposed as alpha, so frames can
+    interpolate sprite positions between the last two ticks. Capping the frame
+    rate lets the process sleep between frames instead of spinning a core.
+    """
+    def __init__(self, tick_rate=TICK_RATE, max_fps=MAX_FPS, max_steps=MAX_STEPS_PER_FRAME):
+        """
+        :param tick_rate: Simulation ticks per second.
+        :param max_fps: Frame rate cap, 0 for uncapped (e.g. when vsync paces the frames).
+        :param max_steps: Most ticks simulated for one frame; slower frames drop time.
+        """
+        self.step_dt = 1 / tick_rate
+        self.max_fps = max_fps
+        self.max_steps = max_steps
+        self.clock = pygame.time.Clock()
+        # Real time not simulated yet, in seconds
+        self.accumulator = 0.0
+
+        # Counts for instrumentation
+        self.ticks = 0
+        self.frames = 0
+
+
+    def reset(self):
+        """
+        Forgets the time passed so far, e.g. loading before the first frame,
+        so it is not simulated as catch-up ticks.
+        """
+        self.clock.tick()
+        self.accumulator = 0.0
+
+
+    def begin_frame(self):
+        """
+        Waits for the frame cap (sleeping, not busy-waiting) and adds the real
+        time since the last frame to the time to simulate.
+
+        :return: Duration of the last frame in seconds.
+        """
+        frame_time = self.clock.tick(self.max_fps) / 1000
+        self.accumulator = min(self.accumulator + frame_time, self.max_steps * self.step_dt)
+        self.frames += 1
+        return frame_time
+
+
+    def steps(self):
+        """
+        Yields the fixed delta time once per simulation tick due this frame.
+        """
+        # Time is summed and subtracted in floats, so a tick due exactly (e.g.
+        # the last one of a capped frame) may fall short of step_dt by rounding
+        while self.accumulator >= self.step_dt * (1 - 1e-9):
+            self.accumulator = max(self.accumulator - self.step_dt, 0.0)
+            self.ticks += 1
+            yield self.step_dt
+
+
+    @property
+    def alpha(self):
+        """
+        :return: How far the frame is between the last tick and the next one (0 to 1).
+        """
+        return self.accumulator / self.step_dt
@@ -1,12 +1,30 @@
+from time import perf_counter
+# Start of the imports, for the startup-time report
+IMPORT_START = perf_counter()
+
+import os
 import pygame.key
 
 from settings import *
 from player import Player
 from enemy import Enemy
-from sprites import Sprite, CollisionSprite, TransitionSprite, RelicSprite
-from pytmx.util_pygame import load_pygame
+from swarm import EnemySwarm
+from activity import ActivityScheduler
+from collision import Collider
 from groups import AllSprites
-from random import randint
+from spatial import SpatialGrid, NeighbourGrid
+from level import MapCache
+from streaming import WorldStreamer
+from preload import MapPreloader
+from controls import KeyboardInput
+from profiler import Profiler
+from loop import FixedStepLoop
+from assets import font_cache
+from hud import Hud, TextWidget, TextCache
+from snapshot import save_snapshot, load_snapshot
+from random import Random
+
+IMPORT_MS = (perf_counter() - IMPORT_START) * 1000
 
 
 class Game:
@@ -14,26 +32,68 @@ class Game:
     Main game class responsible for initializing the game, loading map data,
     tracking player health, and running the main game loop.
     """
-    def __init__(self):
-        pygame.init()
+    def __init__(self, headless=False, seed=None, controls=None, low_res=LOW_RES_RENDER, streaming=STREAMING,
+                 enemy_speeds=ENEMY_SPEED_RANGE, boss_speeds=BOSS_SPEED_RANGE, detect_radius=ENEMY_DETECT_RADIUS,
+                 chase_radius=ENEMY_CHASE_RADIUS, invincibility_ms=INVINCIBILITY_MS):
+        """
+        :param headless: Run without a window (SDL dummy video driver), e.g. for
+                         simulations and benchmarks driven through simulate().
+        :param seed: Seed for the random enemy speeds, for reproducible runs.
+        :param controls: Input source for the player, the keyboard by default.
+        :param low_res: Draw the world at native tile resolution and upscale it
+                        to the window once per frame (see LOW_RES_RENDER).
+        :param streaming: Keep only the chunks of the map around the player loaded,
+                          with their colliders and enemies (see STREAMING).
+        :param enemy_speeds: Tuple (lowest, highest) the enemy speeds are drawn from.
+        :param boss_speeds: Tuple (lowest, highest) the boss speeds are drawn from.
+        :param detect_radius: Distance at which an idle enemy starts chasing the player.
+        :param chase_radius: Distance up to which a chasing enemy keeps chasing.
+        :param invincibility_ms: Time the player cannot be hurt after a hit.
+        """
+        # Time in milliseconds of every startup phase, see startup_report()
+        self.startup_times = {'import': IMPORT_MS}
+        start = perf_counter()
+
+        self.headless = headless
+        if headless:
+            os.environ['SDL_VIDEODRIVER'] = 'dummy'
+            os.environ['SDL_AUDIODRIVER'] = 'dummy'
+        # Only the subsystems the game uses; pygame.init() would also start audio
+        pygame.display.init()
+        pygame.font.init()
 
         #display window setup
-        self.display_surface = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
+        self.display_surface = self.create_display(VSYNC and not headless)
         pygame.display.set_caption('Final Project COMP1020')
+        start = self.time_startup('init', start)
+
+        # Seeded random source and input source, so runs can be replayed exactly
+        self.rng = Random(seed)
+        self.controls = controls or KeyboardInput()
+
+        # Fixed-tick scheduler for the main loop; uncapped when vsync paces the frames
+        self.loop = FixedStepLoop(TICK_RATE, 0 if self.vsync else MAX_FPS)
 
-        # Clock for managing frame rates
-        self.clock = pygame.time.Clock()
+        # Optional frame profiler (F3 / CLONE_CHASE_PROFILE), costs next to nothing while off
+        self.profiler = Profiler()
         self.running = True
+        self.outcome = None
+
+        # Simulation time in milliseconds, advanced by every game step
+        self.elapsed_ms = 0
+
+        # World pixels per rendered pixel: SCALE_FACTOR when rendering at low resolution
+        self.render_scale = SCALE_FACTOR if low_res else 1
 
         # Set up sprite groups
-        self.all_sprites = AllSprites()  # For all renderable sprites
-        self.collision_sprites = pygame.sprite.Group()  # For objects that the player collides with
-        self.transition_sprites = pygame.sprite.Group() # For transition zones
-        self.relic_sprites = pygame.sprite.Group() #For relics
+        self.all_sprites = AllSprites(self.render_scale)  # For all renderable sprites
+        self.relic_zones = [] #For relics
 
         #font for UI
-        self.font = pygame.font.SysFont('monospace', 24)
-        self.font2 = pygame.font.SysFont('monospace', 60)
+        start = perf_counter()
+        self.font = font_cache.load('monospace', 24)
+        self.font2 = font_cache.load('monospace', 60)
+        self.time_startup('font', start)
 
         # Player Setup
         self.player_exists = False
@@ -41,134 +101,264 @@ class Game:
         self.invincible = False
         self.invincible_timer = 0
 
+        # Game balance, see the settings of the same names
+        self.enemy_speeds = enemy_speeds
+        self.boss_speeds = boss_speeds
+        self.detect_radius = detect_radius
+        self.chase_radius = chase_radius
+        self.invincibility_ms = invincibility_ms
+
         # Relic setup
         self.relics_collected = 0
         self.snow_relic_collected = False
         self.forest_relic_collected = False
 
 
-        # Load the map to start
+        # Redraw only the changed screen regions while the camera stands still.
+        # The low-resolution path upscales whole frames, so it always redraws fully.
+        self.dirty_rendering = DIRTY_RENDERING and self.render_scale == 1
+
+        # HP and relic UI, rendered again only when the values change
+        self.hud = Hud()
+        self.hud.add(TextWidget(self.font, lambda: self.game_health, 'Life: {}', (255, 0, 0), (20, 20)))
+        self.hud.add(TextWidget(self.font, lambda: self.relics_collected, 'Relics Collected: {}', (255, 255, 0), (20, 50)))
+        if SHOW_FPS:
+            fps_cache = TextCache(self.font, (255, 255, 255))
+            self.hud.add(TextWidget(self.font, lambda: round(self.loop.clock.get_fps()), 'FPS: {}', pos=(20, 80), cache=fps_cache))
+
+        # How the enemies of the current map are updated, set up by refresh_swarm():
+        # as an EnemySwarm, or one by one by an ActivityScheduler. Either way they
+        # are left out of the sprite group's own update.
+        self.swarm = None
+        self.activity = None
+        self.managed_sprites = set()
+        # Enemies updated one by one, in sprite order, and the grid of their
+        # positions rebuilt every step for separation and contact damage
+        self.enemies = []
+        self.neighbours = NeighbourGrid()
+
+        # Loads and evicts the chunks around the player on streamed maps
+        self.streamer = None
+
+        # Parsed maps are kept in memory so transitions only reset dynamic state
+        self.map_cache = MapCache(self.render_scale, streaming)
+        self.preloader = MapPreloader(self.map_cache)
+        self.transition_times = []
+
+        # Load the map to start. With a fast start the game begins once the area
+        # around the spawn point is ready and the preloader bakes the rest.
         self.current_map= "Forest"
-        self.setup(FOREST_MAP_FILE)
+        start = perf_counter()
+        self.setup(FOREST_MAP_FILE, fast_start=FAST_START and not headless)
+        self.startup_times['map parse'] = self.level.parse_ms
+        self.startup_times['sprite build'] = (perf_counter() - start) * 1000 - self.level.parse_ms
+        self.startup_end = perf_counter()
 
 
-    def setup(self, map_file):
+    def time_startup(self, phase, start):
         """
-        Loads map layers, clearing out old data.
+        Records the time since start as a startup phase.
+
+        :return: The current time, to start the next phase from.
         """
-        #Empty collision and sprite objects
-        self.collision_sprites.empty()
+        now = perf_counter()
+        self.startup_times[phase] = (now - start) * 1000
+        return now
+
+
+    def startup_report(self):
+        """
+        :return: Lines with the time spent in every startup phase, from the
+                 imports of this module to the first frame shown.
+        """
+        lines = ['Startup time (ms)']
+        for phase, ms in self.startup_times.items():
+            lines.append(f"  {phase:<14}{ms:8.1f}")
+        return lines
+
+
+    def create_display(self, vsync):
+        """
+        Opens the window, synchronized to the monitor refresh when vsync is set
+        and the platform supports it.
+
+        :return: The display surface.
+        """
+        self.vsync = False
+        if vsync:
+            try:
+                surface = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT), pygame.SCALED, vsync=1)
+                self.vsync = True
+                return surface
+            except pygame.error:
+                pass
+        return pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
+
+
+    def setup(self, map_file, fast_start=False):
+        """
+        Loads a map, clearing out the old dynamic objects. The static map data
+        comes from the map cache, so only the player, enemies and relics are
+        rebuilt when a map is revisited.
+
+        :param fast_start: Return as soon as the map is playable around the spawn
+                           point and let the preloader finish it in the background.
+        """
+        self.preloader.finish(map_file, playable=fast_start)
+        level = self.map_cache.get(map_file)
+        self.level = level
+
+        # The chunks of the previous map are no longer needed
+        if self.streamer is not None:
+            self.streamer.release()
+            self.streamer = None
+
+        # Static map data shared with the cached level
+        self.colliders = level.colliders
+        self.collision_grid = level.collision_grid
+        self.transition_zones = level.transition_zones
+        self.transition_grid = level.transition_grid
+
+        #Empty dynamic sprite objects
         self.all_sprites.empty()
-        self.transition_sprites.empty()
-        self.relic_sprites.empty()
-
-        # Load the map data using PyTMX
-        map_data = load_pygame(map_file)
-        self.display_surface.fill('black')
-        pygame.time.delay(100)
-
-        # Collision layer setup
-        for obj in map_data.get_layer_by_name('collision'):
-            CollisionSprite(
-                (obj.x * SCALE_FACTOR, obj.y * SCALE_FACTOR),
-                pygame.Surface((obj.width * SCALE_FACTOR, obj.height * SCALE_FACTOR)),
-                self.collision_sprites
-            )
-
-        # Base ground layer
-        for x, y, image in map_data.get_layer_by_name('ground').tiles():
-            Sprite((x * TILE_SIZE * SCALE_FACTOR, y * TILE_SIZE * SCALE_FACTOR), image, self.all_sprites)
-
-        # Objects that exist over the ground layer
-        for x, y, image in map_data.get_layer_by_name('objects').tiles():
-            Sprite((x * TILE_SIZE * SCALE_FACTOR, y * TILE_SIZE * SCALE_FACTOR), image, self.all_sprites)
-
-
-        for x, y, image in map_data.get_layer_by_name('relics').tiles():
-            if map_file == SNOW_MAP_FILE and self.snow_relic_collected == False:
-                Sprite((x * TILE_SIZE * SCALE_FACTOR, y * TILE_SIZE * SCALE_FACTOR), image, self.all_sprites)
-            if map_file == FOREST_MAP_FILE and self.forest_relic_collected == False:
-                Sprite((x * TILE_SIZE * SCALE_FACTOR, y * TILE_SIZE * SCALE_FACTOR), image, self.all_sprites)
-
-
-        for obj in map_data.get_layer_by_name('relic_detect'):
-            if map_file == SNOW_MAP_FILE and self.snow_relic_collected == False:
-                self.relic = RelicSprite(
-                    (obj.x * SCALE_FACTOR, obj.y * SCALE_FACTOR),
-                    pygame.Surface((obj.width * SCALE_FACTOR, obj.height * SCALE_FACTOR)),
-                    self.relic_sprites
-                )
-                self.relic_sprites.add(self.relic)
-            if map_file == FOREST_MAP_FILE and self.forest_relic_collected == False:
-                self.relic = RelicSprite(
-                    (obj.x * SCALE_FACTOR, obj.y * SCALE_FACTOR),
-                    pygame.Surface((obj.width * SCALE_FACTOR, obj.height * SCALE_FACTOR)),
-                    self.relic_sprites
-                )
-                self.relic_sprites.add(self.relic)
-
-
-
-        for obj in map_data.get_layer_by_name("places"):
-            if obj.name == 'Hero':
+        self.show_relic(self.relic_available(map_file))
+
+        # (pos, speed) of every enemy, spawned right away or by the streamer with its chunk
+        enemy_spawns = []
+        for name, pos in level.spawns:
+            if name == 'Hero':
                 if self.player_exists:
                     self.player.kill()
                     self.player = None
                     self.player_exists=False
 
-                self.player = Player(
-                    (obj.x * SCALE_FACTOR, obj.y * SCALE_FACTOR),
-                    self.all_sprites,
-                    self.collision_sprites
-                )
+                self.player = Player(pos, self.all_sprites, self.collision_grid, self.controls)
                 self.player_exists=True
 
-            if obj.name == 'Transition':
-                TransitionSprite(
-                    (obj.x * SCALE_FACTOR, obj.y * SCALE_FACTOR),
-                    pygame.Surface((obj.width * SCALE_FACTOR, obj.height * SCALE_FACTOR)),
-                    self.transition_sprites
-                )
-
-            if obj.name == 'Enemy':
-                self.enemy = Enemy(
-                    (obj.x * SCALE_FACTOR, obj.y * SCALE_FACTOR),
-                    self.all_sprites,
-                    self.collision_sprites,
-                    self.player,
-                    self,
-                    randint(200, 280)
-                )
-
-            if obj.name == 'Boss':
-                self.enemy = Enemy(
-                    (obj.x * SCALE_FACTOR, obj.y * SCALE_FACTOR),
-                    self.all_sprites,
-                    self.collision_sprites,
-                    self.player,
-                    self,
-                    randint(300, 380)
-                )
+            if name in ('Enemy', 'Boss'):
+                speed = self.rng.randint(*self.enemy_speeds) if name == 'Enemy' else self.rng.randint(*self.boss_speeds)
+                enemy_spawns.append((pos, speed))
+                if not level.streaming:
+                    self.spawn_enemy(pos, speed)
+
+        if level.streaming:
+            self.streamer = WorldStreamer(level, self.spawn_enemy, enemy_spawns)
+            self.streamer.update(self.player, force=True)
+
+        self.refresh_swarm()
+
+        # Start preparing the maps the transitions lead to
+        self.preloader.request_neighbours(map_file)
+
+
+    def relic_available(self, map_file):
+        """
+        :return: True if the relic of a map has not been collected yet.
+        """
+        return (
+            (map_file == SNOW_MAP_FILE and self.snow_relic_collected == False) or
+            (map_file == FOREST_MAP_FILE and self.forest_relic_collected == False)
+        )
+
+
+    def show_relic(self, available):
+        """
+        Draws the relic tiles of the current map and sets up their pickup zones
+        while the relic can still be collected, or removes both.
+        """
+        level = self.level
+        self.relic_zones.clear()
+        if available:
+            self.all_sprites.set_static_layers([level.static_layer, level.relic_layer])
+            for rect in level.relic_rects:
+                self.relic_zones.append(Collider(rect))
+        else:
+            self.all_sprites.set_static_layers([level.static_layer])
+        self.relic_grid = SpatialGrid(self.relic_zones)
+
+
+    def spawn_enemy(self, pos, speed):
+        """
+        Adds an enemy chasing the player on the current map.
+
+        :param pos: Tuple (x, y) of the enemy's center.
+        :param speed: Movement speed in pixels per second.
+        :return: The new Enemy.
+        """
+        self.enemy = Enemy(pos, self.all_sprites, self.collision_grid, self.player, self, speed, self.level.flow_field,
+                           self.detect_radius, self.chase_radius)
+        return self.enemy
+
+
+    def refresh_swarm(self, enabled=None):
+        """
+        Decides how the enemies of the current map are updated: one by one,
+        scheduled by their distance to the player, or together as an EnemySwarm
+        once there are at least SWARM_MIN_ENEMIES of them. Call it again after
+        spawning or removing enemies.
+
+        :param enabled: True or False to force the swarm on or off, None to decide by count.
+        """
+        old_swarm = self.swarm
+        if old_swarm is not None:
+            old_swarm.sync()
+            for enemy in old_swarm.enemies:
+                enemy.swarm = None
+
+        enemies = [sprite for sprite in self.all_sprites if isinstance(sprite, Enemy)]
+        if enabled is None:
+            enabled = len(enemies) >= SWARM_MIN_ENEMIES
+        self.swarm = None
+        self.activity = None
+        self.enemies = enemies
+        if enabled and enemies and EnemySwarm.available():
+            self.swarm = EnemySwarm(enemies, self.player, self, self.collision_grid, self.level.flow_field)
+            for enemy in enemies:
+                enemy.swarm = self.swarm
+        else:
+            # The scheduler finds the enemies near the player through the sprite grid
+            self.all_sprites.index_new()
+            self.activity = ActivityScheduler(self.all_sprites.grid)
+            for enemy in enemies:
+                self.activity.add(enemy)
+        self.managed_sprites = set(enemies)
 
 
     def map_transition(self, map):
+        cached = self.map_cache.is_cached(map)
+        start = perf_counter()
         self.setup(map)
 
+        # Transition timing, to compare cold loads with cached revisits
+        elapsed = (perf_counter() - start) * 1000
+        self.transition_times.append((map, cached, elapsed))
+
+
+    def transition_report(self):
+        """
+        :return: Lines with the time every map transition of the session took.
+        """
+        lines = ['Map transitions (ms)']
+        for map_file, cached, ms in self.transition_times:
+            lines.append(f"  {os.path.basename(map_file):<18}{ms:8.1f}  {'cached' if cached else 'cold load'}")
+        return lines
+
     def game_over(self):
         #ends the game
-        game_end_text =  "GAME OVER"
-        relic_banner = self.font.render(game_end_text, True, (255, 0, 0))
-        self.display_surface.blit(relic_banner, (450 ,350))
-        pygame.display.update()
-        pygame.time.delay(2800)
-        self.running = False
+        self.outcome = 'lose'
+        self.show_banner("GAME OVER")
 
     def game_win(self):
-        game_end_text = "YOU WIN"
-        relic_banner = self.font.render(game_end_text, True, (255, 0, 0))
-        self.display_surface.blit(relic_banner, (450, 350))
-        pygame.display.update()
-        pygame.time.delay(2800)
+        self.outcome = 'win'
+        self.show_banner("YOU WIN")
+
+    def show_banner(self, game_end_text):
+        # Headless runs end right away instead of showing the banner
+        if not self.headless:
+            relic_banner = self.font.render(game_end_text, True, (255, 0, 0))
+            self.display_surface.blit(relic_banner, (450, 350))
+            pygame.display.update()
+            pygame.time.delay(2800)
         self.running = False
 
     def take_damage(self, amount):
@@ -177,73 +367,273 @@ class Game:
             if self.game_health <= 0:
                 self.game_over()
             self.invincible = True
-            self.invincible_timer = pygame.time.get_ticks()
+            self.invincible_timer = self.elapsed_ms
 
 
-    def run(self):
+    def step(self, dt):
         """
-        The main game loop that handles events, updates game objects,
-        renders frames, and maintains the frame rate.
+        Advances the game world by one step: input, map transitions, relic
+        pick-up, sprite updates and invincibility frames.
+
+        :param dt: Delta time in seconds.
         """
-        while self.running:
-            dt = self.clock.tick() / 1000
-            main_keys = pygame.key.get_pressed()
+        self.elapsed_ms += dt * 1000
+        self.controls.poll()
+
+        #emergency quit button
+        if self.controls.quit_pressed():
+            self.game_over()
+
+        profiler = self.profiler
+        with profiler.span('transitions'):
+            self.check_transitions()
+        with profiler.span('relics'):
+            self.check_relics()
+
+        # Spend a bounded slice of the frame on preloading neighbour maps
+        with profiler.span('preload'):
+            self.preloader.step()
+
+        # Load the chunks the player is heading into and evict far ones on streamed maps
+        if self.streamer is not None:
+            with profiler.span('streaming'):
+                if self.streamer.update(self.player):
+                    self.refresh_swarm()
+
+        # Follow the player with the enemies' shared flow field
+        with profiler.span('navigation'):
+            self.level.flow_field.update(self.player.rect.center)
+
+        # Update all sprites, timing every sprite's update while profiling
+        with profiler.span('update'):
+            self.all_sprites.update(dt, profiler, self.managed_sprites)
+
+        # Enemies updated one by one see each other where they stood at the start
+        # of the step; the same grid finds the ones touching the player in one pass.
+        # The player is queried rather than inserted, so enemies never steer away
+        # from the player they chase
+        if self.swarm is None:
+            with profiler.span('neighbours'):
+                self.neighbours.rebuild(self.enemies)
+                if not self.invincible and self.neighbours.touching(self.player.rect):
+                    self.take_damage(1)
+
+        # Enemies near the player, updated at a rate depending on their distance
+        if self.activity is not None:
+            with profiler.span('enemies'):
+                self.all_sprites.reindex(self.activity.update(self.player.rect.center, dt, profiler))
+
+        # Batched update of the enemies when there are enough of them for a swarm
+        if self.swarm is not None:
+            with profiler.span('swarm'):
+                self.all_sprites.reindex(self.swarm.update(dt))
+
+        # updates i frames
+        if self.invincible and ((self.elapsed_ms - self.invincible_timer) > self.invincibility_ms):
+            self.invincible = False
+
+
+    def check_transitions(self):
+        """
+        Moves to the other map when the player walks into a transition zone.
+        """
+        for transition in self.transition_grid.query(self.player.rect):
+            if self.player.rect.colliderect(transition.rect):
+                if self.current_map == "Snow":
+                    self.map_transition(FOREST_MAP_FILE)
+                    self.current_map = "Forest"
+                else:
+                    self.map_transition(SNOW_MAP_FILE)
+                    self.current_map = "Snow"
 
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    self.running = False
 
-            #emergency quit button
-            if main_keys[pygame.K_ESCAPE]:
-                self.game_over()
+    def check_relics(self):
+        """
+        Collects the relic of the current map when the player walks over it.
+        """
+        for relic in self.relic_grid.query(self.player.rect):
+            if self.player.rect.colliderect(relic.rect):
+                if (self.current_map == "Forest") and (self.forest_relic_collected == False):
+                    self.forest_relic_collected = True
+                    self.relics_collected += 1
+                if (self.current_map == "Snow") and (self.snow_relic_collected == False):
+                    self.snow_relic_collected = True
+                    self.relics_collected += 1
+            if self.relics_collected == 2:
+                self.game_win()
+
+
+    def render(self, alpha=1.0):
+        """
+        Clears and redraws the screen: map, sprites and HUD. With dirty rendering
+        only the regions that changed are redrawn and presented while the camera
+        stands still.
 
-            #check for transitions between maps
-            for transition in self.transition_sprites:
-                if self.player.rect.colliderect(transition.rect):
-                    if self.current_map == "Snow":
-                        self.map_transition(FOREST_MAP_FILE)
-                        self.current_map = "Forest"
-                    else:
-                        self.map_transition(SNOW_MAP_FILE)
-                        self.current_map = "Snow"
-
-            #checks for relic pick up
-            for relic in self.relic_sprites:
-                if self.player.rect.colliderect(relic.rect):
-                    if (self.current_map == "Forest") and (self.forest_relic_collected == False):
-                        self.forest_relic_collected = True
-                        self.relics_collected += 1
-                    if (self.current_map == "Snow") and (self.snow_relic_collected == False):
-                        self.snow_relic_collected = True
-                        self.relics_collected += 1
-                if self.relics_collected == 2:
-                    self.game_win()
-
-            # Update all sprites
-            self.all_sprites.update(dt)
-
-            # Clears and redraws the screen
-            self.display_surface.fill('black')
-            self.all_sprites.draw(self.player.rect.center)
-
-            # updates i frames
-            if self.invincible and ((pygame.time.get_ticks() - self.invincible_timer) >1000):
-                self.invincible = False
-
-            # HP UI
-            text = "Life: " + str(self.game_health)
-            life_banner = self.font.render(text, True, (255, 0, 0))
-            self.display_surface.blit(life_banner, (20, 20))
-            text2 = "Relics Collected: " + str(self.relics_collected)
-            relic_banner = self.font.render(text2, True, (255, 255, 0))
-            self.display_surface.blit(relic_banner, (20, 50))
-
-            # screen update
+        :param alpha: Fraction of the way from the previous simulation tick to the
+                      current one to draw the sprites (and the camera) at.
+        """
+        profiler = self.profiler
+        target_pos = self.all_sprites.interpolated_rect(self.player, alpha).center
+        if self.dirty_rendering and not profiler.enabled and self.render_changes(target_pos, alpha):
+            return
+
+        with profiler.span('draw'):
+            # The low-resolution path overwrites the whole display with its upscale
+            if self.render_scale == 1:
+                self.display_surface.fill('black')
+            self.all_sprites.draw(target_pos, alpha)
+        with profiler.span('hud'):
+            self.draw_hud()
+        profiler.draw(self.display_surface, {
+            'all': self.all_sprites,
+            'collision': self.colliders,
+            'transition': self.transition_zones,
+            'relic': self.relic_zones,
+        }, {
+            'drawn': self.all_sprites.drawn,
+            'culled': self.all_sprites.culled,
+            'chunks': self.all_sprites.chunks_drawn,
+            'asleep': self.activity.asleep if self.activity else 0,
+        })
+        # The overlay covers part of the world, so the next frame starts from scratch
+        if profiler.enabled:
+            self.all_sprites.needs_full_redraw = True
+        with profiler.span('flip'):
+            self.present()
+
+
+    def render_changes(self, target_pos, alpha=1.0):
+        """
+        Dirty-rect rendering: redraws the regions of the sprites that changed and
+        of a changed HUD, and presents only those.
+
+        :param target_pos: Tuple (x, y) the camera is centered on.
+        :param alpha: Interpolation between the last two simulation ticks.
+        :return: False when the whole screen has to be redrawn instead.
+        """
+        # A changed HUD is redrawn over the world under its old and new area
+        extra_rects = self.hud.update()
+
+        dirty = self.all_sprites.draw_changes(target_pos, extra_rects, alpha)
+        if dirty is None:
+            return False
+
+        # Put the HUD back on top of the redrawn regions it covers
+        for rect in dirty:
+            if rect.colliderect(self.hud.rect):
+                self.display_surface.set_clip(rect)
+                self.draw_hud()
+        self.display_surface.set_clip(None)
+        if dirty:
+            self.present(dirty)
+        return True
+
+
+    def draw_hud(self):
+        # HP and relic UI, from the cached overlay
+        self.hud.update()
+        self.hud.draw(self.display_surface)
+
+
+    def present(self, rects=None):
+        """
+        Pushes the frame to the window.
+
+        :param rects: Optional list of the screen rects that changed; the whole
+                      display is updated when None.
+        """
+        if rects is None:
             pygame.display.update()
+        else:
+            pygame.display.update(rects)
+
 
+    def run(self, startup_report=False, transition_report=False):
+        """
+        The main game loop that handles events, updates game objects,
+        renders frames, and maintains the frame rate. The world advances in
+        fixed ticks of FIXED_DT; frames in between draw the sprites interpolated
+        between the last two ticks.
+
+        :param startup_report: Print the startup-time report once the first frame is shown.
+        :param transition_report: Print the map transition times when the game ends.
+        """
+        loop = self.loop
+        loop.reset()
+        while self.running:
+            loop.begin_frame()
+
+            with self.profiler.span('events'):
+                for event in pygame.event.get():
+                    if event.type == pygame.QUIT:
+                        self.running = False
+                    if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                        self.profiler.toggle()
+                    if event.type == pygame.KEYDOWN and event.key == pygame.K_F4:
+                        self.profiler.start_capture()
+                    # Quick save and quick load of the world state
+                    if event.type == pygame.KEYDOWN and event.key == pygame.K_F5:
+                        save_snapshot(self)
+                    if event.type == pygame.KEYDOWN and event.key == pygame.K_F9:
+                        load_snapshot(self)
+
+            for dt in loop.steps():
+                self.all_sprites.store_previous()
+                self.step(dt)
+                if not self.running:
+                    break
+            self.render(loop.alpha)
+            self.profiler.end_frame()
+
+            if 'first frame' not in self.startup_times:
+                self.time_startup('first frame', self.startup_end)
+                self.startup_times['total'] = (perf_counter() - IMPORT_START) * 1000
+                if startup_report:
+                    print('\n'.join(self.startup_report()))
+
+        if transition_report:
+            print('\n'.join(self.transition_report()))
+        self.preloader.shutdown()
         pygame.quit()
 
 
+    def simulate(self, frames, dt=FIXED_DT, render=False):
+        """
+        Advances the world on a fixed timestep as fast as the CPU allows, without
+        reading the keyboard or waiting on the clock. Stops early when the game ends.
+
+        :param frames: Maximum number of steps to simulate.
+        :param dt: Fixed delta time of every step in seconds.
+        :param render: Also draw every frame (to the hidden display when headless).
+        :return: Number of steps simulated.
+        """
+        steps = 0
+        while self.running and steps < frames:
+            pygame.event.pump()
+            self.step(dt)
+            if render:
+                self.render()
+            self.profiler.end_frame()
+            steps += 1
+        return steps
+
+
 if __name__ == '__main__':
-    game = Game()
-    game.run()
\ No newline at end of file
+    import argparse
+    from controls import InputRecorder
+
+    parser = argparse.ArgumentParser(description='Clone Chase')
+    parser.add_argument('--record', metavar='PATH', help='record the player input to a JSON file for simulate.py')
+    parser.add_argument('--startup-report', action='store_true', help='print how long each startup phase took')
+    parser.add_argument('--transition-report', action='store_true', help='print how long each map transition took on exit')
+    parser.add_argument('--low-res', action=argparse.BooleanOptionalAction, default=LOW_RES_RENDER,
+                        help='draw the world at native resolution and upscale it once per frame')
+    parser.add_argument('--streaming', action=argparse.BooleanOptionalAction, default=STREAMING,
+                        help='load only the chunks of the map around the player')
+    args = parser.parse_args()
+
+    controls = InputRecorder(KeyboardInput()) if args.record else None
+    game = Game(controls=controls, low_res=args.low_res, streaming=args.streaming)
+    game.run(startup_report=args.startup_report, transition_report=args.transition_report)
+    if args.record:
+        controls.save(args.record)
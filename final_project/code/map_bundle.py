@@ -0,0 +1,333 @@
+import struct
+import zlib
+from array import array
+from collections import namedtuple
+from os.path import basename, dirname, exists, getmtime, join, normpath, splitext
+from xml.etree import ElementTree
+from settings import *
+from assets import tile_cache
+
+# ------------------------------------------------------------------
+# Map data in the form the game uses it, loaded either from a TMX file
+# through PyTMX or from a compiled binary bundle (see compile_maps.py).
+# ------------------------------------------------------------------
+
+# Object from an object layer, in unscaled map pixels
+MapObject = namedtuple('MapObject', 'name x y width height')
+
+# Tile layers and object layers the game reads from a map
+TILE_LAYERS = ('ground', 'objects', 'relics')
+OBJECT_LAYERS = ('collision', 'places', 'relic_detect')
+
+# Bundle file layout
+BUNDLE_MAGIC = b'CCMB'
+BUNDLE_VERSION = 1
+
+
+class MapData:
+    """
+    Contents of a map: tile index arrays for each tile layer, the image of
+    every tile used by those layers and the objects of each object layer.
+
+    Reading a map only decodes it, which is safe to do off the main thread.
+    The tile images are converted to the display format and scaled afterwards
+    on the main thread by prepare().
+    """
+    def __init__(self, width, height, layers, raw_tiles, objects):
+        # Map size in tiles
+        self.width = width
+        self.height = height
+
+        # Row-major tile index (GID) arrays keyed by layer name, 0 means no tile
+        self.layers = layers
+        # Decoded tile surfaces keyed by GID, waiting to be prepared
+        self.raw_tiles = raw_tiles
+        # Converted and scaled tile surfaces keyed by GID
+        self.tiles = {}
+        # Lists of MapObject keyed by object layer name
+        self.objects = objects
+
+
+    def prepare(self, tile_size=TILE_SIZE * SCALE_FACTOR):
+        """
+        Converts and scales the decoded tiles, one tile per step. Must run on
+        the main thread since it converts surfaces to the display format. Tiles
+        come from the shared tile cache, so maps using the same tiles share them.
+
+        :param tile_size: Size in pixels the tiles are scaled to.
+        :return: Generator that yields after every tile.
+        """
+        size = (tile_size, tile_size)
+        for gid, surf in self.raw_tiles.items():
+            self.tiles[gid] = tile_cache.get(surf, size)
+            yield
+        self.raw_tiles = {}
+
+
+    def finish(self):
+        """
+        Prepares every remaining tile at once.
+        """
+        for _ in self.prepare():
+            pass
+        return self
+
+
+    def placed_tiles(self):
+        """
+        :return: Number of tiles placed on all tile layers.
+        """
+        return sum(len(gids) - gids.count(0) for gids in self.layers.values())
+
+
+    def layer_tiles(self, layer_name):
+        """
+        Yields every placed tile of a tile layer.
+
+        :param layer_name: Name of the tile layer.
+        :return: Generator of (x, y, surface) with x and y in tiles.
+        """
+        gids = self.layers[layer_name]
+        for index, gid in enumerate(gids):
+            if gid:
+                yield index % self.width, index // self.width, self.tiles[gid]
+
+
+def raw_image_loader(filename, colorkey, **kwargs):
+    """
+    PyTMX image loader that only decodes the tileset images. Unlike the loader
+    in pytmx.util_pygame it does not convert the tiles to the display format,
+    so maps can be parsed off the main thread.
+    """
+    from pytmx.util_pygame import handle_transformation
+    image = pygame.image.load(filename)
+
+    def load_image(rect=None, flags=None):
+        tile = image.subsurface(rect) if rect else image.copy()
+        if flags:
+            tile = handle_transformation(tile, flags)
+        if colorkey:
+            tile = tile.copy()
+            tile.set_colorkey(pygame.Color("#{0}".format(colorkey)))
+        return tile
+
+    return load_image
+
+
+def map_data_from_tmx(map_file):
+    """
+    Parses a TMX file with PyTMX, decoding the tileset images without converting them.
+
+    :param map_file: Path of the TMX file.
+    """
+    from pytmx import TiledMap
+    tmx = TiledMap(map_file, image_loader=raw_image_loader)
+
+    layers = {}
+    raw_tiles = {}
+    for layer_name in TILE_LAYERS:
+        gids = array('I', bytes(4 * tmx.width * tmx.height))
+        for x, y, gid in tmx.get_layer_by_name(layer_name).iter_data():
+            if gid:
+                gids[y * tmx.width + x] = gid
+                if gid not in raw_tiles:
+                    raw_tiles[gid] = tmx.get_tile_image_by_gid(gid)
+        layers[layer_name] = gids
+
+    objects = {
+        layer_name: [
+            MapObject(obj.name or '', obj.x, obj.y, obj.width, obj.height)
+            for obj in tmx.get_layer_by_name(layer_name)
+        ]
+        for layer_name in OBJECT_LAYERS
+    }
+    return MapData(tmx.width, tmx.height, layers, raw_tiles, objects)
+
+
+def bundle_path(map_file):
+    """
+    Returns the path of the compiled bundle for a TMX file.
+
+    :param map_file: Path of the TMX file.
+    """
+    return join(BUNDLE_FOLDER, splitext(basename(map_file))[0] + '.bundle')
+
+
+def map_sources(map_file):
+    """
+    Lists the files a map is compiled from: the TMX file, the external
+    tilesets it references and the tileset images.
+
+    :param map_file: Path of the TMX file.
+    :return: List of paths.
+    """
+    sources = [map_file]
+    pending = [map_file]
+    while pending:
+        path = pending.pop()
+        for element in ElementTree.parse(path).iter():
+            source = element.get('source')
+            if source is None or element.tag not in ('tileset', 'image'):
+                continue
+            # Paths in TMX and TSX files are relative to the file referencing them
+            source = normpath(join(dirname(path), source))
+            sources.append(source)
+            if element.tag == 'tileset':
+                pending.append(source)
+    return sources
+
+
+def bundle_is_fresh(map_file):
+    """
+    Checks whether the compiled bundle of a map exists and is newer than its
+    TMX file and the tilesets and images the bundled tile atlas was made from.
+
+    :param map_file: Path of the TMX file.
+    """
+    path = bundle_path(map_file)
+    if not exists(path):
+        return False
+    try:
+        newest = max(getmtime(source) for source in map_sources(map_file))
+    except (OSError, ElementTree.ParseError):
+        # A missing or unreadable source is reported when the TMX is parsed instead
+        return False
+    return getmtime(path) >= newest
+
+
+def read_map_data(map_file):
+    """
+    Decodes a map from its compiled bundle when it is up to date, falling back
+    to parsing the TMX file otherwise. Safe to call off the main thread; the
+    returned MapData still has to be prepared.
+
+    :param map_file: Path of the TMX file.
+    """
+    if bundle_is_fresh(map_file):
+        map_data = read_bundle(bundle_path(map_file))
+        if map_data is not None:
+            return map_data
+    return map_data_from_tmx(map_file)
+
+
+def load_map_data(map_file):
+    """
+    Decodes and prepares a map in one go on the calling (main) thread.
+
+    :param map_file: Path of the TMX file.
+    """
+    return read_map_data(map_file).finish()
+
+
+# ------------------------------------------------------------------
+# Binary bundle format. Everything after the magic and version is
+# zlib-compressed and little-endian:
+#   header   map width, map height, tile size, scale factor
+#   layers   count, then per layer: name, GID array
+#   atlas    tile count, columns, per tile GID, then the RGBA atlas pixels
+#   objects  count, then per object: layer, name, x, y, width, height
+# ------------------------------------------------------------------
+
+def pack_string(text):
+    data = text.encode('utf-8')
+    return struct.pack('<H', len(data)) + data
+
+
+def write_bundle(map_data, path):
+    """
+    Writes map data to a binary bundle, packing the scaled tiles into one atlas image.
+
+    :param map_data: MapData to write.
+    :param path: Path of the bundle file.
+    """
+    tile_size = TILE_SIZE * SCALE_FACTOR
+    parts = [struct.pack('<HHHH', map_data.width, map_data.height, TILE_SIZE, SCALE_FACTOR)]
+
+    parts.append(struct.pack('<H', len(map_data.layers)))
+    for layer_name, gids in map_data.layers.items():
+        parts.append(pack_string(layer_name))
+        parts.append(struct.pack('<I', len(gids)))
+        parts.append(gids.tobytes())
+
+    # Tiles are laid out left to right, top to bottom in a roughly square atlas
+    gids = sorted(map_data.tiles)
+    columns = max(1, int(len(gids) ** 0.5 + 0.999))
+    rows = max(1, (len(gids) + columns - 1) // columns)
+    atlas = pygame.Surface((columns * tile_size, rows * tile_size), pygame.SRCALPHA)
+    for index, gid in enumerate(gids):
+        atlas.blit(map_data.tiles[gid], ((index % columns) * tile_size, (index // columns) * tile_size))
+    parts.append(struct.pack('<HH', len(gids), columns))
+    parts.append(array('I', gids).tobytes())
+    parts.append(pygame.image.tobytes(atlas, 'RGBA'))
+
+    objects = [(layer_name, obj) for layer_name, objs in map_data.objects.items() for obj in objs]
+    parts.append(struct.pack('<I', len(objects)))
+    for layer_name, obj in objects:
+        parts.append(pack_string(layer_name))
+        parts.append(pack_string(obj.name))
+        parts.append(struct.pack('<dddd', obj.x, obj.y, obj.width, obj.height))
+
+    with open(path, 'wb') as file:
+        file.write(BUNDLE_MAGIC + struct.pack('<H', BUNDLE_VERSION))
+        file.write(zlib.compress(b''.join(parts)))
+
+
+def read_bundle(path):
+    """
+    Decodes map data from a binary bundle. Safe to call off the main thread.
+
+    :param path: Path of the bundle file.
+    :return: MapData, or None when the bundle was built with another format
+             version or for a different tile size or scale factor.
+    """
+    with open(path, 'rb') as file:
+        raw = file.read()
+    if raw[:4] != BUNDLE_MAGIC or struct.unpack_from('<H', raw, 4)[0] != BUNDLE_VERSION:
+        return None
+    data = zlib.decompress(raw[6:])
+    offset = 0
+
+    def unpack(fmt):
+        nonlocal offset
+        values = struct.unpack_from(fmt, data, offset)
+        offset += struct.calcsize(fmt)
+        return values
+
+    def unpack_string():
+        nonlocal offset
+        length, = unpack('<H')
+        offset += length
+        return data[offset - length:offset].decode('utf-8')
+
+    width, height, tile_size, scale_factor = unpack('<HHHH')
+    if tile_size != TILE_SIZE or scale_factor != SCALE_FACTOR:
+        return None
+    tile_size *= scale_factor
+
+    layers = {}
+    for _ in range(unpack('<H')[0]):
+        layer_name = unpack_string()
+        count, = unpack('<I')
+        layers[layer_name] = array('I', data[offset:offset + 4 * count])
+        offset += 4 * count
+
+    tile_count, columns = unpack('<HH')
+    gids = array('I', data[offset:offset + 4 * tile_count])
+    offset += 4 * tile_count
+    rows = max(1, (tile_count + columns - 1) // columns)
+    atlas_size = (columns * tile_size, rows * tile_size)
+    atlas_bytes = atlas_size[0] * atlas_size[1] * 4
+    atlas = pygame.image.frombytes(data[offset:offset + atlas_bytes], atlas_size, 'RGBA')
+    offset += atlas_bytes
+    raw_tiles = {
+        gid: atlas.subsurface(((index % columns) * tile_size, (index // columns) * tile_size, tile_size, tile_size))
+        for index, gid in enumerate(gids)
+    }
+
+    objects = {layer_name: [] for layer_name in OBJECT_LAYERS}
+    for _ in range(unpack('<I')[0]):
+        layer_name = unpack_string()
+        name = unpack_string()
+        objects.setdefault(layer_name, []).append(MapObject(name, *unpack('<dddd')))
+
+    return MapData(width, height, layers, raw_tiles, objects)
@@ -0,0 +1,224 @@
+from array import array
+from collections import deque
+from math import hypot
+from settings import *
+
+# Neighbour offsets: the four straight moves first, then the diagonals
+NEIGHBOURS = ((1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (1, -1), (-1, 1), (-1, -1))
+# Link mask of a cell whose links have not been looked at yet
+UNLINKED = 0xFFFF
+
+
+class FlowField:
+    """
+    Shared pathfinding for the enemies. The collision layer is rasterized once
+    into a grid of walkable cells. Whenever the player moves into another cell
+    a single breadth-first search computes the distance of every cell to the
+    player, and each enemy then reads its direction from its own cell with a
+    constant-time lookup instead of searching on its own.
+
+    Per cell of the whole map there are only a walkable byte and a link mask:
+    the links between cells are found the first time a search reaches them,
+    and the distances are kept for the cells reached, so a search limited by
+    max_steps costs the same on a map of any size.
+    """
+    def __init__(self, width, height, colliders=None, cell_size=NAV_CELL_SIZE, max_steps=None):
+        """
+        :param width: Width of the map in pixels.
+        :param height: Height of the map in pixels.
+        :param colliders: Objects whose rects block movement, or None to add
+                          them in steps with build_steps().
+        :param cell_size: Size in pixels of a navigation cell.
+        :param max_steps: Furthest distance in cells searched from the target, None
+                          for the whole map. Cells further away count as unreachable.
+        """
+        self.cell_size = cell_size
+        self.max_steps = max_steps
+        self.cols = -(-int(width) // cell_size)
+        self.rows = -(-int(height) // cell_size)
+
+        # 1 for cells the enemies can walk through, 0 for cells touched by a collider
+        self.walkable = bytearray([1]) * (self.cols * self.rows)
+        if colliders is not None:
+            for _ in self.build_steps(colliders):
+                pass
+
+        # Walkable neighbours of every cell as a bit per entry of NEIGHBOURS,
+        # diagonals only where no corner is cut, UNLINKED until first needed
+        self.link_masks = array('H', [UNLINKED]) * (self.cols * self.rows)
+        # Index offsets of the neighbours of every possible link mask
+        self.mask_offsets = [
+            tuple(dy * self.cols + dx for bit, (dx, dy) in enumerate(NEIGHBOURS) if mask >> bit & 1)
+            for mask in range(1 << len(NEIGHBOURS))
+        ]
+
+        # Steps to the target cell of every cell the last search reached, by cell index
+        self.distance = {}
+        # Next cell towards the target for the cells looked up since the last search
+        self.next_cells = {}
+        self.target = None
+
+        # Number of searches, for instrumentation
+        self.searches = 0
+
+
+    def build_steps(self, colliders, cells_per_step=512):
+        """
+        Marks the cells blocked by the colliders, in small steps so a level can
+        be built over several frames.
+
+        :param colliders: Objects whose rects block movement.
+        :param cells_per_step: Number of cells marked between two steps.
+        :return: Generator that yields after every cells_per_step cells.
+        """
+        cell_size, cols, rows = self.cell_size, self.cols, self.rows
+        walkable = self.walkable
+        count = 0
+        for sprite in colliders:
+            # Shrink by a pixel so colliders that only touch a cell edge do not block it
+            rect = sprite.rect.inflate(-2, -2)
+            for col in range(max(0, rect.left // cell_size), min(cols, rect.right // cell_size + 1)):
+                for row in range(max(0, rect.top // cell_size), min(rows, rect.bottom // cell_size + 1)):
+                    walkable[row * cols + col] = 0
+                    count += 1
+                    if count % cells_per_step == 0:
+                        yield
+
+
+    def find_links(self, index):
+        """
+        :param index: Index of a cell in the grid.
+        :return: Link mask of the walkable cells reachable in one step, a bit per
+                 entry of NEIGHBOURS.
+        """
+        cols, rows, walkable = self.cols, self.rows, self.walkable
+        x, y = index % cols, index // cols
+        mask = 0
+        for bit, (dx, dy) in enumerate(NEIGHBOURS):
+            nx, ny = x + dx, y + dy
+            if not (0 <= nx < cols and 0 <= ny < rows) or not walkable[ny * cols + nx]:
+                continue
+            # No cutting corners past blocked cells
+            if dx and dy and not (walkable[y * cols + nx] and walkable[ny * cols + x]):
+                continue
+            mask |= 1 << bit
+        return mask
+
+
+    def links(self, index):
+        """
+        :param index: Index of a cell in the grid.
+        :return: Tuple of the indices of the walkable cells reachable in one step.
+        """
+        mask = self.link_masks[index]
+        if mask == UNLINKED:
+            mask = self.link_masks[index] = self.find_links(index)
+        return tuple(index + offset for offset in self.mask_offsets[mask])
+
+
+    def cell_of(self, pos):
+        """
+        :param pos: Tuple (x, y) in world pixels.
+        :return: Tuple (column, row) of the cell containing the position.
+        """
+        return int(pos[0]) // self.cell_size, int(pos[1]) // self.cell_size
+
+
+    def update(self, target_pos):
+        """
+        Recomputes the distance map when the target moved into another cell.
+
+        :param target_pos: Tuple (x, y) of the target (the player) in world pixels.
+        :return: True if the field was recomputed.
+        """
+        col, row = self.cell_of(target_pos)
+        col = min(max(col, 0), self.cols - 1)
+        row = min(max(row, 0), self.rows - 1)
+        if (col, row) == self.target:
+            return False
+        self.target = (col, row)
+        self.searches += 1
+        self.next_cells.clear()
+
+        link_masks = self.link_masks
+        mask_offsets = self.mask_offsets
+        find_links = self.find_links
+        max_steps = self.max_steps
+        start = row * self.cols + col
+        distance = {start: 0}
+        queue = deque([start])
+        while queue:
+            index = queue.popleft()
+            next_distance = distance[index] + 1
+            if max_steps is not None and next_distance > max_steps:
+                break
+            mask = link_masks[index]
+            if mask == UNLINKED:
+                mask = link_masks[index] = find_links(index)
+            for offset in mask_offsets[mask]:
+                neighbour = index + offset
+                if neighbour not in distance:
+                    distance[neighbour] = next_distance
+                    queue.append(neighbour)
+        self.distance = distance
+        return True
+
+
+    def direction_at(self, pos):
+        """
+        Returns the direction to walk from a position to get closer to the target:
+        towards the centre of the neighbouring cell with the lowest distance.
+
+        :param pos: Tuple (x, y) in world pixels.
+        :return: Normalized tuple (x, y), or None in the target cell and where the
+                 target cannot be reached (callers then head straight for it).
+        """
+        next_cell = self.next_cell(*self.cell_of(pos))
+        if next_cell is None:
+            return None
+
+        dx = (next_cell[0] + 0.5) * self.cell_size - pos[0]
+        dy = (next_cell[1] + 0.5) * self.cell_size - pos[1]
+        length = hypot(dx, dy)
+        if length == 0:
+            return None
+        return dx / length, dy / length
+
+
+    def next_cell(self, col, row):
+        """
+        Cached version of find_next_cell, shared by every enemy in the same cell.
+
+        :return: Tuple (column, row), or None in the target cell, where the target
+                 cannot be reached and outside the grid.
+        """
+        if not (0 <= col < self.cols and 0 <= row < self.rows):
+            return None
+        index = row * self.cols + col
+        if index in self.next_cells:
+            return self.next_cells[index]
+        next_cell = self.next_cells[index] = self.find_next_cell(col, row)
+        return next_cell
+
+
+    def find_next_cell(self, col, row):
+        """
+        Picks the neighbour of a cell that is closest to the target. Also works
+        from blocked cells, which enemies can partly overlap.
+
+        :return: Tuple (column, row), or None in the target cell or when unreachable.
+        """
+        distance = self.distance
+        index = row * self.cols + col
+        best_distance = distance.get(index, float('inf'))
+        if best_distance == 0:
+            return None
+
+        best = None
+        for neighbour in self.links(index):
+            neighbour_distance = distance.get(neighbour)
+            if neighbour_distance is not None and neighbour_distance < best_distance:
+                best, best_distance = neighbour, neighbour_distance
+        if best is None:
+            return None
+        return best % self.cols, best // self.cols
@@ -1,7 +1,8 @@
 import pygame
 from os.path import join
-from os import walk
 from settings import *
+from assets import frame_atlas
+from collision import sweep
 
 
 class Player(pygame.sprite.Sprite):
@@ -10,16 +11,13 @@ class Player(pygame.sprite.Sprite):
     and collision detection for the main character.
     """
 
-    def __init__(self, pos, groups, collision_sprites):
+    def __init__(self, pos, groups, collision_grid, controls):
         super().__init__(groups)
 
         # Dimensions of the player sprite before scaling
         self.width = 16
         self.height = 32
 
-        # Path for the initial player image
-        self.object_image = PLAYER_IMAGE_FOLDER + 'sprite_000.png'
-
         # Load all animation frames for movement
         self.load_images()
 
@@ -27,50 +25,45 @@ class Player(pygame.sprite.Sprite):
         self.state = 'down'
         self.frame_index = 0
 
-        # Load and scale the default image for initial display
-        self.image = pygame.image.load(self.object_image).convert_alpha()
-        self.image = pygame.transform.smoothscale(
-            self.image, (int(self.width * SCALE_FACTOR), int(self.height * SCALE_FACTOR))
-        )
+        # The first 'down' frame is the default image for initial display
+        self.image = self.frames[self.state][0]
         # Set the initial rect centered at the given position
         self.rect = self.image.get_rect(center=pos)
 
         # Define the hitbox for collision detection (slightly smaller than the sprite)
         self.hitbox_rect = self.rect.inflate(0, -30)
+        # Exact position of the hitbox; the Rect only holds whole pixels, so moving
+        # it directly would drop the fraction of every step's movement
+        self.pos = pygame.Vector2(self.hitbox_rect.topleft)
 
         # Movement settings
         self.direction = pygame.Vector2()
         self.speed = 400
-        self.collision_sprites = collision_sprites
+        self.collision_grid = collision_grid
+
+        # Input source (keyboard, scripted or recorded), polled by the game each step
+        self.controls = controls
 
 
     def load_images(self):
         """
         Loads animation frames from subdirectories for each movement state.
         Images are located in directories named after the state ('up', 'down', etc.)
+        and are shared with every other sprite through the frame atlas.
         """
-        self.frames = {'left': [], 'right': [], 'up': [], 'down': []}
-        for state in self.frames.keys():
-            # Walk through the image directory for the given state
-            for folder_path, sub_folders, filenames in walk(join('..', 'images', 'player', state)):
-                if filenames:
-                    for file in filenames:
-                        full_path = join(folder_path, file)
-                        surf = pygame.image.load(full_path).convert_alpha()
-                        surf = pygame.transform.smoothscale(
-                            surf, (int(self.width * SCALE_FACTOR), int(self.height * SCALE_FACTOR))
-                        )
-                        self.frames[state].append(surf)
+        self.frames = frame_atlas.load_animation(
+            join('..', 'images', 'player'),
+            ('left', 'right', 'up', 'down'),
+            (int(self.width * SCALE_FACTOR), int(self.height * SCALE_FACTOR))
+        )
 
 
     def input(self):
         """
-        Processes keyboard input to update the movement direction of the player.
-        Arrow keys control movement along the x and y axes.
+        Processes input to update the movement direction of the player.
+        Arrow keys (or the scripted input) control movement along the x and y axes.
         """
-        keys = pygame.key.get_pressed()
-        self.direction.x = int(keys[pygame.K_RIGHT]) - int(keys[pygame.K_LEFT])
-        self.direction.y = int(keys[pygame.K_DOWN]) - int(keys[pygame.K_UP])
+        self.direction.x, self.direction.y = self.controls.get_direction()
         # Normalize the vector to ensure consistent speed in diagonal movement
         if self.direction.length() != 0:
             self.direction = self.direction.normalize()
@@ -82,36 +75,22 @@ class Player(pygame.sprite.Sprite):
 
         :param dt: Delta time in seconds from the last frame (ensures smooth movement).
         """
-        # Move horizontally, then resolve horizontal collisions
-        self.hitbox_rect.x += self.direction.x * self.speed * dt
-        self.collision('horizontal')
-
-        # Move vertically, then resolve vertical collisions
-        self.hitbox_rect.y += self.direction.y * self.speed * dt
-        self.collision('vertical')
-
+        self.collision(self.direction.x * self.speed * dt, self.direction.y * self.speed * dt)
         # Align the visible sprite's rect with the hitbox
         self.rect.center = self.hitbox_rect.center
 
 
-    def collision(self, direction):
+    def collision(self, dx, dy):
         """
-        Checks for collisions in a specific direction and adjusts the hitbox accordingly.
+        Moves the hitbox by (dx, dy), stopping at obstacles on the way and sliding
+        along them (see collision.sweep).
 
-        :param direction: String indicator ("horizontal" or "vertical")
+        :return: Tuple (hit_x, hit_y), True for the axes an obstacle stopped.
         """
-        for sprite in self.collision_sprites:
-            if sprite.rect.colliderect(self.hitbox_rect):
-                if direction == 'horizontal':
-                    if self.direction.x > 0:  # Moving right
-                        self.hitbox_rect.right = sprite.rect.left
-                    elif self.direction.x < 0:  # Moving left
-                        self.hitbox_rect.left = sprite.rect.right
-                elif direction == 'vertical':
-                    if self.direction.y < 0:  # Moving up
-                        self.hitbox_rect.top = sprite.rect.bottom
-                    elif self.direction.y > 0:  # Moving down
-                        self.hitbox_rect.bottom = sprite.rect.top
+        x, y, hit_x, hit_y = sweep(self.pos, self.hitbox_rect.size, (dx, dy), self.collision_grid)
+        self.pos.update(x, y)
+        self.hitbox_rect.topleft = (round(x), round(y))
+        return hit_x, hit_y
 
 
     def animate(self, dt):
@@ -0,0 +1,98 @@
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+from settings import *
+from map_bundle import read_map_data
+
+
+class MapPreloader:
+    """
+    Prepares the maps next to the current one before the player reaches a
+    transition. The TMX/bundle is decoded on a worker thread, then the level
+    is built on the main thread in small slices bounded by a per-frame time
+    budget, and finally stored in the map cache. After a fast start it also
+    finishes the start map in the same slices.
+    """
+    def __init__(self, map_cache, budget_ms=PRELOAD_BUDGET_MS):
+        self.map_cache = map_cache
+        self.budget_ms = budget_ms
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='map-preload')
+
+        # Maps being decoded on the worker thread, keyed by map file
+        self.decoding = {}
+        # Levels being built on the main thread: map file -> (level, build steps)
+        self.building = {}
+
+
+    def request(self, map_file):
+        """
+        Starts preloading a map unless it is already cached or in progress.
+
+        :param map_file: Path of the TMX file.
+        """
+        if self.map_cache.is_cached(map_file) or map_file in self.decoding or map_file in self.building:
+            return
+        self.decoding[map_file] = self.executor.submit(read_map_data, map_file)
+
+
+    def request_neighbours(self, map_file):
+        """
+        Starts preloading every map reachable through a transition from the given map.
+
+        :param map_file: Path of the TMX file that was just loaded.
+        """
+        for neighbour in NEIGHBOUR_MAPS.get(map_file, ()):
+            self.request(neighbour)
+
+
+    def step(self):
+        """
+        Advances the preloading by at most the per-frame time budget. Called
+        once per frame from the main loop.
+        """
+        deadline = perf_counter() + self.budget_ms / 1000
+
+        # Move decoded maps over to the main-thread build stage
+        for map_file, future in list(self.decoding.items()):
+            if future.done():
+                del self.decoding[map_file]
+                level = self.map_cache.create_level(map_file, future.result())
+                self.building[map_file] = (level, level.build_steps())
+
+        for map_file, (level, steps) in list(self.building.items()):
+            for _ in steps:
+                if perf_counter() >= deadline:
+                    return
+            del self.building[map_file]
+            self.map_cache.add(level)
+
+
+    def finish(self, map_file, playable=False):
+        """
+        Completes the preloading of a map right away, e.g. when the player
+        reaches the transition before it finished in the background.
+
+        :param map_file: Path of the TMX file.
+        :param playable: Only build the level until it is playable, starting the
+                         build here if needed, and leave the rest to step(). The
+                         level is added to the map cache right away.
+        """
+        future = self.decoding.pop(map_file, None)
+        if future is not None:
+            level = self.map_cache.create_level(map_file, future.result())
+            self.building[map_file] = (level, level.build_steps())
+        elif playable and map_file not in self.building and not self.map_cache.is_cached(map_file):
+            level = self.map_cache.create_level(map_file)
+            self.building[map_file] = (level, level.build_steps())
+
+        if map_file in self.building:
+            level, steps = self.building[map_file]
+            for _ in steps:
+                if playable and level.playable:
+                    break
+            else:
+                del self.building[map_file]
+            self.map_cache.add(level)
+
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
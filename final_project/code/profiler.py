@@ -0,0 +1,236 @@
+import cProfile
+import json
+import os
+from collections import deque
+from time import perf_counter, strftime
+from settings import *
+from assets import font_cache
+
+
+class NullSpan:
+    """
+    Span returned while the profiler is off; entering and leaving it does nothing.
+    """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_SPAN = NullSpan()
+
+
+class Span:
+    """
+    Times one named stage of the frame and adds it to the profiler.
+    """
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        end = perf_counter()
+        self.profiler.add(self.name, self.start, end)
+        return False
+
+
+class Profiler:
+    """
+    Optional frame profiler. Times named spans around the stages of the main
+    loop, keeps a rolling history of frame and stage times, draws an overlay
+    with FPS, a frame-time graph, sprite counts and the most expensive stages,
+    and can dump a cProfile + JSON trace of a window of frames.
+
+    Toggled with F3 (or the CLONE_CHASE_PROFILE environment variable); F4
+    captures a trace. While off, every span is a shared no-op object.
+    """
+    def __init__(self, enabled=None, history=PROFILER_HISTORY):
+        if enabled is None:
+            enabled = os.environ.get(PROFILER_ENV_VAR, '') not in ('', '0')
+        self.enabled = enabled
+
+        # Rolling frame times and per-stage times (ms), one entry per frame
+        self.frame_times = deque(maxlen=history)
+        self.stage_times = {}
+        self.history = history
+        # Frame-time histogram of the frames in frame_times: count of frames per
+        # bucket of PROFILER_BUCKET_MS, the last bucket holding the slower ones
+        self.histogram = [0] * PROFILER_BUCKETS
+
+        # Stage totals of the frame in progress
+        self.current = {}
+        self.frame_start = perf_counter()
+
+        # Trace capture state
+        self.capture_frames = 0
+        self.capture_profile = None
+        self.trace_events = []
+        self.font = None
+
+
+    def toggle(self):
+        self.enabled = not self.enabled
+        self.frame_start = perf_counter()
+        self.current.clear()
+
+
+    def span(self, name):
+        """
+        Returns a context manager timing the named stage, or a no-op one while off.
+        """
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name)
+
+
+    def add(self, name, start, end):
+        self.current[name] = self.current.get(name, 0.0) + (end - start) * 1000
+        if self.capture_frames:
+            self.trace_events.append({
+                'name': name, 'ph': 'X', 'pid': 0, 'tid': 0,
+                'ts': round(start * 1e6, 1), 'dur': round((end - start) * 1e6, 1),
+            })
+
+
+    def end_frame(self):
+        """
+        Closes the current frame: stores its total and stage times, and advances
+        a running trace capture. Called once at the end of every frame.
+        """
+        if not self.enabled:
+            return
+        now = perf_counter()
+        frame_ms = (now - self.frame_start) * 1000
+        self.frame_start = now
+
+        # The histogram follows the rolling window: the frame dropped from it leaves its bucket
+        if len(self.frame_times) == self.frame_times.maxlen:
+            self.histogram[self.bucket(self.frame_times[0])] -= 1
+        self.frame_times.append(frame_ms)
+        self.histogram[self.bucket(frame_ms)] += 1
+        for name in self.stage_times.keys() | self.current.keys():
+            times = self.stage_times.get(name)
+            if times is None:
+                times = self.stage_times[name] = deque(maxlen=self.history)
+            times.append(self.current.get(name, 0.0))
+        self.current.clear()
+
+        if self.capture_frames:
+            self.trace_events.append({'name': 'frame', 'ph': 'i', 's': 'g', 'pid': 0, 'tid': 0, 'ts': round(now * 1e6, 1)})
+            self.capture_frames -= 1
+            if self.capture_frames == 0:
+                self.finish_capture()
+
+
+    @staticmethod
+    def bucket(frame_ms):
+        """
+        :return: Index of the histogram bucket of a frame time in milliseconds.
+        """
+        return min(int(frame_ms / PROFILER_BUCKET_MS), PROFILER_BUCKETS - 1)
+
+
+    def start_capture(self, frames=PROFILER_CAPTURE_FRAMES):
+        """
+        Records a cProfile profile and a trace of the spans for the next frames.
+        The files are written to PROFILER_OUTPUT_FOLDER once the window is over.
+
+        :param frames: Number of frames to capture.
+        """
+        if self.capture_frames:
+            return
+        self.enabled = True
+        self.capture_frames = frames
+        self.trace_events = []
+        self.capture_profile = cProfile.Profile()
+        self.capture_profile.enable()
+
+
+    def finish_capture(self):
+        self.capture_profile.disable()
+        os.makedirs(PROFILER_OUTPUT_FOLDER, exist_ok=True)
+        base = os.path.join(PROFILER_OUTPUT_FOLDER, 'frames_' + strftime('%Y%m%d_%H%M%S'))
+        self.capture_profile.dump_stats(base + '.prof')
+        with open(base + '.json', 'w') as file:
+            json.dump({'traceEvents': self.trace_events, 'displayTimeUnit': 'ms'}, file)
+        print(f"Profiler capture written to {base}.prof and {base}.json")
+        self.capture_profile = None
+        self.trace_events = []
+
+
+    def top_stages(self, count=5):
+        """
+        :return: List of (stage name, mean ms) of the most expensive stages.
+        """
+        means = [(name, sum(times) / len(times)) for name, times in self.stage_times.items() if times]
+        return sorted(means, key=lambda item: item[1], reverse=True)[:count]
+
+
+    def draw(self, surface, groups, counters=None):
+        """
+        Draws the overlay in the top right corner of the surface.
+
+        :param surface: The display surface.
+        :param groups: Dict of label -> sprite group whose sizes are shown.
+        :param counters: Optional dict of label -> number shown on its own line
+                         (e.g. sprites drawn and culled by the last draw).
+        """
+        if not self.enabled or not self.frame_times:
+            return
+        if self.font is None:
+            self.font = font_cache.load('monospace', 14)
+
+        width, height = 300, 310
+        panel = pygame.Surface((width, height), pygame.SRCALPHA)
+        panel.fill((0, 0, 0, 180))
+
+        mean_ms = sum(self.frame_times) / len(self.frame_times)
+        lines = [f"FPS {1000 / mean_ms if mean_ms else 0:6.1f}  frame {mean_ms:5.2f} ms  max {max(self.frame_times):5.1f}"]
+
+        # Sprite counts per group, with the dynamic sprites split by type
+        counts = {}
+        for label, group in groups.items():
+            counts[label] = len(group)
+        for sprite in groups.get('all', ()):
+            name = type(sprite).__name__
+            counts[name] = counts.get(name, 0) + 1
+        lines.append('  '.join(f"{label} {count}" for label, count in counts.items()))
+        if counters:
+            lines.append('  '.join(f"{label} {count}" for label, count in counters.items()))
+        lines += [f"{name[:22]:<22} {ms:6.3f} ms" for name, ms in self.top_stages()]
+        if self.capture_frames:
+            lines.append(f"capturing... {self.capture_frames} frames left")
+
+        for index, line in enumerate(lines):
+            panel.blit(self.font.render(line, True, (255, 255, 255)), (6, 4 + index * 16))
+
+        # Frame-time histogram of the same frames, scaled to the fullest bucket
+        bars = pygame.Rect(6, height - 126, width - 12, 50)
+        bar_width = bars.width / PROFILER_BUCKETS
+        fullest = max(self.histogram) or 1
+        for index, count in enumerate(self.histogram):
+            bar_height = round(count / fullest * (bars.height - 14))
+            if bar_height:
+                bar = pygame.Rect(bars.left + index * bar_width, bars.bottom - bar_height, max(1, bar_width - 1), bar_height)
+                pygame.draw.rect(panel, (255, 200, 0) if index < PROFILER_BUCKETS - 1 else (255, 80, 0), bar)
+        panel.blit(self.font.render(f"frames per {PROFILER_BUCKET_MS} ms", True, (160, 160, 160)), bars.topleft)
+
+        # Frame-time graph, 33 ms at the top of the graph area
+        graph = pygame.Rect(6, height - 70, width - 12, 64)
+        pygame.draw.rect(panel, (60, 60, 60), graph, 1)
+        target_y = graph.bottom - graph.height * (1000 / 60) / 33
+        pygame.draw.line(panel, (0, 120, 0), (graph.left, target_y), (graph.right, target_y))
+        step = graph.width / max(1, self.frame_times.maxlen - 1)
+        points = [
+            (graph.left + index * step, graph.bottom - min(ms, 33) / 33 * graph.height)
+            for index, ms in enumerate(self.frame_times)
+        ]
+        if len(points) > 1:
+            pygame.draw.lines(panel, (255, 200, 0), False, points)
+
+        surface.blit(panel, (surface.get_width() - width - 10, 10))
@@ -19,5 +19,115 @@ SCALE_FACTOR = 2
 SNOW_MAP_FILE = "../maps/TMX/MAP_SNOW.tmx"
 FOREST_MAP_FILE = "../maps/TMX/MAP_FOREST.tmx"
 
+# Folder holding the TMX maps and the folder compile_maps.py writes the binary map bundles to.
+MAP_FOLDER = "../maps/TMX"
+BUNDLE_FOLDER = "../maps/BUNDLE"
+
+# Maps reachable through the transitions of each map, preloaded in the background.
+NEIGHBOUR_MAPS = {
+    FOREST_MAP_FILE: [SNOW_MAP_FILE],
+    SNOW_MAP_FILE: [FOREST_MAP_FILE],
+}
+
+# Main-thread time in milliseconds the background map preloader may use per frame.
+PRELOAD_BUDGET_MS = 2
+
+# World streaming, for maps of any size: only the chunks near the player are kept
+# in memory, with their baked tiles, colliders and enemies. Chunks within
+# STREAM_RADIUS pixels of the player, or of where it will be STREAM_LOOKAHEAD
+# seconds ahead, are loaded: the ones on screen at once, the others within
+# STREAM_BUDGET_MS per frame. Chunks further away are evicted, least recently
+# used first, once the baked chunks take more than STREAM_MEMORY_BUDGET_KB.
+STREAMING = False
+STREAM_RADIUS = 768
+STREAM_LOOKAHEAD = 0.5
+STREAM_BUDGET_MS = 2
+STREAM_MEMORY_BUDGET_KB = 32 * 1024
+# Furthest the enemies' flow field is searched from the player on a streamed map, in cells.
+STREAM_NAV_MAX_STEPS = 48
+
+# Fast start: show the first frame once the start map is playable around the
+# spawn point and bake the rest of its tiles in the background.
+FAST_START = True
+
+# File remembering the font files the system font names resolved to, so later
+# runs skip the scan of the installed fonts.
+FONT_CACHE_FILE = '../cache/fonts.json'
+
 # Directory path for the player's sprite images (specifically for the 'down' state).
 PLAYER_IMAGE_FOLDER = '../images/player/down/'
+
+# Simulation ticks per second. The game loop and headless simulations advance the
+# world in fixed steps of FIXED_DT seconds, independent of the frame rate.
+TICK_RATE = 60
+FIXED_DT = 1 / TICK_RATE
+
+# Rendering: frames per second cap (0 for uncapped), vsync, and the most simulation
+# ticks run for one frame before the loop gives up catching up (avoids a spiral
+# of death after a stall).
+MAX_FPS = 120
+VSYNC = False
+MAX_STEPS_PER_FRAME = 5
+
+# Extra margin in pixels around the camera when culling interpolated sprites.
+INTERPOLATION_MARGIN = 32
+
+# Cell size in pixels of the enemy navigation grid (one map tile).
+NAV_CELL_SIZE = TILE_SIZE * SCALE_FACTOR
+
+# Enemy update scheduling: enemies update every tick inside their chase radius,
+# every ENEMY_MID_INTERVAL ticks up to ENEMY_WAKE_DISTANCE pixels from the player,
+# and sleep beyond it.
+ENEMY_WAKE_DISTANCE = 1200
+ENEMY_MID_INTERVAL = 4
+
+# Enemy count from which enemies are updated together as a NumPy EnemySwarm (when NumPy is installed).
+SWARM_MIN_ENEMIES = 50
+# Cell size in pixels of the collider mask the swarm uses to skip collision tests away from obstacles.
+SWARM_MASK_CELL_SIZE = 8
+# Enemies steer away from other enemies whose center is closer than SEPARATION_RADIUS
+# pixels, so a chasing group spreads out instead of stacking up on one spot.
+# SEPARATION_WEIGHT scales the push against the chase direction (0 turns it off).
+SEPARATION_RADIUS = 40
+SEPARATION_WEIGHT = 1.0
+
+# Game balance: the ranges enemy and boss speeds (pixels per second) are drawn
+# from, the distance at which an idle enemy notices the player and the distance
+# up to which it keeps chasing, and how long the player is invincible after a hit.
+# Game takes each of them as an argument too, for balance sweeps (batch_sim.py).
+ENEMY_SPEED_RANGE = (200, 280)
+BOSS_SPEED_RANGE = (300, 380)
+ENEMY_DETECT_RADIUS = 200
+ENEMY_CHASE_RADIUS = 700
+INVINCIBILITY_MS = 1000
+
+# Redraw and present only the screen regions that changed while the camera stands still.
+DIRTY_RENDERING = True
+
+# HUD: show the frame rate under the life and relic counters, and the number of
+# rendered strings a TextCache keeps for text that changes often.
+SHOW_FPS = False
+TEXT_CACHE_SIZE = 128
+
+# Quick save (F5) and quick load (F9) file for world-state snapshots.
+SNAPSHOT_FILE = '../saves/quicksave.bin'
+
+# Low-resolution rendering: draw the world with unscaled (native) tiles and frames
+# into an offscreen surface 1 / SCALE_FACTOR the size of the window, then upscale
+# it to the window once per frame. Game logic keeps using scaled world coordinates.
+# Off draws pre-scaled assets straight to the window (and allows dirty rendering).
+LOW_RES_RENDER = False
+
+# Size in pixels of the pre-baked chunk surfaces used for static map layers.
+CHUNK_SIZE = 512
+
+# Cell size in pixels of the spatial grid used to look up nearby colliders.
+GRID_CELL_SIZE = 128
+
+# Frame profiler overlay (toggle with F3, capture a trace with F4).
+PROFILER_ENV_VAR = 'CLONE_CHASE_PROFILE'  # set to 1 to start with the profiler on
+PROFILER_HISTORY = 240  # frames kept for the graph and stage averages
+PROFILER_BUCKET_MS = 2  # width of a frame-time histogram bucket
+PROFILER_BUCKETS = 20
+PROFILER_CAPTURE_FRAMES = 120
+PROFILER_OUTPUT_FOLDER = '../profiles'
@@ -0,0 +1,286 @@
+import struct
+from os import makedirs
+from os.path import dirname, isfile
+from random import Random
+from settings import *
+from enemy import Enemy
+from swarm import STATES
+from map_bundle import pack_string
+
+# ------------------------------------------------------------------
+# Snapshots of the dynamic world state: game progress, the random source,
+# the player and every enemy, packed into a small binary blob. Restoring
+# one puts the world back in place without parsing or rebuilding the map,
+# for checkpoints, respawns and save files. The static map data is not in
+# the snapshot; it comes from the map cache.
+#
+# Snapshot layout (little endian):
+#   magic 'CCSS', version  H
+#   map       current map name, map file (H length + UTF-8 each)
+#   progress  health b, relics B, forest relic ?, snow relic ?, invincible ?,
+#             invincible timer d, elapsed ms d, enemy scheduler ticks I
+#   random    state version B, 625 I, has gauss ?, gauss d
+#   player    pos dd, hitbox topleft ii, direction dd, state B, frame index d
+#   enemies   count I, then per enemy: the player fields, then speed,
+#             detect radius, chase radius, current radius, scheduler pending dt ddddd
+#   stashed   count I, then per enemy stashed by the world streamer: pos dd, speed d
+#   resident  count I, then the streamer's resident chunk keys ii, least recently used first
+# ------------------------------------------------------------------
+
+SNAPSHOT_MAGIC = b'CCSS'
+SNAPSHOT_VERSION = 2
+
+HEADER = struct.Struct('<4sH')
+PROGRESS = struct.Struct('<bB???ddI')
+RANDOM = struct.Struct('<B625I?d')
+ACTOR = struct.Struct('<ddiiddBd')
+ENEMY = struct.Struct('<ddiiddBdddddd')
+STASHED = struct.Struct('<ddd')
+CHUNK = struct.Struct('<ii')
+COUNT = struct.Struct('<I')
+
+
+def actor_fields(actor):
+    """
+    :return: Tuple of the movement and animation state shared by the player and enemies.
+    """
+    return (
+        actor.pos.x, actor.pos.y, actor.hitbox_rect.x, actor.hitbox_rect.y,
+        actor.direction.x, actor.direction.y, STATES.index(actor.state), actor.frame_index,
+    )
+
+
+def take_snapshot(game):
+    """
+    Packs the dynamic world state of a game.
+
+    :param game: The Game.
+    :return: Snapshot bytes, to restore with restore_snapshot().
+    """
+    # Enemies in a swarm have their current state in the swarm's arrays
+    if game.swarm is not None:
+        game.swarm.sync()
+
+    # Which enemies the scheduler updates on the next tick depends on its tick count
+    activity = game.activity
+    ticks = activity.ticks if activity is not None else 0
+    pending_dt = activity.pending_dt if activity is not None else {}
+
+    rng_version, rng_state, gauss = game.rng.getstate()
+    parts = [
+        HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION),
+        pack_string(game.current_map),
+        pack_string(game.level.map_file),
+        PROGRESS.pack(
+            game.game_health, game.relics_collected, game.forest_relic_collected, game.snow_relic_collected,
+            game.invincible, game.invincible_timer, game.elapsed_ms, ticks,
+        ),
+        RANDOM.pack(rng_version, *rng_state, gauss is not None, gauss or 0.0),
+        ACTOR.pack(*actor_fields(game.player)),
+    ]
+
+    enemies = [sprite for sprite in game.all_sprites if isinstance(sprite, Enemy)]
+    parts.append(COUNT.pack(len(enemies)))
+    for enemy in enemies:
+        parts.append(ENEMY.pack(
+            *actor_fields(enemy), enemy.speed, enemy.detect_radius, enemy.chase_radius, enemy.current_radius,
+            pending_dt.get(enemy, 0.0),
+        ))
+
+    streamer = game.streamer
+    stashed = [spawn for spawns in streamer.dormant.values() for spawn in spawns] if streamer else []
+    parts.append(COUNT.pack(len(stashed)))
+    for (x, y), speed in stashed:
+        parts.append(STASHED.pack(x, y, speed))
+    resident = list(streamer.resident) if streamer else []
+    parts.append(COUNT.pack(len(resident)))
+    for key in resident:
+        parts.append(CHUNK.pack(*key))
+    return b''.join(parts)
+
+
+def read_snapshot(data):
+    """
+    Decodes snapshot bytes.
+
+    :return: Dict of the snapshot fields, or None when the data is not a
+             complete snapshot of this format version.
+    """
+    if len(data) < HEADER.size or HEADER.unpack_from(data) != (SNAPSHOT_MAGIC, SNAPSHOT_VERSION):
+        return None
+    offset = HEADER.size
+
+    def unpack(layout):
+        nonlocal offset
+        values = layout.unpack_from(data, offset)
+        offset += layout.size
+        return values
+
+    def unpack_string():
+        nonlocal offset
+        length, = struct.unpack_from('<H', data, offset)
+        offset += 2 + length
+        return data[offset - length:offset].decode('utf-8')
+
+    # A truncated or damaged file is rejected instead of half restored
+    try:
+        snapshot = {'map': unpack_string(), 'map_file': unpack_string()}
+        (snapshot['health'], snapshot['relics'], snapshot['forest_relic'], snapshot['snow_relic'],
+         snapshot['invincible'], snapshot['invincible_timer'], snapshot['elapsed_ms'], snapshot['ticks']) = unpack(PROGRESS)
+        random = unpack(RANDOM)
+        snapshot['rng'] = (random[0], random[1:626], random[627] if random[626] else None)
+        snapshot['player'] = unpack(ACTOR)
+        snapshot['enemies'] = [unpack(ENEMY) for _ in range(unpack(COUNT)[0])]
+        snapshot['stashed'] = [unpack(STASHED) for _ in range(unpack(COUNT)[0])]
+        snapshot['resident'] = [unpack(CHUNK) for _ in range(unpack(COUNT)[0])]
+        # Raises ValueError for a random state that restore_snapshot could not set
+        Random().setstate(snapshot['rng'])
+    except (struct.error, UnicodeDecodeError, ValueError):
+        return None
+    if offset != len(data):
+        return None
+    # Animation states are stored as indices into STATES
+    if any(fields[6] >= len(STATES) for fields in [snapshot['player'], *snapshot['enemies']]):
+        return None
+    return snapshot
+
+
+def set_actor_fields(actor, fields):
+    """
+    Puts the movement and animation state from actor_fields() back on a sprite.
+    """
+    pos_x, pos_y, hitbox_x, hitbox_y, direction_x, direction_y, state, frame_index = fields
+    actor.pos.update(pos_x, pos_y)
+    actor.hitbox_rect.topleft = (hitbox_x, hitbox_y)
+    actor.rect.center = actor.hitbox_rect.center
+    actor.direction.update(direction_x, direction_y)
+    actor.state = STATES[state]
+    actor.frame_index = frame_index
+    frames = actor.frames[actor.state]
+    actor.image = frames[int(frame_index) % len(frames)]
+
+
+def restore_snapshot(game, data):
+    """
+    Puts a game back in the state of a snapshot. On the same map the existing
+    sprites are reused; on another map the map is set up from the map cache
+    first, like a map transition.
+
+    :param game: The Game.
+    :param data: Snapshot bytes from take_snapshot().
+    :return: False if the data is not a snapshot of this format version or
+             its map cannot be loaded; the game is left as it was then.
+    """
+    snapshot = read_snapshot(data)
+    if snapshot is None:
+        return False
+    map_file = snapshot['map_file']
+    if map_file != game.level.map_file and not game.map_cache.is_cached(map_file) and not isfile(map_file):
+        return False
+
+    # Progress first, so a map set up below shows its relic as in the snapshot
+    game.game_health = snapshot['health']
+    game.relics_collected = snapshot['relics']
+    game.forest_relic_collected = snapshot['forest_relic']
+    game.snow_relic_collected = snapshot['snow_relic']
+    game.invincible = snapshot['invincible']
+    game.invincible_timer = snapshot['invincible_timer']
+    game.elapsed_ms = snapshot['elapsed_ms']
+    game.outcome = None
+    game.running = True
+
+    if map_file != game.level.map_file:
+        game.setup(map_file)
+    elif bool(game.relic_zones) != game.relic_available(map_file):
+        game.show_relic(game.relic_available(map_file))
+    game.current_map = snapshot['map']
+    # The speeds of the enemies set up above were drawn from the old random state
+    game.rng.setstate(snapshot['rng'])
+
+    set_actor_fields(game.player, snapshot['player'])
+
+    # Take the enemies out of the swarm, which would otherwise write its old state over them
+    swarm = game.swarm
+    if swarm is not None:
+        for enemy in swarm.enemies:
+            enemy.swarm = None
+        game.swarm = None
+
+    # Reuse the enemies on the map, spawning or removing the difference
+    enemies = [sprite for sprite in game.all_sprites if isinstance(sprite, Enemy)]
+    for enemy in enemies[len(snapshot['enemies']):]:
+        enemy.kill()
+    for index, fields in enumerate(snapshot['enemies']):
+        if index < len(enemies):
+            enemy = enemies[index]
+        else:
+            enemy = game.spawn_enemy(fields[:2], fields[8])
+            enemies.append(enemy)
+        set_actor_fields(enemy, fields[:8])
+        enemy.speed, enemy.detect_radius, enemy.chase_radius, enemy.current_radius = fields[8:12]
+    del enemies[len(snapshot['enemies']):]
+
+    # On a streamed map the same chunks are loaded as in the snapshot, and the
+    # enemies away from them wait in the streamer again
+    streamer = game.streamer
+    if streamer is not None:
+        streamer.dormant = {}
+        resident = snapshot['resident']
+        kept = set(resident)
+        for key in list(streamer.resident):
+            if key not in kept:
+                streamer.evict(key)
+        for key in resident:
+            if key not in streamer.resident:
+                streamer.load(key)
+            streamer.resident.move_to_end(key)
+        for x, y, speed in snapshot['stashed']:
+            streamer.dormant.setdefault(streamer.chunk_of((x, y)), []).append(((x, y), speed))
+        streamer.enemies = set(enemies)
+        # A snapshot from a game without streaming has no chunks to put back
+        if not resident:
+            streamer.update(game.player, force=True)
+
+    # A swarm of the same enemies only has to read their new state, which
+    # saves building its collider mask again
+    if swarm is not None and swarm.enemies == [sprite for sprite in game.all_sprites if isinstance(sprite, Enemy)]:
+        for enemy in swarm.enemies:
+            enemy.swarm = swarm
+        game.swarm = swarm
+        swarm.load()
+    else:
+        game.refresh_swarm()
+    if game.activity is not None:
+        game.activity.ticks = snapshot['ticks']
+        for enemy, fields in zip(enemies, snapshot['enemies']):
+            if fields[12] and enemy in game.activity:
+                game.activity.pending_dt[enemy] = fields[12]
+    game.all_sprites.reindex()
+    game.all_sprites.store_previous()
+    game.all_sprites.needs_full_redraw = True
+    return True
+
+
+def save_snapshot(game, path=SNAPSHOT_FILE):
+    """
+    Writes a snapshot of a game to a file.
+    """
+    folder = dirname(path)
+    if folder:
+        makedirs(folder, exist_ok=True)
+    with open(path, 'wb') as file:
+        file.write(take_snapshot(game))
+
+
+def load_snapshot(game, path=SNAPSHOT_FILE):
+    """
+    Restores a game from a snapshot file.
+
+    :return: False if there is no complete snapshot of this format version in the file.
+    """
+    try:
+        with open(path, 'rb') as file:
+            data = file.read()
+    except FileNotFoundError:
+        return False
+    return restore_snapshot(game, data)
@@ -0,0 +1,245 @@
+from math import sqrt
+from settings import *
+
+
+class SpatialGrid:
+    """
+    Uniform grid index of sprites by their rect. Each sprite is stored in every
+    grid cell its rect overlaps, so looking up the sprites near a rect only
+    touches a handful of cells instead of every sprite in a group. Moving
+    sprites are kept up to date with move().
+    """
+    def __init__(self, sprites=(), cell_size=GRID_CELL_SIZE):
+        self.cell_size = cell_size
+
+        # Lists of sprites keyed by the (column, row) of the grid cell
+        self.cells = {}
+        # Insertion order of every sprite, used to return results in a stable order
+        self.order = {}
+        self.next_order = 0
+        # Cell range each sprite is currently stored in
+        self.ranges = {}
+
+        for sprite in sprites:
+            self.insert(sprite)
+
+
+    def cell_range(self, rect):
+        """
+        Returns the range of grid cells overlapped by a rect.
+
+        :param rect: pygame.Rect in world pixels.
+        :return: Tuple (first column, first row, last column, last row).
+        """
+        size = self.cell_size
+        return (
+            rect.left // size,
+            rect.top // size,
+            (rect.right - 1) // size,
+            (rect.bottom - 1) // size
+        )
+
+
+    def insert(self, sprite):
+        """
+        Adds a sprite to every cell its rect overlaps.
+
+        :param sprite: Any object with a rect attribute.
+        """
+        self.order[sprite] = self.next_order
+        self.next_order += 1
+        cell_range = self.cell_range(sprite.rect)
+        self.ranges[sprite] = cell_range
+        first_col, first_row, last_col, last_row = cell_range
+        for col in range(first_col, last_col + 1):
+            for row in range(first_row, last_row + 1):
+                self.cells.setdefault((col, row), []).append(sprite)
+
+
+    def remove(self, sprite):
+        """
+        Removes a sprite from the cells it is stored in.
+
+        :param sprite: A sprite previously inserted.
+        """
+        first_col, first_row, last_col, last_row = self.ranges.pop(sprite)
+        for col in range(first_col, last_col + 1):
+            for row in range(first_row, last_row + 1):
+                cell = self.cells[(col, row)]
+                cell.remove(sprite)
+                if not cell:
+                    del self.cells[(col, row)]
+        del self.order[sprite]
+
+
+    def move(self, sprite):
+        """
+        Updates the cells of a sprite after its rect changed. Only does work when
+        the sprite crossed into other cells. Sprites not in the grid are inserted.
+
+        :param sprite: Any object with a rect attribute.
+        """
+        old_range = self.ranges.get(sprite)
+        if old_range is None:
+            self.insert(sprite)
+            return
+        cell_range = self.cell_range(sprite.rect)
+        if cell_range != old_range:
+            order = self.order[sprite]
+            self.remove(sprite)
+            self.insert(sprite)
+            # Keep the original insertion order
+            self.order[sprite] = order
+
+
+    def query(self, rect):
+        """
+        Returns the sprites stored in the cells overlapped by a rect. The result
+        may include sprites that are near the rect without touching it, so callers
+        still test the exact overlap.
+
+        :param rect: pygame.Rect in world pixels.
+        :return: List of sprites in insertion order.
+        """
+        found = {}
+        first_col, first_row, last_col, last_row = self.cell_range(rect)
+        if (last_col - first_col + 1) * (last_row - first_row + 1) > len(self.cells):
+            # Large areas: go through the occupied cells instead of every cell in range
+            for (col, row), sprites in self.cells.items():
+                if first_col <= col <= last_col and first_row <= row <= last_row:
+                    for sprite in sprites:
+                        found[sprite] = None
+        else:
+            for col in range(first_col, last_col + 1):
+                for row in range(first_row, last_row + 1):
+                    for sprite in self.cells.get((col, row), ()):
+                        found[sprite] = None
+
+        if len(found) > 1:
+            return sorted(found, key=self.order.__getitem__)
+        return list(found)
+
+
+    def __contains__(self, sprite):
+        return sprite in self.ranges
+
+
+    def clear(self):
+        self.cells.clear()
+        self.order.clear()
+        self.ranges.clear()
+
+
+class NeighbourGrid:
+    """
+    Uniform grid of moving entities by their center point, rebuilt from scratch
+    every tick instead of updated as they move: with most entities moving every
+    tick, one pass over them is cheaper than moving each between cells. It finds
+    the entities within a radius of each other (for separation steering) and the
+    ones touching a rect (for contact damage), looking only at nearby cells.
+    """
+    def __init__(self, cell_size=SEPARATION_RADIUS):
+        self.cell_size = cell_size
+        self.entities = []
+        # Center of every entity, indexed like entities
+        self.centers = []
+        # Index of every entity in entities
+        self.index = {}
+        # Lists of entity indices keyed by the (column, row) of the grid cell
+        self.cells = {}
+        # Largest distance from an entity's center to the edge of its rect
+        self.extent = 0
+
+
+    def __len__(self):
+        return len(self.entities)
+
+
+    def rebuild(self, entities):
+        """
+        Indexes the entities at their current positions.
+
+        :param entities: List of sprites; their order decides the order of results.
+        """
+        size = self.cell_size
+        self.entities = entities
+        self.centers = [entity.rect.center for entity in entities]
+        self.index = {entity: index for index, entity in enumerate(entities)}
+        cells = self.cells = {}
+        for index, (x, y) in enumerate(self.centers):
+            key = (x // size, y // size)
+            if key in cells:
+                cells[key].append(index)
+            else:
+                cells[key] = [index]
+        self.extent = max((max(entity.rect.width, entity.rect.height) + 1) // 2 for entity in entities) if entities else 0
+
+
+    def near(self, pos, radius):
+        """
+        :param pos: Tuple (x, y) in world pixels.
+        :param radius: Distance in pixels.
+        :return: Sorted list of the indices of the entities whose center is closer
+                 than radius to pos.
+        """
+        size = self.cell_size
+        x, y = pos
+        reach = radius * radius
+        found = []
+        cells = self.cells
+        centers = self.centers
+        for col in range(int((x - radius) // size), int((x + radius) // size) + 1):
+            for row in range(int((y - radius) // size), int((y + radius) // size) + 1):
+                for index in cells.get((col, row), ()):
+                    other_x, other_y = centers[index]
+                    if (other_x - x) ** 2 + (other_y - y) ** 2 < reach:
+                        found.append(index)
+        found.sort()
+        return found
+
+
+    def separation(self, entity, radius=SEPARATION_RADIUS):
+        """
+        Steering away from the neighbours of an entity: the sum of the unit
+        vectors pointing away from every entity closer than radius, each weighted
+        from 1 when the centers meet down to 0 at radius. Entities on the same
+        spot push apart sideways, the later one to the right.
+
+        :param entity: An entity of the grid.
+        :return: Tuple (x, y), (0, 0) without neighbours or when the entity is not in the grid.
+        """
+        index = self.index.get(entity)
+        if index is None:
+            return 0.0, 0.0
+        x, y = self.centers[index]
+        radius = float(radius)
+        push_x = push_y = 0.0
+        for other in self.near((x, y), radius):
+            if other == index:
+                continue
+            other_x, other_y = self.centers[other]
+            dx, dy = x - other_x, y - other_y
+            distance = sqrt(dx * dx + dy * dy)
+            if distance == 0:
+                push_x += 1.0 if index > other else -1.0
+                continue
+            weight = (radius - distance) / (radius * distance)
+            push_x += dx * weight
+            push_y += dy * weight
+        return push_x, push_y
+
+
+    def touching(self, rect):
+        """
+        :param rect: pygame.Rect in world pixels.
+        :return: List of the entities whose rect overlaps the rect, in order.
+        """
+        size = self.cell_size
+        area = rect.inflate(self.extent * 2, self.extent * 2)
+        found = []
+        for col in range(area.left // size, (area.right - 1) // size + 1):
+            for row in range(area.top // size, (area.bottom - 1) // size + 1):
+                for index in self.cells.get((col, row), ()):
+                    if self.entities[index].rect.colliderect(rect):
+                        found.append(index)
+        return [self.entities[index] for index in sorted(found)]
@@ -0,0 +1,195 @@
+from collections import OrderedDict
+from time import perf_counter
+from settings import *
+
+
+class WorldStreamer:
+    """
+    Keeps only the part of a streaming Level around the player in memory. The
+    map is split into the chunks of its tile layers; a chunk is resident with
+    its baked tiles, its colliders in the collision grid and its enemies. Each
+    step, chunks within a radius of the player, and of where the player is
+    heading, are loaded: those on screen right away, the rest nearest first
+    within a time budget. Chunks outside that area stay cached until the baked
+    chunks exceed the memory budget, then the least recently used are evicted.
+
+    Enemies standing in a chunk that is not resident are removed from the game
+    and stashed with their position and speed, to be spawned again when the
+    chunk is loaded, so the number of live enemies is bounded as well.
+    """
+    def __init__(self, level, spawn_enemy, enemy_spawns, radius=STREAM_RADIUS, lookahead=STREAM_LOOKAHEAD,
+                 budget_ms=STREAM_BUDGET_MS, memory_budget_kb=STREAM_MEMORY_BUDGET_KB):
+        """
+        :param level: Level built with streaming=True.
+        :param spawn_enemy: Function (pos, speed) -> Enemy that adds an enemy to the game.
+        :param enemy_spawns: List of (pos, speed) of the enemies of the map.
+        :param radius: Distance in pixels around the player within which chunks are loaded.
+        :param lookahead: Seconds of the player's movement to load ahead of it.
+        :param budget_ms: Time in milliseconds that may be spent per step loading off-screen chunks.
+        :param memory_budget_kb: Baked chunk memory above which chunks outside the area are evicted.
+        """
+        self.level = level
+        self.spawn_enemy = spawn_enemy
+        self.radius = radius
+        self.lookahead = lookahead
+        self.budget_ms = budget_ms
+        self.memory_budget = memory_budget_kb * 1024
+
+        self.chunk_size = level.chunk_world_size
+        self.cols = -(-level.width // self.chunk_size)
+        self.rows = -(-level.height // self.chunk_size)
+
+        # Resident chunk keys, least recently used first
+        self.resident = OrderedDict()
+        # Bytes of baked chunk surfaces of every resident chunk
+        self.chunk_bytes = {}
+        self.memory = 0
+        # Number of resident chunks every collider overlaps; it is in the grid while above 0
+        self.collider_refs = {}
+        # Enemies alive in the game, and (pos, speed) of the stashed ones by chunk key
+        self.enemies = set()
+        self.dormant = {}
+        for pos, speed in enemy_spawns:
+            self.dormant.setdefault(self.chunk_of(pos), []).append((pos, speed))
+
+        # Counts for instrumentation
+        self.loaded = 0
+        self.evicted = 0
+        self.peak_memory = 0
+
+
+    def chunk_of(self, pos):
+        """
+        :param pos: Tuple (x, y) in world pixels.
+        :return: Tuple (column, row) of the chunk containing the position.
+        """
+        return int(pos[0]) // self.chunk_size, int(pos[1]) // self.chunk_size
+
+
+    def chunks_in(self, rect):
+        """
+        :param rect: pygame.Rect in world pixels.
+        :return: List of the keys of the map chunks the rect overlaps.
+        """
+        size = self.chunk_size
+        return [
+            (col, row)
+            for col in range(max(0, rect.left // size), min(self.cols, (rect.right - 1) // size + 1))
+            for row in range(max(0, rect.top // size), min(self.rows, (rect.bottom - 1) // size + 1))
+        ]
+
+
+    def update(self, player, force=False):
+        """
+        Loads the chunks around the player, evicts chunks over the memory budget
+        and stashes the enemies left outside the resident chunks.
+
+        :param player: The Player, whose rect and movement the area follows.
+        :param force: Load every chunk of the area now, ignoring the time budget.
+        :return: True if enemies were spawned or stashed.
+        """
+        deadline = perf_counter() + self.budget_ms / 1000
+        center = player.rect.center
+
+        # Chunks on screen are needed for this frame, the rest of the area soon
+        view = pygame.Rect(0, 0, WINDOW_WIDTH, WINDOW_HEIGHT)
+        view.center = center
+        needed = set(self.chunks_in(view))
+        area = player.rect.inflate(self.radius * 2, self.radius * 2)
+        ahead = area.move(player.direction.x * player.speed * self.lookahead, player.direction.y * player.speed * self.lookahead)
+        wanted = set(self.chunks_in(area)) | set(self.chunks_in(ahead)) | needed
+
+        size = self.chunk_size
+
+        def distance(key):
+            return abs((key[0] + 0.5) * size - center[0]) + abs((key[1] + 0.5) * size - center[1])
+
+        changed = False
+        for key in sorted(wanted, key=distance, reverse=True):
+            # Farthest first, so the nearest chunks end up most recently used
+            if key in self.resident:
+                self.resident.move_to_end(key)
+        for key in sorted(wanted - self.resident.keys(), key=distance):
+            if key not in needed and not force and perf_counter() >= deadline:
+                continue
+            changed |= self.load(key)
+
+        # Least recently used first, never a chunk of the area
+        for key in list(self.resident):
+            if self.memory <= self.memory_budget:
+                break
+            if key not in wanted:
+                self.evict(key)
+
+        # Enemies cannot move through chunks without colliders, so they wait there
+        for enemy in list(self.enemies):
+            key = self.chunk_of(enemy.rect.center)
+            if key not in self.resident:
+                self.enemies.discard(enemy)
+                self.dormant.setdefault(key, []).append((enemy.rect.center, enemy.speed))
+                enemy.kill()
+                changed = True
+        return changed
+
+
+    def load(self, key):
+        """
+        Bakes a chunk and adds its colliders and stashed enemies to the game.
+
+        :return: True if enemies were spawned.
+        """
+        self.chunk_bytes[key] = self.level.bake_chunk(key)
+        self.memory += self.chunk_bytes[key]
+        self.peak_memory = max(self.peak_memory, self.memory)
+        self.resident[key] = None
+        self.loaded += 1
+
+        grid = self.level.collision_grid
+        for collider in self.level.chunk_colliders.get(key, ()):
+            count = self.collider_refs.get(collider, 0)
+            if count == 0:
+                grid.insert(collider)
+            self.collider_refs[collider] = count + 1
+
+        spawns = self.dormant.pop(key, ())
+        for pos, speed in spawns:
+            self.enemies.add(self.spawn_enemy(pos, speed))
+        return bool(spawns)
+
+
+    def evict(self, key):
+        """
+        Drops a chunk's baked surfaces and removes its colliders from the grid.
+        Its enemies are stashed by the next update().
+        """
+        self.level.evict_chunk(key)
+        self.memory -= self.chunk_bytes.pop(key)
+        del self.resident[key]
+        self.evicted += 1
+
+        grid = self.level.collision_grid
+        for collider in self.level.chunk_colliders.get(key, ()):
+            count = self.collider_refs[collider] - 1
+            if count == 0:
+                del self.collider_refs[collider]
+                grid.remove(collider)
+            else:
+                self.collider_refs[collider] = count
+
+
+    def release(self):
+        """
+        Evicts every chunk, e.g. when the player leaves the map. The enemies are
+        removed by the caller along with the other sprites.
+        """
+        for key in list(self.resident):
+            self.evict(key)
+        self.enemies.clear()
+
+
+    def stats(self):
+        return {
+            'resident': len(self.resident), 'memory': self.memory, 'peak_memory': self.peak_memory,
+            'loaded': self.loaded, 'evicted': self.evicted, 'enemies': len(self.enemies),
+            'dormant': sum(len(spawns) for spawns in self.dormant.values()),
+        }
@@ -0,0 +1,397 @@
+from settings import *
+
+try:
+    import numpy as np
+except ImportError:  # the swarm is an optional speed-up, enemies update one by one without it
+    np = None
+
+# Animation states in the order of their codes in the swarm arrays
+STATES = ('left', 'right', 'up', 'down')
+
+
+class EnemySwarm:
+    """
+    Batched update for large numbers of enemies. Positions, speeds, directions,
+    radii and animation counters of every enemy live in NumPy arrays, and one
+    update() runs the chase, movement and animation of the whole swarm as array
+    operations. The Enemy sprites are still what gets drawn: only the rects and
+    images that actually changed are written back to them.
+
+    Collisions are resolved by the enemies' own collision code, but only for the
+    enemies whose path passes close to a collider.
+    Enemy.update() does nothing while the enemy belongs to a swarm.
+    """
+    def __init__(self, enemies, player, game, collision_grid, flow_field=None):
+        """
+        :param enemies: List of Enemy sprites to update together.
+        :param player: The player the enemies chase.
+        :param game: The Game, for contact damage.
+        :param collision_grid: SpatialGrid of the colliders of the map.
+        :param flow_field: Optional FlowField steering the enemies around obstacles.
+        """
+        self.enemies = list(enemies)
+        self.player = player
+        self.game = game
+        self.collision_grid = collision_grid
+        self.flow_field = flow_field
+        self.load()
+        self.find_collider_cells()
+
+
+    def load(self):
+        """
+        Copies the state of the Enemy sprites into the swarm arrays, the reverse
+        of sync(), e.g. after the enemies were moved by restoring a snapshot.
+        """
+        enemies = self.enemies
+        self.pos = np.array([(enemy.pos.x, enemy.pos.y) for enemy in enemies], dtype=float).reshape(-1, 2)
+        self.direction = np.array([(enemy.direction.x, enemy.direction.y) for enemy in enemies], dtype=float).reshape(-1, 2)
+        self.speed = np.array([enemy.speed for enemy in enemies], dtype=float)
+        self.detect_radius = np.array([enemy.detect_radius for enemy in enemies], dtype=float)
+        self.chase_radius = np.array([enemy.chase_radius for enemy in enemies], dtype=float)
+        self.current_radius = np.array([enemy.current_radius for enemy in enemies], dtype=float)
+        self.state = np.array([STATES.index(enemy.state) for enemy in enemies], dtype=np.int64)
+        self.frame_index = np.array([enemy.frame_index for enemy in enemies], dtype=float)
+
+        # Rects as (x, y, width, height) columns
+        self.rect = np.array([tuple(enemy.rect) for enemy in enemies], dtype=np.int64).reshape(-1, 4)
+        self.hitbox = np.array([tuple(enemy.hitbox_rect) for enemy in enemies], dtype=np.int64).reshape(-1, 4)
+
+        # Frames per state of every enemy, and the frame each one is showing
+        self.frame_counts = np.array([[len(enemy.frames[state]) for state in STATES] for enemy in enemies], dtype=np.int64).reshape(-1, len(STATES))
+        self.shown = self.frame_keys()
+
+
+    @staticmethod
+    def available():
+        """
+        :return: True if NumPy is installed and swarms can be used.
+        """
+        return np is not None
+
+
+    def __len__(self):
+        return len(self.enemies)
+
+
+    def find_collider_cells(self, cell_size=SWARM_MASK_CELL_SIZE):
+        """
+        Rasterizes the colliders into a fine grid of cells and keeps its summed-area
+        table, so the number of blocked cells under any hitbox takes four lookups.
+        Only enemies with blocked cells under their hitbox need the exact collision test.
+
+        :param cell_size: Size in pixels of a mask cell.
+        """
+        colliders = [sprite.rect for sprite in self.collision_grid.ranges]
+        self.mask_cell_size = cell_size
+        if not colliders:
+            self.blocked_sums = np.zeros((1, 1), dtype=np.int32)
+            return
+
+        rects = np.array([tuple(rect) for rect in colliders], dtype=np.int64)
+        first_cols, first_rows = rects[:, 0] // cell_size, rects[:, 1] // cell_size
+        last_cols = (rects[:, 0] + rects[:, 2] - 1) // cell_size
+        last_rows = (rects[:, 1] + rects[:, 3] - 1) // cell_size
+        # Colliders never extend to negative coordinates on the maps; clamp just in case
+        first_cols, first_rows = np.maximum(first_cols, 0), np.maximum(first_rows, 0)
+
+        blocked = np.zeros((last_cols.max() + 1, last_rows.max() + 1), dtype=np.int32)
+        for first_col, first_row, last_col, last_row in zip(first_cols, first_rows, last_cols, last_rows):
+            blocked[first_col:last_col + 1, first_row:last_row + 1] = 1
+
+        # blocked_sums[c, r] is the number of blocked cells with column < c and row < r
+        self.blocked_sums = np.zeros((blocked.shape[0] + 1, blocked.shape[1] + 1), dtype=np.int32)
+        self.blocked_sums[1:, 1:] = blocked.cumsum(axis=0).cumsum(axis=1)
+
+
+    def near_colliders(self, boxes=None):
+        """
+        :param boxes: Optional integer array of (x, y, width, height) rows, one per
+                      enemy, to test instead of the hitboxes.
+        :return: Bool array, True for the enemies whose hitbox (or box) overlaps a
+                 mask cell touched by a collider.
+        """
+        size = self.mask_cell_size
+        max_col, max_row = self.blocked_sums.shape[0] - 1, self.blocked_sums.shape[1] - 1
+        x, y, width, height = (self.hitbox if boxes is None else boxes).T
+        # Cell ranges clipped to the mask; cells outside it hold no colliders
+        first_col = np.clip(x // size, 0, max_col)
+        first_row = np.clip(y // size, 0, max_row)
+        end_col = np.clip((x + width - 1) // size + 1, 0, max_col)
+        end_row = np.clip((y + height - 1) // size + 1, 0, max_row)
+
+        sums = self.blocked_sums
+        blocked = sums[end_col, end_row] - sums[first_col, end_row] - sums[end_col, first_row] + sums[first_col, first_row]
+        return blocked > 0
+
+
+    def frame_keys(self):
+        """
+        :return: Array with a number identifying the state and frame every enemy should show.
+        """
+        counts = self.frame_counts[np.arange(len(self.state)), self.state]
+        return self.state * 1024 + self.frame_index.astype(np.int64) % counts
+
+
+    def update(self, dt):
+        """
+        Chases, moves and animates every enemy of the swarm, applying contact
+        damage the same way Game.step does for enemies updated one by one.
+
+        :param dt: Delta time in seconds.
+        :return: List of the enemies that moved into other cells of the sprite index.
+        """
+        if not self.enemies:
+            return []
+        self.chase()
+
+        # Contact damage, tested against the rects before the move
+        player_rect = self.player.rect
+        x, y, width, height = self.rect.T
+        touching = (
+            (x < player_rect.right) & (player_rect.x < x + width) &
+            (y < player_rect.bottom) & (player_rect.y < y + height)
+        )
+        if touching.any() and not self.game.invincible:
+            self.game.take_damage(1)
+
+        crossed = self.move(dt)
+        self.animate(dt)
+        return crossed
+
+
+    def chase(self):
+        """
+        Batched Enemy.chasePlayer: idles the enemies outside their radius and
+        points the others along the flow field, or straight at the player.
+        """
+        player_x, player_y = self.player.rect.center
+        center_x = self.rect[:, 0] + self.rect[:, 2] // 2
+        center_y = self.rect[:, 1] + self.rect[:, 3] // 2
+        distance = np.hypot(player_x - center_x, player_y - center_y)
+
+        radius = self.current_radius.copy()
+        self.current_radius[distance < self.chase_radius] = self.chase_radius[distance < self.chase_radius]
+        idle = distance > radius
+        self.direction[idle] = 0
+        self.current_radius[idle] = self.detect_radius[idle]
+
+        # Every chasing enemy walks towards the centre of its next flow field
+        # cell, or straight at the player where the field gives no direction
+        chasing = ~idle
+        target_x = np.full(len(distance), float(player_x))
+        target_y = np.full(len(distance), float(player_y))
+        flowing = np.zeros(len(distance), dtype=bool)
+        flow_field = self.flow_field
+        if flow_field is not None and chasing.any():
+            size = flow_field.cell_size
+            cols, rows = flow_field.cols, flow_field.rows
+            indices = np.flatnonzero(chasing)
+            col, row = center_x[indices] // size, center_y[indices] // size
+            # One lookup per occupied cell instead of one per enemy, -1 outside the field
+            cells = np.where((col >= 0) & (col < cols) & (row >= 0) & (row < rows), row * cols + col, -1)
+            cells, inverse = np.unique(cells, return_inverse=True)
+            next_cells = [flow_field.next_cell(cell % cols, cell // cols) if cell >= 0 else None for cell in cells.tolist()]
+            has_next = np.array([cell is not None for cell in next_cells])
+            next_centers = (np.array([cell or (0, 0) for cell in next_cells], dtype=float) + 0.5) * size
+
+            inverse = inverse.reshape(-1)
+            indices, inverse = indices[has_next[inverse]], inverse[has_next[inverse]]
+            target_x[indices] = next_centers[inverse, 0]
+            target_y[indices] = next_centers[inverse, 1]
+            flowing[indices] = True
+
+        dx = target_x - center_x
+        dy = target_y - center_y
+        length = np.hypot(dx, dy)
+        # A flow step of zero length falls back to the player, like direction_at
+        fallback = flowing & (length == 0)
+        dx[fallback] = player_x - center_x[fallback]
+        dy[fallback] = player_y - center_y[fallback]
+        length[fallback] = np.hypot(dx[fallback], dy[fallback])
+
+        moving = chasing & (length > 0)
+        self.direction[chasing] = 0
+        self.direction[moving, 0] = dx[moving] / length[moving]
+        self.direction[moving, 1] = dy[moving] / length[moving]
+
+        if SEPARATION_WEIGHT and chasing.any():
+            self.separate(chasing, center_x, center_y)
+
+
+    def separate(self, chasing, center_x, center_y, weight=SEPARATION_WEIGHT):
+        """
+        Batched separation steering of Enemy.chasePlayer: adds the push away
+        from the enemies close by to the direction of the chasing enemies.
+
+        :param chasing: Boolean array of the enemies that chase the player.
+        :param center_x: Array of the x coordinates of the enemies' centers.
+        :param center_y: Array of the y coordinates of the enemies' centers.
+        """
+        push = separation(center_x, center_y, chasing)
+        pushed = np.flatnonzero(chasing & ((push[:, 0] != 0) | (push[:, 1] != 0)))
+        direction = self.direction[pushed] + push[pushed] * weight
+        length = np.sqrt(direction[:, 0] * direction[:, 0] + direction[:, 1] * direction[:, 1])
+        steered = length > 0
+        direction[steered] /= length[steered, None]
+        self.direction[pushed] = direction
+
+
+    def move(self, dt):
+        """
+        Batched Enemy.move: moves the enemies whose path crosses no collider
+        straight to their new position, sweeps the others through the enemies' own
+        collision code and writes back the rects that changed.
+
+        :return: List of the enemies that moved into other cells of the sprite
+                 index (a SpatialGrid of GRID_CELL_SIZE cells).
+        """
+        dx = self.direction[:, 0] * self.speed * dt
+        dy = self.direction[:, 1] * self.speed * dt
+
+        # Pixel bounds of every enemy's path, padded like the sweep's broad phase
+        x, y = self.pos[:, 0], self.pos[:, 1]
+        width, height = self.hitbox[:, 2], self.hitbox[:, 3]
+        left = np.floor(np.minimum(x, x + dx)).astype(np.int64) - 1
+        top = np.floor(np.minimum(y, y + dy)).astype(np.int64) - 1
+        right = np.ceil(np.maximum(x, x + dx)).astype(np.int64) + width + 1
+        bottom = np.ceil(np.maximum(y, y + dy)).astype(np.int64) + height + 1
+        near = self.near_colliders(np.stack([left, top, right - left, bottom - top], axis=1))
+
+        free = ~near
+        self.pos[free, 0] += dx[free]
+        self.pos[free, 1] += dy[free]
+        self.hitbox[free, :2] = np.round(self.pos[free])
+        for index in np.flatnonzero(near).tolist():
+            self.collide(index, dx[index], dy[index])
+
+        # rect.center = hitbox_rect.center
+        old_rect = self.rect.copy()
+        self.rect[:, 0] = self.hitbox[:, 0] + self.hitbox[:, 2] // 2 - self.rect[:, 2] // 2
+        self.rect[:, 1] = self.hitbox[:, 1] + self.hitbox[:, 3] // 2 - self.rect[:, 3] // 2
+        changed = np.flatnonzero((self.rect[:, 0] != old_rect[:, 0]) | (self.rect[:, 1] != old_rect[:, 1]))
+        enemies = self.enemies
+        for index, x, y in zip(changed.tolist(), self.rect[changed, 0].tolist(), self.rect[changed, 1].tolist()):
+            enemies[index].rect.topleft = (x, y)
+
+        # Only enemies that crossed into other cells need to be re-bucketed
+        x, y, width, height = self.rect[changed].T
+        old_x, old_y = old_rect[changed, 0], old_rect[changed, 1]
+        size = GRID_CELL_SIZE
+        crossed = (
+            (x // size != old_x // size) | ((x + width - 1) // size != (old_x + width - 1) // size) |
+            (y // size != old_y // size) | ((y + height - 1) // size != (old_y + height - 1) // size)
+        )
+        return [enemies[index] for index in changed[crossed].tolist()]
+
+
+    def collide(self, index, dx, dy):
+        """
+        Runs the enemy's own collision code to move it by (dx, dy) from its
+        position and direction in the arrays, and copies the result back.
+        """
+        enemy = self.enemies[index]
+        enemy.pos.update(self.pos[index].tolist())
+        enemy.direction.update(self.direction[index].tolist())
+        enemy.collision(float(dx), float(dy))
+        self.pos[index] = tuple(enemy.pos)
+        self.hitbox[index, :2] = enemy.hitbox_rect.topleft
+        self.direction[index] = tuple(enemy.direction)
+
+
+    def animate(self, dt):
+        """
+        Batched Enemy.animate: picks the state and frame of every enemy and only
+        swaps the images of the enemies whose frame changed.
+        """
+        dx, dy = self.direction[:, 0], self.direction[:, 1]
+        self.state = np.where(dx > 0, 1, np.where(dx < 0, 0, self.state))
+        self.state = np.where(dy > 0, 3, np.where(dy < 0, 2, self.state))
+
+        moving = (dx != 0) | (dy != 0)
+        self.frame_index = np.where(moving, self.frame_index + 5 * dt, 0)
+
+        keys = self.frame_keys()
+        changed = np.flatnonzero(keys != self.shown)
+        self.shown = keys
+        enemies = self.enemies
+        for index, key in zip(changed.tolist(), keys[changed].tolist()):
+            enemy = enemies[index]
+            enemy.image = enemy.frames[STATES[key // 1024]][key % 1024]
+
+
+    def sync(self):
+        """
+        Copies the swarm state back onto the Enemy sprites (positions, directions,
+        radii and animation), e.g. before the enemies update on their own again.
+        """
+        for index, enemy in enumerate(self.enemies):
+            enemy.pos.update(self.pos[index].tolist())
+            enemy.direction.update(self.direction[index].tolist())
+            enemy.current_radius = float(self.current_radius[index])
+            enemy.state = STATES[int(self.state[index])]
+            enemy.frame_index = float(self.frame_index[index])
+            enemy.hitbox_rect.topleft = self.hitbox[index, :2].tolist()
+
+
+def separation(center_x, center_y, owners=None, radius=SEPARATION_RADIUS):
+    """
+    Batched NeighbourGrid.separation. The pairs of entities closer than radius
+    are found by sorting the entities by grid cell and searching the sorted
+    cells for the 3 x 3 cells around every entity, and the pushes are summed in
+    the same order as NeighbourGrid does, so both give the same result.
+
+    :param center_x: Integer array of the x coordinates of the entities' centers.
+    :param center_y: Integer array of the y coordinates of the entities' centers.
+    :param owners: Boolean array of the entities to compute the push for, None for all.
+    :return: Array (count, 2) of the push of every entity, 0 for the others.
+    """
+    count = len(center_x)
+    push = np.zeros((count, 2))
+    owners = np.arange(count) if owners is None else np.flatnonzero(owners)
+    if not len(owners):
+        return push
+    col, row = center_x // radius, center_y // radius
+    # Cell keys with room for the neighbour cells around every occupied one
+    col = col - col.min() + 1
+    row = row - row.min() + 1
+    height = int(row.max()) + 2
+    keys = col * height + row
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+
+    pairs_i, pairs_j = [], []
+    for offset_col in (-1, 0, 1):
+        for offset_row in (-1, 0, 1):
+            targets = keys[owners] + offset_col * height + offset_row
+            start = np.searchsorted(sorted_keys, targets, 'left')
+            counts = np.searchsorted(sorted_keys, targets, 'right') - start
+            total = int(counts.sum())
+            if not total:
+                continue
+            # Every (owner, entity of the cell) pair, laid out owner by owner
+            first = np.cumsum(counts) - counts
+            slots = np.repeat(start - first, counts) + np.arange(total)
+            pairs_i.append(np.repeat(owners, counts))
+            pairs_j.append(order[slots])
+    if not pairs_i:
+        return push
+    i, j = np.concatenate(pairs_i), np.concatenate(pairs_j)
+    dx = (center_x[i] - center_x[j]).astype(float)
+    dy = (center_y[i] - center_y[j]).astype(float)
+    distance_sq = dx * dx + dy * dy
+    close = (i != j) & (distance_sq < radius * radius)
+    i, j, dx, dy, distance_sq = i[close], j[close], dx[close], dy[close], distance_sq[close]
+    # Summed neighbour by neighbour in index order, like the one-by-one update
+    sequence = np.lexsort((j, i))
+    i, j, dx, dy, distance_sq = i[sequence], j[sequence], dx[sequence], dy[sequence], distance_sq[sequence]
+
+    radius = float(radius)
+    distance = np.sqrt(distance_sq)
+    apart = distance > 0
+    weight = np.zeros(len(i))
+    weight[apart] = (radius - distance[apart]) / (radius * distance[apart])
+    # Entities on the same spot push apart sideways, the later one to the right
+    np.add.at(push[:, 0], i, np.where(apart, dx * weight, np.where(i > j, 1.0, -1.0)))
+    np.add.at(push[:, 1], i, dy * weight)
+    return push
@@ -0,0 +1,10 @@
+import os
+import sys
+
+# The game modules import each other by name and load their assets from paths
+# relative to the code folder, so the tests run from there, without a window.
+CODE_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, CODE_FOLDER)
+os.chdir(CODE_FOLDER)
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
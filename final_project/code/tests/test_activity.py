@@ -0,0 +1,28 @@
+from settings import *
+from controls import ScriptedInput
+from enemy import Enemy
+from main import Game
+from profiler import Profiler
+
+
+def test_scheduled_enemy_updates_are_profiled():
+    game = Game(headless=True, seed=0, controls=ScriptedInput([(120, 0, 1)]))
+    try:
+        game.refresh_swarm(False)
+        assert game.activity is not None and len(game.activity)
+        # Bring an enemy within its chase radius of the player
+        enemy = next(sprite for sprite in game.all_sprites if isinstance(sprite, Enemy))
+        enemy.hitbox_rect.center = (game.player.rect.centerx + 300, game.player.rect.centery)
+        enemy.rect.center = enemy.hitbox_rect.center
+        enemy.pos.update(enemy.hitbox_rect.topleft)
+        game.all_sprites.reindex()
+        game.profiler = Profiler(enabled=True)
+        for _ in range(30):
+            game.step(FIXED_DT)
+            game.profiler.end_frame()
+    finally:
+        game.preloader.shutdown()
+
+    assert game.activity.active
+    assert 'Enemy.update' in game.profiler.stage_times
+    assert any(game.profiler.stage_times['Enemy.update'])
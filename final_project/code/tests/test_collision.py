@@ -0,0 +1,59 @@
+from random import Random
+from settings import *
+from collision import Collider, merge_collision_rects, sweep, impact_time
+from spatial import SpatialGrid
+
+
+def covered_pixels(rects):
+    return {(x, y) for rect in rects for x in range(rect.left, rect.right) for y in range(rect.top, rect.bottom)}
+
+
+def test_merging_keeps_the_blocked_pixels():
+    # An L of tile boxes: the column and the row each merge into one rect
+    tiles = [pygame.Rect(0, row * 16, 16, 16) for row in range(5)] + \
+            [pygame.Rect(col * 16, 64, 16, 16) for col in range(1, 5)]
+    merged = merge_collision_rects(tiles)
+    assert len(merged) == 2
+    assert covered_pixels(merged) == covered_pixels(tiles)
+
+    # Overlapping, nested, empty and touching boxes
+    random = Random(3)
+    for _ in range(20):
+        rects = [pygame.Rect(random.randrange(0, 60, 4), random.randrange(0, 60, 4),
+                             random.randrange(0, 24, 4), random.randrange(0, 24, 4)) for _ in range(25)]
+        merged = merge_collision_rects(rects)
+        assert len(merged) <= len(rects)
+        assert covered_pixels(merged) == covered_pixels(rects)
+        assert all(rect.width > 0 and rect.height > 0 for rect in merged)
+
+
+def test_impact_time_of_a_box_moving_into_a_wall():
+    wall = pygame.Rect(100, 0, 10, 100)
+    assert impact_time(50, 40, 20, 20, 60, 0, wall) == (0.5, 'x')
+    # Stopping short of the wall, moving away, passing alongside or starting inside
+    assert impact_time(50, 40, 20, 20, 20, 0, wall) == (None, None)
+    assert impact_time(50, 40, 20, 20, -60, 0, wall) == (None, None)
+    assert impact_time(50, 100, 20, 20, 60, 0, wall) == (None, None)
+    assert impact_time(95, 40, 20, 20, 60, 0, wall) == (None, None)
+
+
+def test_fast_box_does_not_tunnel_through_a_thin_wall():
+    grid = SpatialGrid([Collider((100, 0, 2, 200))])
+    for speed in (60.0, 1000.0, 100000.0):
+        assert sweep((50.0, 80.0), (20, 20), (speed, 0.0), grid) == (80, 80.0, True, False)
+
+    # Diagonally, the box stops at the wall and keeps its vertical movement
+    x, y, hit_x, hit_y = sweep((50.0, 80.0), (20, 20), (1000.0, 50.0), grid)
+    assert (x, y, hit_x, hit_y) == (80, 130.0, True, False)
+
+
+def test_box_slides_along_walls_and_into_corners():
+    floor = Collider((0, 100, 400, 20))
+    grid = SpatialGrid([floor, Collider((200, 0, 20, 100))])
+    # Falling onto the floor at an angle, then sliding along it
+    x, y, hit_x, hit_y = sweep((10.0, 50.0), (20, 20), (60.0, 60.0), grid)
+    assert (x, y, hit_x, hit_y) == (70.0, 80, False, True)
+    # Sliding into the corner of the floor and the wall
+    x, y, hit_x, hit_y = sweep((150.0, 50.0), (20, 20), (100.0, 100.0), grid)
+    assert (x, y, hit_x, hit_y) == (180, 80, True, True)
+    assert not pygame.Rect(round(x), round(y), 20, 20).collidelistall([collider.rect for collider in grid.order])
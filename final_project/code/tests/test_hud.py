@@ -0,0 +1,29 @@
+from settings import *
+from hud import TextCache
+
+
+class CountingFont:
+    def __init__(self):
+        self.rendered = []
+
+    def render(self, text, antialias, color):
+        self.rendered.append(text)
+        return pygame.Surface((len(text) * 8, 16))
+
+
+def test_least_recently_used_strings_are_dropped():
+    font = CountingFont()
+    cache = TextCache(font, capacity=3)
+    first = cache.render('1')
+    cache.render('2')
+    cache.render('3')
+    # Using '1' again makes '2' the least recently used
+    assert cache.render('1') is first
+    cache.render('4')
+
+    assert list(cache.surfaces) == ['3', '1', '4']
+    assert cache.render('1') is first
+    cache.render('2')
+    assert font.rendered == ['1', '2', '3', '4', '2']
+    assert (cache.hits, cache.misses) == (2, 5)
+    assert len(cache.surfaces) == 3
@@ -0,0 +1,92 @@
+import sys
+from settings import *
+from level import Level
+from map_bundle import read_map_data
+from navigation import UNLINKED
+
+# Most lines of Python one build step may run. A step of a few hundred tiles,
+# cells or rect pairs runs up to about 25000; a phase done in one go runs over
+# 100000 on the bundled maps.
+# Counting lines instead of timing the steps keeps the test independent of
+# how fast the machine is.
+MAX_LINES_PER_STEP = 30000
+
+
+def step_lines(level):
+    """
+    :return: List of the number of lines of Python run by every next() on the level's build steps.
+    """
+    counts = []
+    lines = 0
+
+    def trace(frame, event, arg):
+        nonlocal lines
+        if event == 'line':
+            lines += 1
+        return trace
+
+    steps = level.build_steps()
+    previous = sys.gettrace()
+    while True:
+        lines = 0
+        sys.settrace(trace)
+        try:
+            next(steps)
+        except StopIteration:
+            break
+        finally:
+            sys.settrace(previous)
+        counts.append(lines)
+    assert level.ready
+    return counts
+
+
+def test_build_steps_do_a_bounded_amount_of_work():
+    pygame.display.init()
+    pygame.display.set_mode((1, 1))
+    for map_file in (FOREST_MAP_FILE, SNOW_MAP_FILE):
+        for streaming in (False, True):
+            most = max(step_lines(Level(map_file, read_map_data(map_file), streaming=streaming)))
+            assert most <= MAX_LINES_PER_STEP, f"a build step of {map_file} ran {most} lines (streaming={streaming})"
+
+
+def test_streaming_chunks_hold_the_same_tiles_as_a_full_split():
+    pygame.display.init()
+    pygame.display.set_mode((1, 1))
+    for map_file in (FOREST_MAP_FILE, SNOW_MAP_FILE):
+        level = Level(map_file, read_map_data(map_file), streaming=True).build()
+        assert level.map_data is not None
+        for _ in level.split_layers(level.tile_layers):
+            pass
+        size = level.chunk_world_size
+        keys = [(col, row) for col in range(-(-level.width // size)) for row in range(-(-level.height // size))]
+        for (layer, layer_names), (_, split) in zip(level.tile_layers, level.chunk_tiles):
+            assert set(split) <= set(keys)
+            for key in keys:
+                assert level.chunk_tiles_of(layer, layer_names, key) == split.get(key, [])
+
+
+def test_bounded_flow_field_only_links_the_cells_it_searched():
+    level = Level(FOREST_MAP_FILE, read_map_data(FOREST_MAP_FILE), streaming=True).build()
+    field = level.flow_field
+    field.update(level.spawns[0][1])
+    assert len(field.distance) <= (2 * field.max_steps + 1) ** 2
+    linked = sum(mask != UNLINKED for mask in field.link_masks)
+    assert 0 < linked <= len(field.distance)
+
+
+def test_evicted_chunks_leave_the_layer_counts():
+    pygame.display.init()
+    pygame.display.set_mode((1, 1))
+    level = Level(FOREST_MAP_FILE, read_map_data(FOREST_MAP_FILE), streaming=True).build()
+    keys = [(col, row) for col in range(3) for row in range(3)]
+    baked = sum(level.bake_chunk(key) for key in keys)
+    layers = [layer for layer, _ in level.tile_layers]
+    assert level.static_layer.baked == len(keys) and level.static_layer.opaque_chunks
+    revisions = [layer.revision + bool(layer.chunks) for layer in layers]
+
+    assert sum(level.evict_chunk(key) for key in keys) == baked
+    for layer, revision in zip(layers, revisions):
+        assert not layer.chunks and not layer.covered
+        assert layer.baked == layer.opaque_chunks == 0
+        assert layer.revision >= revision
@@ -0,0 +1,30 @@
+from settings import *
+from loop import FixedStepLoop
+
+
+class FakeClock:
+    def __init__(self, frame_ms):
+        self.frame_ms = iter(frame_ms)
+
+    def tick(self, max_fps=0):
+        return next(self.frame_ms)
+
+
+def test_ticks_follow_the_real_time_and_leave_the_rest_as_alpha():
+    loop = FixedStepLoop(tick_rate=100, max_fps=0, max_steps=5)
+    loop.clock = FakeClock([25, 4, 1000])
+
+    assert loop.begin_frame() == 0.025
+    assert list(loop.steps()) == [0.01, 0.01]
+    assert abs(loop.alpha - 0.5) < 1e-9
+
+    # A short frame only carries its time over to the next one
+    loop.begin_frame()
+    assert list(loop.steps()) == []
+    assert abs(loop.alpha - 0.9) < 1e-9
+
+    # A long frame drops the time past max_steps ticks
+    loop.begin_frame()
+    assert len(list(loop.steps())) == 5
+    assert loop.alpha < 1e-9
+    assert (loop.ticks, loop.frames) == (7, 3)
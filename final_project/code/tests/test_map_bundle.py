@@ -0,0 +1,69 @@
+import os
+import shutil
+import map_bundle
+from settings import *
+from map_bundle import map_data_from_tmx, map_sources, write_bundle, read_bundle, read_map_data, bundle_path, bundle_is_fresh
+
+
+def tile_bytes(surf):
+    # Opaque tiles are converted without an alpha channel, bundled ones keep theirs
+    return pygame.image.tobytes(surf.convert_alpha(), 'RGBA')
+
+
+def test_bundle_holds_the_same_map_as_the_tmx(tmp_path):
+    pygame.display.init()
+    pygame.display.set_mode((1, 1))
+    map_data = map_data_from_tmx(SNOW_MAP_FILE).finish()
+    path = tmp_path / 'snow.bundle'
+    write_bundle(map_data, path)
+    bundled = read_bundle(path)
+
+    assert (bundled.width, bundled.height) == (map_data.width, map_data.height)
+    assert bundled.layers == map_data.layers
+    assert {name: objs for name, objs in bundled.objects.items() if objs} == \
+           {name: objs for name, objs in map_data.objects.items() if objs}
+    assert bundled.raw_tiles.keys() == map_data.tiles.keys()
+    for gid, surf in map_data.tiles.items():
+        assert tile_bytes(bundled.raw_tiles[gid]) == tile_bytes(surf)
+
+
+def test_bundle_for_another_tile_size_falls_back_to_the_tmx(tmp_path, monkeypatch):
+    pygame.display.init()
+    pygame.display.set_mode((1, 1))
+    map_data = map_data_from_tmx(FOREST_MAP_FILE).finish()
+    monkeypatch.setattr(map_bundle, 'BUNDLE_FOLDER', str(tmp_path))
+    monkeypatch.setattr(map_bundle, 'TILE_SIZE', TILE_SIZE * 2)
+    write_bundle(map_data, bundle_path(FOREST_MAP_FILE))
+    monkeypatch.undo()
+    monkeypatch.setattr(map_bundle, 'BUNDLE_FOLDER', str(tmp_path))
+
+    assert bundle_is_fresh(FOREST_MAP_FILE)
+    assert read_bundle(bundle_path(FOREST_MAP_FILE)) is None
+    assert read_map_data(FOREST_MAP_FILE).layers == map_data.layers
+
+
+def test_bundle_goes_stale_when_a_tileset_or_its_image_changes(tmp_path, monkeypatch):
+    # A copy of the map folders, so their modification times can be changed
+    maps = tmp_path / 'maps'
+    for folder in ('TMX', 'TSX', 'PNG'):
+        shutil.copytree(os.path.join(os.path.dirname(MAP_FOLDER), folder), maps / folder)
+    map_file = str(maps / 'TMX' / os.path.basename(SNOW_MAP_FILE))
+    monkeypatch.setattr(map_bundle, 'BUNDLE_FOLDER', str(tmp_path))
+
+    sources = map_sources(map_file)
+    assert any(source.endswith('.tsx') for source in sources)
+    assert any(source.endswith('.png') for source in sources)
+    assert not bundle_is_fresh(map_file)
+
+    bundle = bundle_path(map_file)
+    with open(bundle, 'wb'):
+        pass
+    for source in sources:
+        os.utime(source, (1000, 1000))
+    os.utime(bundle, (2000, 2000))
+    assert bundle_is_fresh(map_file)
+
+    for source in sources[1:]:
+        os.utime(source, (3000, 3000))
+        assert not bundle_is_fresh(map_file), source
+        os.utime(source, (1000, 1000))
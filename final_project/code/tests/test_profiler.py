@@ -0,0 +1,27 @@
+from settings import *
+from profiler import Profiler
+
+
+def test_histogram_counts_the_frames_in_the_rolling_window():
+    profiler = Profiler(enabled=True, history=4)
+    frame_times = iter([1.0, 3.0, 5.0, 3.0, 100.0, 1.0])
+    for frame_ms in frame_times:
+        profiler.frame_start -= frame_ms / 1000
+        profiler.end_frame()
+
+    assert sum(profiler.histogram) == len(profiler.frame_times) == 4
+    expected = [0] * PROFILER_BUCKETS
+    for frame_ms in profiler.frame_times:
+        expected[Profiler.bucket(frame_ms)] += 1
+    assert profiler.histogram == expected
+    assert profiler.histogram[-1] == 1
+
+
+def test_overlay_draws_with_a_full_histogram():
+    pygame.display.init()
+    pygame.font.init()
+    surface = pygame.display.set_mode((400, 400))
+    profiler = Profiler(enabled=True, history=8)
+    for _ in range(20):
+        profiler.end_frame()
+    profiler.draw(surface, {})
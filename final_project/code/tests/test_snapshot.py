@@ -0,0 +1,79 @@
+import struct
+from settings import *
+from controls import ScriptedInput
+from main import Game
+from map_bundle import pack_string
+from simulate import state_digest, DEFAULT_SCRIPT
+from snapshot import HEADER, PROGRESS, RANDOM, take_snapshot, restore_snapshot, read_snapshot, load_snapshot
+
+
+def played_game(steps=300):
+    game = Game(headless=True, seed=3, controls=ScriptedInput(DEFAULT_SCRIPT, loop=True))
+    for _ in range(steps):
+        game.step(FIXED_DT)
+    return game
+
+
+def string_end(data, offset):
+    """
+    :return: Offset of the end of the packed string at offset.
+    """
+    return offset + 2 + struct.unpack_from('<H', data, offset)[0]
+
+
+def test_restore_puts_the_world_back():
+    game = played_game()
+    try:
+        data = take_snapshot(game)
+        digest = state_digest(game)
+        for _ in range(200):
+            game.step(FIXED_DT)
+        assert state_digest(game) != digest
+
+        assert restore_snapshot(game, data)
+        assert state_digest(game) == digest
+        assert take_snapshot(game) == data
+    finally:
+        game.preloader.shutdown()
+
+
+def test_damaged_snapshots_are_rejected():
+    game = played_game()
+    try:
+        data = take_snapshot(game)
+        digest = state_digest(game)
+        map_end = string_end(data, HEADER.size)
+        map_file_end = string_end(data, map_end)
+        # Offset of the player's animation state, after its position, hitbox and direction
+        state = map_file_end + PROGRESS.size + RANDOM.size + struct.calcsize('<ddiidd')
+
+        damaged = [
+            b'',
+            data[:HEADER.size],
+            data[:100],
+            data[:-1],
+            data + b'\0',
+            # Map name that is not UTF-8
+            data[:HEADER.size + 2] + b'\xff' * (map_end - HEADER.size - 2) + data[map_end:],
+            # Map file that does not exist
+            data[:map_end] + pack_string('missing.tmx') + data[map_file_end:],
+            # Player animation state past the end of STATES
+            data[:state] + bytes([255]) + data[state + 1:],
+        ]
+        for bad in damaged:
+            assert not restore_snapshot(game, bad)
+            assert state_digest(game) == digest
+        assert read_snapshot(data[:100]) is None
+    finally:
+        game.preloader.shutdown()
+
+
+def test_load_snapshot_rejects_a_truncated_file(tmp_path):
+    game = played_game(60)
+    try:
+        path = tmp_path / 'quick.snapshot'
+        path.write_bytes(take_snapshot(game)[:100])
+        assert not load_snapshot(game, path)
+        assert not load_snapshot(game, tmp_path / 'none.snapshot')
+    finally:
+        game.preloader.shutdown()
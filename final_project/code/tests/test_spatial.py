@@ -0,0 +1,79 @@
+from settings import *
+from math import sqrt
+from spatial import SpatialGrid, NeighbourGrid
+
+
+class Body:
+    def __init__(self, x, y, width=20, height=20):
+        self.rect = pygame.Rect(x, y, width, height)
+
+
+def overlapping(sprites, rect):
+    return [sprite for sprite in sprites if sprite.rect.colliderect(rect)]
+
+
+def test_grid_finds_the_sprites_a_full_scan_finds():
+    bodies = [Body(x * 37 % 900, x * 53 % 700, 10 + x % 90, 10 + x * 7 % 50) for x in range(200)]
+    grid = SpatialGrid(bodies, cell_size=64)
+    for rect in (pygame.Rect(0, 0, 5, 5), pygame.Rect(100, 120, 200, 90), pygame.Rect(-500, -500, 3000, 3000)):
+        assert overlapping(grid.query(rect), rect) == overlapping(bodies, rect)
+
+
+def test_moved_and_removed_sprites_are_found_where_they_are():
+    first, second, third = Body(0, 0), Body(10, 10), Body(500, 500)
+    grid = SpatialGrid([first, second, third], cell_size=64)
+
+    first.rect.topleft = (600, 600)
+    grid.move(first)
+    assert grid.query(pygame.Rect(0, 0, 40, 40)) == [second]
+    # Sprites keep their insertion order after moving between cells
+    assert grid.query(pygame.Rect(490, 490, 200, 200)) == [first, third]
+
+    grid.remove(third)
+    assert third not in grid
+    assert grid.query(pygame.Rect(490, 490, 200, 200)) == [first]
+    assert all(third not in sprites for sprites in grid.cells.values())
+
+    grid.move(third)
+    assert third in grid
+    assert grid.query(pygame.Rect(490, 490, 200, 200)) == [first, third]
+
+
+def pairwise_separation(bodies, body, radius):
+    x, y = body.rect.center
+    push_x = push_y = 0.0
+    for other in bodies:
+        other_x, other_y = other.rect.center
+        distance = sqrt((x - other_x) ** 2 + (y - other_y) ** 2)
+        if other is not body and 0 < distance < radius:
+            push_x += (x - other_x) * (radius - distance) / (radius * distance)
+            push_y += (y - other_y) * (radius - distance) / (radius * distance)
+    return push_x, push_y
+
+
+def test_separation_matches_a_pairwise_search():
+    bodies = [Body(x * 37 % 400, x * 53 % 300) for x in range(150)]
+    grid = NeighbourGrid(cell_size=SEPARATION_RADIUS)
+    grid.rebuild(bodies)
+    for body in bodies:
+        push = grid.separation(body)
+        expected = pairwise_separation(bodies, body, SEPARATION_RADIUS)
+        assert abs(push[0] - expected[0]) < 1e-9 and abs(push[1] - expected[1]) < 1e-9
+
+    assert grid.separation(Body(0, 0)) == (0.0, 0.0)
+    # Bodies on the same spot push apart sideways
+    stacked = [Body(100, 100), Body(100, 100)]
+    grid.rebuild(stacked)
+    assert grid.separation(stacked[0]) == (-1.0, 0.0)
+    assert grid.separation(stacked[1]) == (1.0, 0.0)
+
+
+def test_touching_finds_the_overlapping_bodies_in_order():
+    bodies = [Body(x * 37 % 400, x * 53 % 300, 10 + x % 60, 10 + x % 30) for x in range(150)]
+    grid = NeighbourGrid(cell_size=SEPARATION_RADIUS)
+    grid.rebuild(bodies)
+    for rect in (pygame.Rect(200, 150, 30, 30), pygame.Rect(0, 0, 1, 1), pygame.Rect(-100, -100, 50, 50)):
+        assert grid.touching(rect) == overlapping(bodies, rect)
+
+    grid.rebuild([])
+    assert not grid and grid.touching(pygame.Rect(0, 0, 400, 300)) == []